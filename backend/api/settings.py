@@ -36,6 +36,7 @@ INSTALLED_APPS = [
     'users',
     'corsheaders',
     'booking',
+    'notifications',
 ]
 
 MIDDLEWARE = [
@@ -55,8 +56,14 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compile each template once per process; emails render on every send
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -86,6 +93,25 @@ DATABASES = {
 }
 
 
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    },
+    # Slot holds must be shared by every worker, so point this at Redis/Memcached in production
+    'slot_holds': {
+        'BACKEND': os.environ.get('SLOT_HOLD_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('SLOT_HOLD_CACHE_LOCATION', 'slot-holds'),
+    },
+}
+
+# Workers only see each other's invalidations through a shared default cache, so point
+# CACHE_BACKEND at Redis/Memcached in production. With the per-process default, version
+# stamps expire instead, and other workers pick up changes within CACHE_VERSION_TIMEOUT.
+SHARED_CACHE = CACHES['default']['BACKEND'] != 'django.core.cache.backends.locmem.LocMemCache'
+CACHE_VERSION_TIMEOUT = None if SHARED_CACHE else 60  # seconds
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -135,6 +161,11 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.SessionAuthentication',
         
         'users.authentication.CookieJWTAuthentication',
+    ),
+
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     )
 }
 
@@ -144,6 +175,25 @@ SIMPLE_JWT = {
     "ROTATE_REFRESH_TOKENS": False,
     "BLACKLIST_AFTER_ROTATION": False,
 }
+# How long CookieJWTAuthentication reuses a loaded user; any change to the user drops it sooner.
+# Off without a shared cache: other workers would keep a deactivated or logged-out user, and
+# the password hash the revoke check compares against, for up to this long.
+AUTH_USER_CACHE_SECONDS = 60 if SHARED_CACHE else 0
+
+# Answer refresh-time blacklist checks from a Bloom filter, skipping the database for most
+# tokens. Blacklistings only reach other workers' filters through a shared cache, so it is
+# off without one.
+TOKEN_BLACKLIST_FILTER = SHARED_CACHE
+# Share of unblacklisted refresh tokens the Bloom prefilter still sends to the database
+TOKEN_BLACKLIST_FILTER_ERROR_RATE = 0.001
+# How long a built filter, and each blacklisting published since, is kept in the shared cache
+TOKEN_BLACKLIST_FILTER_TIMEOUT = 60 * 60 * 24
+# Filters are sized for twice the current blacklist, and at least this many tokens
+TOKEN_BLACKLIST_FILTER_MIN_CAPACITY = 10000
+# Filter bits are shared in chunks of this size, as memcached refuses items over 1 MB
+TOKEN_BLACKLIST_FILTER_CHUNK_BYTES = 512 * 1024
+# Expired outstanding tokens deleted per transaction by prune_tokens
+TOKEN_PRUNE_BATCH_SIZE = 1000
 
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
@@ -156,6 +206,13 @@ EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL')
 EMAIL_USE_TLS = True
 EMAIL_USE_SSL = False
+EMAIL_TIMEOUT = int(os.environ.get('EMAIL_TIMEOUT', 10))  # seconds
+# Messages sent over one SMTP connection before reconnecting
+EMAIL_BATCH_SIZE = 100
+# Consecutive connection failures that open the email circuit, and how long it stays open.
+# The circuit lives in the default cache, so workers only share it with SHARED_CACHE.
+EMAIL_BREAKER_FAILURE_THRESHOLD = 5
+EMAIL_BREAKER_RESET_SECONDS = 60
 
 FRONTEND_URL = os.environ.get('FRONTEND_URL')
 
@@ -169,4 +226,31 @@ CSRF_TRUSTED_ORIGINS = [
     'http://localhost:3001',
     'http://127.0.0.1:3000',
     'http://127.0.0.1:3001'
-]
\ No newline at end of file
+]
+
+# Booking availability
+BOOKING_SLOT_INTERVAL_MINUTES = 30
+AVAILABILITY_MAX_DAYS = 62
+AVAILABILITY_CACHE_TIMEOUT = 60  # seconds
+OPERATING_CALENDAR_MONTHS = 6
+BOOKING_BATCH_MAX_ITEMS = 50
+
+# Appointment reminders, sent by `manage.py send_reminders`
+REMINDER_WINDOW_HOURS = 24
+REMINDER_CHUNK_SIZE = 100
+
+# Checkout slot holds
+SLOT_HOLD_CACHE = 'slot_holds'
+SLOT_HOLD_SECONDS = 5 * 60
+# Holds only block a slot for every worker when they share the backend, so they are
+# turned off while SLOT_HOLD_CACHE_BACKEND is the per-process default
+SLOT_HOLDS_ENABLED = CACHES['slot_holds']['BACKEND'] != 'django.core.cache.backends.locmem.LocMemCache'
+
+# Catalog bootstrap document, also written here when set so a reverse proxy can serve it
+CATALOG_STATIC_PATH = os.environ.get('CATALOG_STATIC_PATH') or None
+
+# Email outbox, drained by `manage.py send_outbox`
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_RETRY_BASE_SECONDS = 30
+OUTBOX_RETRY_MAX_SECONDS = 60 * 60
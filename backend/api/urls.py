@@ -4,5 +4,6 @@ from django.urls import path, include
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/users/', include('users.urls')),
-    path('api/bookings/', include('booking.urls'))
+    path('api/bookings/', include('booking.urls')),
+    path('api/notifications/', include('notifications.urls'))
 ]
@@ -1,7 +1,7 @@
 # backend/booking/admin.py (updated)
 
 from django.contrib import admin
-from .models import Booking, Package, BusinessHours, Addon, BookingAddon, VehiclePackagePrice
+from .models import Booking, Package, BusinessHours, Addon, BookingAddon, VehiclePackagePrice, Crew, SpecialHours
 
 # Register your models here.
 admin.site.register(Booking)
@@ -13,15 +13,15 @@ class VehiclePriceInline(admin.TabularInline):
 
 @admin.register(Package)
 class PackageAdmin(admin.ModelAdmin):
-    list_display = ('display_name', 'price')
-    list_editable = ['price']
+    list_display = ('display_name', 'price', 'duration_minutes')
+    list_editable = ['price', 'duration_minutes']
     search_fields = ('name', 'display_name')
     inlines = [VehiclePriceInline]
 
 @admin.register(VehiclePackagePrice)
 class VehiclePackagePriceAdmin(admin.ModelAdmin):
-    list_display = ('package', 'vehicle_type', 'price')
-    list_editable = ['price']
+    list_display = ('package', 'vehicle_type', 'price', 'duration_minutes')
+    list_editable = ['price', 'duration_minutes']
     list_filter = ('package', 'vehicle_type')
 
 @admin.register(Addon)
@@ -52,4 +52,17 @@ class BusinessHoursAdmin(admin.ModelAdmin):
     
     def get_day_display(self, obj):
         return obj.get_day_display()
-    get_day_display.short_description = 'Day'
\ No newline at end of file
+    get_day_display.short_description = 'Day'
+
+@admin.register(SpecialHours)
+class SpecialHoursAdmin(admin.ModelAdmin):
+    list_display = ('date', 'is_open', 'opening_time', 'closing_time', 'reason')
+    list_editable = ['is_open', 'opening_time', 'closing_time']
+    list_filter = ('is_open',)
+    date_hierarchy = 'date'
+
+@admin.register(Crew)
+class CrewAdmin(admin.ModelAdmin):
+    list_display = ('name', 'active')
+    list_editable = ['active']
+    search_fields = ['name']
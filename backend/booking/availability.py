@@ -0,0 +1,118 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from .cache import get_versions, versioned_key, availability_version_name, CREWS_VERSION, OPERATING_CALENDAR_VERSION
+from .models import Booking, Crew
+from .holds import SlotHoldService
+from .schedule import OperatingCalendar
+
+MINUTES_PER_DAY = 24 * 60
+
+def to_minutes(value):
+    """Convert a time to minutes since midnight, rounding time.max up to midnight"""
+    minutes = value.hour * 60 + value.minute
+    if value.second or value.microsecond:
+        minutes += 1
+    return minutes
+
+def merge_intervals(intervals):
+    """Merge overlapping (start, end) minute intervals into a sorted disjoint list"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start < merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+def free_starts(opening, closing, duration, busy, step, earliest=0):
+    """
+    Sweep candidate start times from opening to closing against the merged busy
+    intervals, yielding every start whose [start, start + duration) is free
+    """
+    index = 0
+    start = opening
+    while start <= closing:
+        if start >= earliest:
+            end = min(start + duration, MINUTES_PER_DAY)
+            # Busy intervals are disjoint and sorted, so ends are increasing too
+            while index < len(busy) and busy[index][1] <= start:
+                index += 1
+            if index == len(busy) or busy[index][0] >= end:
+                yield start
+        start += step
+
+class AvailabilityService:
+    @staticmethod
+    def get_availability(date_from, date_to, package, vehicle):
+        """
+        Return every bookable start time between two dates, cached until a booking
+        on one of those dates is written
+        """
+        duration = package.get_duration(vehicle)
+        dates = [date_from + timedelta(days=i) for i in range((date_to - date_from).days + 1)]
+        
+        versions = get_versions([OPERATING_CALENDAR_VERSION, CREWS_VERSION] + [availability_version_name(d) for d in dates])
+        key = versioned_key(
+            'availability', date_from, date_to, package.pk, vehicle, duration,
+            versions=versions
+        )
+        result = cache.get(key)
+        if result is None:
+            result = AvailabilityService.compute_availability(dates, package, vehicle, duration)
+            cache.set(key, result, settings.AVAILABILITY_CACHE_TIMEOUT)
+        return result
+    
+    @staticmethod
+    def compute_availability(dates, package, vehicle, duration):
+        """
+        Compute free start times for the dates from bulk queries. A start is free
+        when at least one active crew has no job overlapping the whole duration.
+        """
+        step = settings.BOOKING_SLOT_INTERVAL_MINUTES
+        hours = OperatingCalendar.get_days(dates)
+        crews = list(Crew.objects.filter(active=True).values_list('pk', flat=True))
+        
+        busy = defaultdict(lambda: defaultdict(list))
+        bookings = (
+            Booking.objects.filter(date__range=(dates[0], dates[-1]), crew__isnull=False)
+            .values_list('date', 'crew_id', 'time', 'end_time')
+            .order_by()
+        )
+        for booking_date, crew_id, start, end in bookings:
+            busy[booking_date][crew_id].append((to_minutes(start), to_minutes(end)))
+        # Crews held for someone else's checkout are occupied too
+        for hold in SlotHoldService.get_holds_for_dates(dates):
+            busy[hold['date']][hold['crew']].append((to_minutes(hold['time']), to_minutes(hold['end_time'])))
+        
+        now = timezone.localtime(timezone.now())
+        days = []
+        for day in dates:
+            slots = []
+            day_hours = hours[day]
+            if crews and day_hours and day_hours.is_open and day >= now.date():
+                # Same rule as BusinessHours.is_valid_booking_time: strictly in the future
+                earliest = 0
+                if day == now.date():
+                    earliest = now.hour * 60 + now.minute + 1
+                opening = to_minutes(day_hours.opening_time)
+                closing = day_hours.closing_time.hour * 60 + day_hours.closing_time.minute
+                
+                free = set()
+                for crew_id in crews:
+                    crew_busy = merge_intervals(busy[day].get(crew_id, []))
+                    free.update(free_starts(opening, closing, duration, crew_busy, step, earliest))
+                
+                slots = [f"{minutes // 60:02d}:{minutes % 60:02d}" for minutes in sorted(free)]
+            days.append({'date': day.isoformat(), 'slots': slots})
+        
+        return {
+            'package': package.pk,
+            'vehicle': vehicle,
+            'duration_minutes': duration,
+            'slot_interval_minutes': step,
+            'days': days
+        }
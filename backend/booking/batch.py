@@ -0,0 +1,152 @@
+import uuid
+from collections import defaultdict
+from django.db import IntegrityError, transaction
+from .availability import to_minutes
+from .cache import invalidate_availability
+from .holds import SlotHoldService
+from .models import Address, Addon, Booking, BookingAddon, Crew, Package
+
+CONFLICT_MESSAGE = "A booking already exists within the restricted time."
+
+def pick_crew(crews, busy, start, end):
+    """
+    Best-fit crew choice over in-memory (start, end) minute intervals per crew,
+    mirroring Crew.find_available
+    """
+    best, best_previous_end = None, None
+    for crew_id in crews:
+        intervals = busy[crew_id]
+        if any(s < end and e > start for s, e in intervals):
+            continue
+        previous_end = max((e for s, e in intervals if e <= start), default=-1)
+        if best is None or previous_end > best_previous_end:
+            best, best_previous_end = crew_id, previous_end
+    return best
+
+class BookingBatchService:
+    ATTEMPTS = 3
+    
+    @staticmethod
+    def create_bookings(items, user=None):
+        """
+        Schedule and create validated booking items in one transaction.
+        items is a list of (index, validated_data); returns (created bookings, {index: error}).
+        """
+        for attempt in range(BookingBatchService.ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    return BookingBatchService._create(items, user)
+            except IntegrityError as e:
+                # A concurrent booking took a crew we planned on, so plan again
+                if not Booking.is_overlap_violation(e):
+                    raise
+        return [], {index: CONFLICT_MESSAGE for index, data in items}
+    
+    @staticmethod
+    def _create(items, user):
+        dates = sorted({data['date'] for index, data in items})
+        for booking_date in dates:
+            Booking.lock_date(booking_date)
+        
+        # One bulk load of crews, existing jobs and holds for every date in the batch
+        crews = list(Crew.objects.filter(active=True).values_list('pk', flat=True))
+        busy = defaultdict(lambda: defaultdict(list))
+        existing = (
+            Booking.objects.filter(date__in=dates, crew__isnull=False)
+            .values_list('date', 'crew_id', 'time', 'end_time')
+            .order_by()
+        )
+        for booking_date, crew_id, start, end in existing:
+            busy[booking_date][crew_id].append((to_minutes(start), to_minutes(end)))
+        
+        tokens = {data.get('hold_token') for index, data in items if data.get('hold_token')}
+        holds = {}
+        for hold in SlotHoldService.get_holds_for_dates(dates):
+            if hold['token'] in tokens:
+                holds[hold['token']] = hold
+            else:
+                busy[hold['date']][hold['crew']].append((to_minutes(hold['time']), to_minutes(hold['end_time'])))
+        
+        packages = Package.objects.prefetch_related('vehicle_prices').in_bulk(
+            {data['package'].pk for index, data in items}
+        )
+        addons = Addon.objects.in_bulk({item['id'] for index, data in items for item in data.get('addon_ids', [])})
+        
+        errors = {}
+        planned = []
+        for index, data in items:
+            data['package'] = packages[data['package'].pk]
+            duration = data['package'].get_duration(data['vehicle'])
+            end_time = Booking.calculate_end_time(data['date'], data['time'], duration)
+            start, end = to_minutes(data['time']), to_minutes(end_time)
+            
+            crew_id = None
+            hold = holds.get(data.get('hold_token'))
+            if hold and SlotHoldService.matches(hold, data['date'], data['time'], data['package'], data['vehicle']) \
+                    and hold['end_time'] == end_time:
+                # Still check the held crew, which a resubmitted batch may already have booked
+                crew_id = pick_crew([hold['crew']], busy[data['date']], start, end)
+            if crew_id is None:
+                crew_id = pick_crew(crews, busy[data['date']], start, end)
+            
+            if crew_id is None:
+                errors[index] = CONFLICT_MESSAGE
+                continue
+            busy[data['date']][crew_id].append((start, end))
+            planned.append((index, data, end_time, crew_id))
+        
+        if not planned:
+            return [], errors
+        
+        addresses = Address.objects.bulk_create([
+            Address(**data['address']) for index, data, end_time, crew_id in planned if data.get('address')
+        ])
+        address_iter = iter(addresses)
+        
+        bookings = []
+        booking_addons = []
+        for index, data, end_time, crew_id in planned:
+            booking = Booking(
+                first_name=data['first_name'],
+                last_name=data['last_name'],
+                email=data['email'],
+                email_normalized=Booking.normalize_email(data['email']),
+                phone_number=data['phone_number'],
+                date=data['date'],
+                time=data['time'],
+                end_time=end_time,
+                package=data['package'],
+                vehicle=data['vehicle'],
+                crew_id=crew_id,
+                user=user,
+                address=next(address_iter) if data.get('address') else None,
+                confirmation_token=str(uuid.uuid4())
+            )
+            
+            seen = set()
+            item_addons = []
+            for item in data.get('addon_ids', []):
+                addon = addons.get(item['id'])
+                if addon is None or not addon.active or addon.pk in seen:
+                    continue
+                seen.add(addon.pk)
+                item_addons.append(BookingAddon(
+                    booking=booking,
+                    addon=addon,
+                    quantity=item['quantity'],
+                    price_at_booking=addon.price
+                ))
+            booking.snapshot_prices(addons=item_addons)
+            
+            bookings.append(booking)
+            booking_addons.extend(item_addons)
+        
+        bookings = Booking.objects.bulk_create(bookings)
+        BookingAddon.objects.bulk_create(booking_addons)
+        
+        # bulk_create skips post_save, so invalidate and release holds by hand
+        invalidate_availability(dates)
+        used_tokens = [data.get('hold_token') for index, data, end_time, crew_id in planned if data.get('hold_token') in holds]
+        transaction.on_commit(lambda: [SlotHoldService.release_hold(token) for token in used_tokens])
+        
+        return [(index, booking) for booking, (index, *rest) in zip(bookings, planned)], errors
@@ -0,0 +1,88 @@
+import hashlib
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# Values memoized in this process, keyed by name, as (version, value)
+_local_values = {}
+
+def get_versions(names):
+    """Return the current version stamp for each name, creating any that are missing"""
+    versions = cache.get_many(names)
+    missing = [name for name in names if name not in versions]
+    if missing:
+        # add() never overwrites, so a concurrent bump is not lost
+        for name in missing:
+            cache.add(name, time.time_ns(), settings.CACHE_VERSION_TIMEOUT)
+        versions.update(cache.get_many(missing))
+    return [versions.get(name) for name in names]
+
+def bump_version(*names):
+    """Invalidate everything cached under the given version names"""
+    stamp = time.time_ns()
+    cache.set_many({name: stamp for name in names}, settings.CACHE_VERSION_TIMEOUT)
+
+def bump_version_on_commit(*names):
+    """Bump the versions once the transaction commits, so nobody caches uncommitted data"""
+    transaction.on_commit(lambda: bump_version(*names))
+
+def get_cached(name, builder, timeout=None):
+    """
+    Return the value for a version name, memoized in process and shared through the
+    cache framework. Only the version stamp is read while the local copy is current;
+    builder() runs once per version across all processes sharing the cache.
+    """
+    version = get_versions([name])[0]
+    local = _local_values.get(name)
+    if local is not None and local[0] == version:
+        return local[1]
+    
+    key = f"{name}:value:{version}"
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, timeout)
+    _local_values[name] = (version, value)
+    return value
+
+def set_cached(name, value, timeout=None):
+    """Publish a new value for a version name, as get_cached does after a rebuild"""
+    version = time.time_ns()
+    cache.set(f"{name}:value:{version}", value, timeout)
+    cache.set(name, version, settings.CACHE_VERSION_TIMEOUT)
+    _local_values[name] = (version, value)
+
+@contextmanager
+def cache_lock(name, timeout=10, wait=5, backend=cache):
+    """Hold a short-lived lock shared through the cache, waiting up to wait seconds for it"""
+    key = f"lock:{name}"
+    deadline = time.monotonic() + wait
+    while not backend.add(key, True, timeout):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Timed out waiting for cache lock '{name}'")
+        time.sleep(0.01)
+    try:
+        yield
+    finally:
+        backend.delete(key)
+
+def versioned_key(prefix, *parts, versions=()):
+    """Build a cache key from its parts and the version stamps it depends on"""
+    digest = hashlib.sha1(':'.join(str(v) for v in versions).encode()).hexdigest()
+    return ':'.join([prefix, *(str(part) for part in parts), digest])
+
+CREWS_VERSION = 'crews'
+BUSINESS_HOURS_VERSION = 'business-hours'
+OPERATING_CALENDAR_VERSION = 'operating-calendar'
+CATALOG_VERSION = 'catalog'
+
+def availability_version_name(booking_date):
+    return f"availability-date:{booking_date.isoformat()}"
+
+def invalidate_availability(dates):
+    """Drop cached availability for every range that includes one of the dates"""
+    names = {availability_version_name(d) for d in dates if d}
+    if names:
+        bump_version_on_commit(*names)
@@ -0,0 +1,120 @@
+import hashlib
+import os
+import tempfile
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from .cache import bump_version_on_commit, get_versions, versioned_key, CATALOG_VERSION
+from .models import Addon, BusinessHours, Package
+from .serializers import AddonSerializer, BusinessHoursSerializer, PackageSerializer
+
+def build_packages():
+    queryset = Package.objects.prefetch_related('vehicle_prices')
+    return PackageSerializer(queryset, many=True).data
+
+def build_addons():
+    return AddonSerializer(Addon.objects.filter(active=True), many=True).data
+
+def build_business_hours():
+    return BusinessHoursSerializer(BusinessHours.get_weekly_hours(), many=True).data
+
+def invalidate_catalog():
+    """Drop the cached catalog once the transaction commits, and republish the static copy"""
+    bump_version_on_commit(CATALOG_VERSION)
+    if settings.CATALOG_STATIC_PATH:
+        transaction.on_commit(CatalogService.write_static)
+
+class CatalogService:
+    """
+    Rendered responses for the public catalog endpoints, cached under one version that
+    signals on Package, VehiclePackagePrice, Addon and BusinessHours bump. Without a shared
+    cache, other workers only see a change once the version expires after CACHE_VERSION_TIMEOUT.
+    """
+    BUILDERS = {
+        'packages': build_packages,
+        'addons': build_addons,
+        'business-hours': build_business_hours,
+    }
+
+    @staticmethod
+    def get_entry(name):
+        """Return {'data', 'etag', 'last_modified'} for a section, serializing it once per version"""
+        version = get_versions([CATALOG_VERSION])[0]
+        key = versioned_key('catalog', name, versions=[version])
+        entry = cache.get(key)
+        if entry is None:
+            data = CatalogService.BUILDERS[name]()
+            entry = {
+                'data': data,
+                # Hash the content rather than the version, so a no-op save keeps clients' copies valid
+                'etag': quote_etag(hashlib.sha256(JSONRenderer().render(data)).hexdigest()),
+                # Version stamps are nanosecond timestamps of the last change
+                'last_modified': version // 1_000_000_000
+            }
+            cache.set(key, entry, settings.CACHE_VERSION_TIMEOUT)
+        return entry
+
+    @staticmethod
+    def get_document():
+        """
+        Return {'body', 'etag', 'last_modified'} for the whole catalog as one JSON document,
+        rendered to bytes once per version so visitors cost no serialization at all
+        """
+        version = get_versions([CATALOG_VERSION])[0]
+        key = versioned_key('catalog', 'document', versions=[version])
+        entry = cache.get(key)
+        if entry is None:
+            body = JSONRenderer().render({
+                'packages': CatalogService.get_entry('packages')['data'],
+                'addons': CatalogService.get_entry('addons')['data'],
+                'business_hours': CatalogService.get_entry('business-hours')['data'],
+            })
+            entry = {
+                'body': body,
+                'etag': quote_etag(hashlib.sha256(body).hexdigest()),
+                'last_modified': version // 1_000_000_000
+            }
+            cache.set(key, entry, settings.CACHE_VERSION_TIMEOUT)
+        return entry
+
+    @staticmethod
+    def write_static(path=None):
+        """Write the catalog document to CATALOG_STATIC_PATH, replacing the old file atomically"""
+        path = path or settings.CATALOG_STATIC_PATH
+        if not path:
+            return None
+        
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(CatalogService.get_document()['body'])
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return path
+
+    @staticmethod
+    def respond(request, entry):
+        """Serve an entry, or 304 Not Modified when the client's copy is current"""
+        if 'body' in entry:
+            response = HttpResponse(entry['body'], content_type='application/json')
+        else:
+            response = Response(entry['data'])
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        response['Cache-Control'] = 'no-cache'
+        return get_conditional_response(
+            request,
+            etag=entry['etag'],
+            last_modified=entry['last_modified'],
+            response=response
+        )
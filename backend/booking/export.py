@@ -0,0 +1,69 @@
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Output column -> Booking field lookup, with related rows joined in the same query
+EXPORT_FIELDS = {
+    'id': 'id',
+    'date': 'date',
+    'time': 'time',
+    'end_time': 'end_time',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'email': 'email',
+    'phone_number': 'phone_number',
+    'package': 'package__name',
+    'vehicle': 'vehicle',
+    'crew': 'crew__name',
+    'street_address': 'address__street_address',
+    'city': 'address__city',
+    'state': 'address__state',
+    'zip_code': 'address__zip_code',
+    'confirmed': 'confirmed',
+    'created_at': 'created_at',
+    'vehicle_price': 'package_price_at_booking',
+    'total_price': 'total_price_at_booking',
+}
+
+class Echo:
+    """File-like object that hands back what is written, so csv.writer can feed a stream"""
+    def write(self, value):
+        return value
+
+class BookingExportService:
+    CONTENT_TYPES = {
+        'csv': 'text/csv',
+        'ndjson': 'application/x-ndjson',
+    }
+
+    @staticmethod
+    def rows(queryset):
+        """Yield export rows from a server-side cursor, a chunk at a time"""
+        values = queryset.order_by('-date', '-time', 'id').values_list(*EXPORT_FIELDS.values())
+        for row in values.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield row
+
+    @staticmethod
+    def stream_csv(queryset):
+        writer = csv.writer(Echo())
+        yield writer.writerow(EXPORT_FIELDS.keys())
+        for row in BookingExportService.rows(queryset):
+            yield writer.writerow(row)
+
+    @staticmethod
+    def stream_ndjson(queryset):
+        columns = list(EXPORT_FIELDS)
+        for row in BookingExportService.rows(queryset):
+            record = dict(zip(columns, row))
+            # Match BookingSerializer, which renders prices as numbers
+            record['vehicle_price'] = float(record['vehicle_price'])
+            record['total_price'] = float(record['total_price'])
+            yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
+
+    @staticmethod
+    def stream(queryset, output):
+        if output == 'csv':
+            return BookingExportService.stream_csv(queryset)
+        return BookingExportService.stream_ndjson(queryset)
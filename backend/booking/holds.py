@@ -0,0 +1,162 @@
+import time as clock
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import caches
+from .cache import cache_lock, invalidate_availability
+from .models import Booking, Crew
+
+def hold_cache():
+    return caches[settings.SLOT_HOLD_CACHE]
+
+def date_key(booking_date):
+    return f"slot-holds:{booking_date.isoformat()}"
+
+def token_key(token):
+    return f"slot-hold:{token}"
+
+def overlaps(hold, start_time, end_time):
+    return hold['time'] < end_time and hold['end_time'] > start_time
+
+class SlotHoldService:
+    """
+    Short-lived reservations of a crew for a (date, time, duration) during checkout.
+    Holds live only in the SLOT_HOLD_CACHE backend and expire on their own, so they are
+    only offered when SLOT_HOLDS_ENABLED, i.e. when that backend is shared by every worker.
+    """
+    
+    @staticmethod
+    def get_holds(booking_date):
+        """Return the unexpired holds on a date"""
+        now = clock.time()
+        holds = hold_cache().get(date_key(booking_date), {})
+        return [hold for hold in holds.values() if hold['expires_at'] > now]
+    
+    @staticmethod
+    def get_holds_for_dates(dates):
+        """Return unexpired holds for many dates with one cache round trip"""
+        now = clock.time()
+        stored = hold_cache().get_many([date_key(d) for d in dates])
+        return [
+            hold
+            for holds in stored.values()
+            for hold in holds.values()
+            if hold['expires_at'] > now
+        ]
+    
+    @staticmethod
+    def held_crews(booking_date, start_time, end_time, exclude_token=None):
+        """Return ids of crews held for a job overlapping [start_time, end_time)"""
+        return {
+            hold['crew']
+            for hold in SlotHoldService.get_holds(booking_date)
+            if hold['token'] != exclude_token and overlaps(hold, start_time, end_time)
+        }
+    
+    @staticmethod
+    def create_hold(booking_date, start_time, package, vehicle):
+        """Reserve a free crew for the slot, returning the hold or None if every crew is busy"""
+        duration = package.get_duration(vehicle)
+        end_time = Booking.calculate_end_time(booking_date, start_time, duration)
+        backend = hold_cache()
+        
+        with cache_lock(date_key(booking_date), backend=backend):
+            holds = {
+                hold['token']: hold
+                for hold in SlotHoldService.get_holds(booking_date)
+            }
+            held = {hold['crew'] for hold in holds.values() if overlaps(hold, start_time, end_time)}
+            crew = Crew.find_available(booking_date, start_time, end_time, exclude_crews=held)
+            if crew is None:
+                return None
+            
+            seconds = settings.SLOT_HOLD_SECONDS
+            hold = {
+                'token': uuid.uuid4().hex,
+                'date': booking_date,
+                'time': start_time,
+                'end_time': end_time,
+                'duration_minutes': duration,
+                'package': package.pk,
+                'vehicle': vehicle,
+                'crew': crew.pk,
+                'expires_at': clock.time() + seconds
+            }
+            holds[hold['token']] = hold
+            backend.set(token_key(hold['token']), hold, seconds)
+            backend.set(date_key(booking_date), holds, seconds)
+        
+        invalidate_availability([booking_date])
+        return hold
+    
+    @staticmethod
+    def get_hold(token):
+        hold = hold_cache().get(token_key(token))
+        if hold is None or hold['expires_at'] <= clock.time():
+            return None
+        return hold
+    
+    @staticmethod
+    def claim_hold(token):
+        """
+        Mark a live hold as claimed and return it, so only one booking can use it. The hold
+        keeps its crew until release_hold() drops it once the booking commits, or
+        unclaim_hold() hands it back if the booking fails. Returns None if another request
+        claimed it first or it expired.
+        """
+        return SlotHoldService.mark_claimed(token, True)
+    
+    @staticmethod
+    def unclaim_hold(token):
+        """Hand a claimed hold back to its customer, e.g. when the booking using it was rolled back"""
+        return SlotHoldService.mark_claimed(token, False) is not None
+    
+    @staticmethod
+    def mark_claimed(token, claimed):
+        """Flip the claimed flag on a live hold, returning it, or None if it was already in that state"""
+        backend = hold_cache()
+        hold = backend.get(token_key(token))
+        if hold is None:
+            return None
+        
+        with cache_lock(date_key(hold['date']), backend=backend):
+            holds = backend.get(date_key(hold['date']), {})
+            current = holds.get(token)
+            remaining = current['expires_at'] - clock.time() if current is not None else 0
+            if remaining <= 0 or current.get('claimed', False) == claimed:
+                return None
+            current['claimed'] = claimed
+            backend.set(token_key(token), current, remaining)
+            backend.set(date_key(hold['date']), holds, settings.SLOT_HOLD_SECONDS)
+        return current
+    
+    @staticmethod
+    def release_hold(token):
+        """Remove a hold, e.g. once its booking is saved or the checkout is abandoned"""
+        backend = hold_cache()
+        hold = backend.get(token_key(token))
+        if hold is None:
+            return False
+        
+        with cache_lock(date_key(hold['date']), backend=backend):
+            backend.delete(token_key(token))
+            holds = backend.get(date_key(hold['date']), {})
+            if holds.pop(token, None) is not None:
+                backend.set(date_key(hold['date']), holds, settings.SLOT_HOLD_SECONDS)
+        
+        invalidate_availability([hold['date']])
+        return True
+    
+    @staticmethod
+    def matches(hold, booking_date, start_time, package, vehicle):
+        """Check a hold covers exactly the slot being booked"""
+        return (
+            hold['date'] == booking_date
+            and hold['time'] == start_time
+            and hold['package'] == package.pk
+            and hold['vehicle'] == vehicle
+        )
+    
+    @staticmethod
+    def expires_at(hold):
+        return datetime.fromtimestamp(hold['expires_at'], tz=dt_timezone.utc)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+from booking.catalog import CatalogService
+
+class Command(BaseCommand):
+    help = "Write the catalog document to CATALOG_STATIC_PATH (or --output) for a reverse proxy to serve"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="File to write instead of CATALOG_STATIC_PATH")
+
+    def handle(self, *args, **options):
+        path = CatalogService.write_static(options['output'])
+        if path is None:
+            raise CommandError("Set CATALOG_STATIC_PATH or pass --output.")
+        self.stdout.write(self.style.SUCCESS(f"Wrote catalog to {path}"))
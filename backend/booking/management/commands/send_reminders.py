@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from booking.reminders import ReminderService
+
+class Command(BaseCommand):
+    help = "Email reminders for confirmed bookings starting soon. Safe to run often and in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, help="Remind bookings starting within this many hours")
+        parser.add_argument('--chunk-size', type=int, help="Bookings claimed and sent per transaction")
+
+    def handle(self, *args, **options):
+        if not settings.SHARED_CACHE:
+            self.stderr.write(self.style.WARNING(
+                "CACHE_BACKEND is per-process, so this worker's email circuit is not shared with other workers"
+            ))
+        report = ReminderService.send_due(hours=options['hours'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Sent {report['sent']} reminders, {report['failed']} failed"))
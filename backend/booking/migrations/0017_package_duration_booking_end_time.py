@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0016_populate_vehicle_pricing"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="package",
+            name="duration_minutes",
+            field=models.PositiveIntegerField(
+                default=60, help_text="How long the service takes, in minutes"
+            ),
+        ),
+        migrations.AddField(
+            model_name="vehiclepackageprice",
+            name="duration_minutes",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Overrides the package duration for this vehicle type",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="booking",
+            name="end_time",
+            field=models.TimeField(editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated manually
+
+from datetime import datetime, time, timedelta
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+def populate_durations(apps, schema_editor):
+    Package = apps.get_model('booking', 'Package')
+    Booking = apps.get_model('booking', 'Booking')
+    
+    # These match the hardcoded restrictions previously applied in BookingListView
+    durations = {
+        'interior': 180,
+        'exterior': 60,
+        'interior_exterior': 210
+    }
+    
+    for package_name, minutes in durations.items():
+        Package.objects.filter(name=package_name).update(duration_minutes=minutes)
+    
+    package_durations = dict(Package.objects.values_list('id', 'duration_minutes'))
+    
+    # Backfill end times in batches so large tables are not loaded at once
+    last_pk = 0
+    while True:
+        batch = list(
+            Booking.objects.filter(pk__gt=last_pk, end_time__isnull=True)
+            .order_by('pk')
+            .only('pk', 'date', 'time', 'package_id')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        
+        for booking in batch:
+            start = datetime.combine(booking.date, booking.time)
+            end = start + timedelta(minutes=package_durations.get(booking.package_id, 60))
+            booking.end_time = time.max if end.date() > booking.date else end.time()
+        
+        Booking.objects.bulk_update(batch, ['end_time'])
+        last_pk = batch[-1].pk
+
+def reverse_func(apps, schema_editor):
+    Booking = apps.get_model('booking', 'Booking')
+    Booking.objects.update(end_time=None)
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('booking', '0017_package_duration_booking_end_time'),
+    ]
+    
+    operations = [
+        migrations.RunPython(populate_durations, reverse_func),
+    ]
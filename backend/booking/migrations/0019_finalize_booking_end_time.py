@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0018_populate_durations_and_end_times"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="booking",
+            name="end_time",
+            field=models.TimeField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["date", "time", "end_time"], name="booking_date_slot_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated manually
+
+from datetime import date
+from django.db import migrations, models
+import django.utils.timezone
+
+OVERLAP_CONSTRAINT = 'booking_no_overlap'
+
+def add_overlap_constraint(apps, schema_editor):
+    # Other backends serialize writes with BookingDateLock rows instead
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    
+    Booking = apps.get_model('booking', 'Booking')
+    table = schema_editor.quote_name(Booking._meta.db_table)
+    # Past bookings can never be rebooked, so only enforce from today onwards
+    cutoff = date.today().isoformat()
+    
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT a.id, b.id FROM {table} a
+            JOIN {table} b ON a.date = b.date AND a.id < b.id
+                AND a.time < b.end_time AND b.time < a.end_time
+            WHERE a.date >= %s
+            """,
+            [cutoff]
+        )
+        overlaps = cursor.fetchall()
+    if overlaps:
+        pairs = ', '.join(f"{a}/{b}" for a, b in overlaps[:20])
+        raise RuntimeError(
+            f"Cannot add the overlap constraint: {len(overlaps)} upcoming booking pairs overlap ({pairs}). "
+            "Reschedule them and run the migration again."
+        )
+    
+    schema_editor.execute(
+        f"ALTER TABLE {table} ADD COLUMN slot tsrange "
+        "GENERATED ALWAYS AS (tsrange(date + time, date + end_time, '[)')) STORED"
+    )
+    schema_editor.execute(
+        f"ALTER TABLE {table} ADD CONSTRAINT {OVERLAP_CONSTRAINT} "
+        f"EXCLUDE USING gist (slot WITH &&) WHERE (date >= '{cutoff}')"
+    )
+
+def remove_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    
+    Booking = apps.get_model('booking', 'Booking')
+    table = schema_editor.quote_name(Booking._meta.db_table)
+    schema_editor.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {OVERLAP_CONSTRAINT}")
+    schema_editor.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS slot")
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('booking', '0019_finalize_booking_end_time'),
+    ]
+    
+    operations = [
+        migrations.CreateModel(
+            name='BookingDateLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('locked_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(add_overlap_constraint, remove_overlap_constraint),
+    ]
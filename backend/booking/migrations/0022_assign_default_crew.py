@@ -0,0 +1,49 @@
+# Generated manually
+
+from datetime import date
+from django.db import migrations
+
+OVERLAP_CONSTRAINT = 'booking_no_overlap'
+
+def assign_default_crew(apps, schema_editor):
+    Crew = apps.get_model('booking', 'Crew')
+    Booking = apps.get_model('booking', 'Booking')
+    
+    # Everything booked so far was scheduled for a single crew
+    crew, _ = Crew.objects.get_or_create(name='Crew 1')
+    Booking.objects.filter(crew__isnull=True).update(crew=crew)
+    
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    
+    # Overlaps are now only forbidden within the same crew
+    table = schema_editor.quote_name(Booking._meta.db_table)
+    cutoff = date.today().isoformat()
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    schema_editor.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {OVERLAP_CONSTRAINT}")
+    schema_editor.execute(
+        f"ALTER TABLE {table} ADD CONSTRAINT {OVERLAP_CONSTRAINT} "
+        f"EXCLUDE USING gist (crew_id WITH =, slot WITH &&) WHERE (date >= '{cutoff}')"
+    )
+
+def reverse_func(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    
+    Booking = apps.get_model('booking', 'Booking')
+    table = schema_editor.quote_name(Booking._meta.db_table)
+    cutoff = date.today().isoformat()
+    schema_editor.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {OVERLAP_CONSTRAINT}")
+    schema_editor.execute(
+        f"ALTER TABLE {table} ADD CONSTRAINT {OVERLAP_CONSTRAINT} "
+        f"EXCLUDE USING gist (slot WITH &&) WHERE (date >= '{cutoff}')"
+    )
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('booking', '0021_crew_booking_crew'),
+    ]
+    
+    operations = [
+        migrations.RunPython(assign_default_crew, reverse_func),
+    ]
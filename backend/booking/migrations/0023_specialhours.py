@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0022_assign_default_crew'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpecialHours',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('is_open', models.BooleanField(default=False)),
+                ('opening_time', models.TimeField(blank=True, null=True)),
+                ('closing_time', models.TimeField(blank=True, null=True)),
+                ('reason', models.CharField(blank=True, max_length=100)),
+            ],
+            options={
+                'verbose_name': 'Special Hours',
+                'verbose_name_plural': 'Special Hours',
+                'ordering': ['date'],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0023_specialhours"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="booking",
+            name="package_price_at_booking",
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=8, null=True),
+        ),
+        migrations.AddField(
+            model_name="booking",
+            name="total_price_at_booking",
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=8, null=True),
+        ),
+    ]
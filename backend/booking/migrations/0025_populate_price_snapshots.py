@@ -0,0 +1,60 @@
+# Generated manually
+
+from django.db import migrations
+from django.db.models import F, Sum
+
+BATCH_SIZE = 1000
+
+def populate_prices(apps, schema_editor):
+    Package = apps.get_model('booking', 'Package')
+    VehiclePackagePrice = apps.get_model('booking', 'VehiclePackagePrice')
+    Booking = apps.get_model('booking', 'Booking')
+    BookingAddon = apps.get_model('booking', 'BookingAddon')
+    
+    # Existing bookings never stored a price, so today's prices are the best record there is
+    package_prices = dict(Package.objects.values_list('id', 'price'))
+    vehicle_prices = {
+        (package_id, vehicle_type): price
+        for package_id, vehicle_type, price in VehiclePackagePrice.objects.values_list('package_id', 'vehicle_type', 'price')
+    }
+    
+    last_pk = 0
+    while True:
+        batch = list(
+            Booking.objects.filter(pk__gt=last_pk, total_price_at_booking__isnull=True)
+            .order_by('pk')
+            .only('pk', 'package_id', 'vehicle')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        
+        addon_totals = dict(
+            BookingAddon.objects.filter(booking_id__in=[booking.pk for booking in batch])
+            .values('booking_id')
+            .annotate(total=Sum(F('price_at_booking') * F('quantity')))
+            .values_list('booking_id', 'total')
+        )
+        
+        for booking in batch:
+            package_price = vehicle_prices.get(
+                (booking.package_id, booking.vehicle),
+                package_prices.get(booking.package_id, 0)
+            )
+            booking.package_price_at_booking = package_price
+            booking.total_price_at_booking = package_price + (addon_totals.get(booking.pk) or 0)
+        
+        Booking.objects.bulk_update(batch, ['package_price_at_booking', 'total_price_at_booking'])
+        last_pk = batch[-1].pk
+
+def reverse_func(apps, schema_editor):
+    Booking = apps.get_model('booking', 'Booking')
+    Booking.objects.update(package_price_at_booking=None, total_price_at_booking=None)
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('booking', '0024_booking_price_snapshots'),
+    ]
+    
+    operations = [
+        migrations.RunPython(populate_prices, reverse_func),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0025_populate_price_snapshots"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="booking",
+            name="package_price_at_booking",
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=8),
+        ),
+        migrations.AlterField(
+            model_name="booking",
+            name="total_price_at_booking",
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=8),
+        ),
+    ]
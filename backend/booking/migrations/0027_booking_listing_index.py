@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0026_finalize_price_snapshots"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="booking",
+            options={"ordering": ["-date", "-time", "id"]},
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["-date", "-time", "id"], name="booking_listing_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0027_booking_listing_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="booking",
+            name="email_normalized",
+            field=models.CharField(default="", editable=False, max_length=250),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated manually
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+def populate_emails(apps, schema_editor):
+    Booking = apps.get_model('booking', 'Booking')
+    
+    # casefold() has no SQL equivalent, so normalize in Python a batch at a time
+    last_pk = 0
+    while True:
+        batch = list(
+            Booking.objects.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .only('pk', 'email')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        
+        for booking in batch:
+            booking.email_normalized = (booking.email or '').strip().casefold()
+        
+        Booking.objects.bulk_update(batch, ['email_normalized'])
+        last_pk = batch[-1].pk
+
+def reverse_func(apps, schema_editor):
+    Booking = apps.get_model('booking', 'Booking')
+    Booking.objects.update(email_normalized='')
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('booking', '0028_booking_email_normalized'),
+    ]
+    
+    operations = [
+        migrations.RunPython(populate_emails, reverse_func),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0030_booking_email_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                condition=models.Q(("user__isnull", False)),
+                fields=["user", "-date", "-time", "id"],
+                name="booking_user_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0031_booking_user_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="booking",
+            name="reminder_sent_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                condition=models.Q(("reminder_sent_at__isnull", True)),
+                fields=["confirmed", "date", "time", "id"],
+                name="booking_reminder_idx",
+            ),
+        ),
+    ]
@@ -1,13 +1,17 @@
 from django.utils import timezone
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import connection, models
+from django.db.models import Count, Exists, F, OuterRef, Q, Subquery
 from django.conf import settings
-from datetime import datetime
+from datetime import datetime, time, timedelta
+from .cache import get_cached, BUSINESS_HOURS_VERSION
 
 class Package(models.Model):
     name = models.CharField(max_length=50, unique=True)
     display_name = models.CharField(max_length=100)
     price = models.DecimalField(max_digits=6, decimal_places=2)
     description = models.TextField(blank=True)
+    duration_minutes = models.PositiveIntegerField(default=60, help_text="How long the service takes, in minutes")
     
     def __str__(self):
         return f"{self.display_name} (${self.price})"
@@ -15,6 +19,23 @@ class Package(models.Model):
     class Meta:
         ordering = ['price']
 
+    def get_duration(self, vehicle_type=None):
+        """Return the service duration in minutes, using a vehicle-specific override when one is set"""
+        if vehicle_type:
+            # Iterate rather than filter so a prefetched vehicle_prices cache is reused
+            for vehicle_price in self.vehicle_prices.all():
+                if vehicle_price.vehicle_type == vehicle_type and vehicle_price.duration_minutes:
+                    return vehicle_price.duration_minutes
+        return self.duration_minutes
+
+    def get_vehicle_price(self, vehicle_type=None):
+        """Return the price for a vehicle type, falling back to the package price"""
+        if vehicle_type:
+            for vehicle_price in self.vehicle_prices.all():
+                if vehicle_price.vehicle_type == vehicle_type:
+                    return vehicle_price.price
+        return self.price
+
 class Addon(models.Model):
     name = models.CharField(max_length=50, unique=True)
     display_name = models.CharField(max_length=100)
@@ -91,27 +112,34 @@ class BusinessHours(models.Model):
             return f"{day_name}: {self.opening_time.strftime('%I:%M %p')} - {self.closing_time.strftime('%I:%M %p')}"
         return f"{day_name}: Closed"
     
+    @classmethod
+    def get_weekly_hours(cls):
+        """
+        Return all rows ordered by day from the versioned schedule cache. Saves and deletes
+        invalidate it through signals; queryset.update() bypasses them and will not.
+        Other workers only see the change within CACHE_VERSION_TIMEOUT unless the cache is shared.
+        """
+        return get_cached(BUSINESS_HOURS_VERSION, lambda: list(cls.objects.all()), settings.CACHE_VERSION_TIMEOUT)
+    
     @classmethod
     def is_within_operating_hours(cls, booking_date, booking_time):
         """Check if the given date and time falls within operating hours"""
-        day_of_week = booking_date.weekday()
+        from .schedule import OperatingCalendar
+        hours = OperatingCalendar.get_day(booking_date)
         
-        try:
-            hours = cls.objects.get(day=day_of_week)
-            
-            # If business is closed on this day, reject the booking
-            if not hours.is_open:
-                return False, "We are closed on this day."
-            
-            # Check if time is within operating hours
-            if hours.opening_time <= booking_time <= hours.closing_time:
-                return True, ""
-            else:
-                return False, f"Our hours on this day are {hours.opening_time.strftime('%I:%M %p')} to {hours.closing_time.strftime('%I:%M %p')}."
-        
-        except cls.DoesNotExist:
-            # If no hours defined for this day, assume closed
+        # If no hours defined for this day, assume closed
+        if hours is None:
             return False, "No operating hours defined for this day."
+        
+        # If business is closed on this day, reject the booking
+        if not hours.is_open:
+            return False, "We are closed on this day."
+        
+        # Check if time is within operating hours
+        if hours.opening_time <= booking_time <= hours.closing_time:
+            return True, ""
+        else:
+            return False, f"Our hours on this day are {hours.opening_time.strftime('%I:%M %p')} to {hours.closing_time.strftime('%I:%M %p')}."
     
     @classmethod
     def is_valid_booking_time(cls, booking_date, booking_time):
@@ -125,15 +153,139 @@ class BusinessHours(models.Model):
         
         return cls.is_within_operating_hours(booking_date, booking_time)
 
+class SpecialHours(models.Model):
+    """Closures or custom hours for a single date, overriding the weekly schedule"""
+    date = models.DateField(unique=True)
+    is_open = models.BooleanField(default=False)
+    opening_time = models.TimeField(null=True, blank=True)
+    closing_time = models.TimeField(null=True, blank=True)
+    reason = models.CharField(max_length=100, blank=True)
+    
+    class Meta:
+        ordering = ['date']
+        verbose_name = 'Special Hours'
+        verbose_name_plural = 'Special Hours'
+    
+    def __str__(self):
+        if self.is_open:
+            return f"{self.date}: {self.opening_time.strftime('%I:%M %p')} - {self.closing_time.strftime('%I:%M %p')}"
+        return f"{self.date}: Closed"
+    
+    def clean(self):
+        if self.is_open and (self.opening_time is None or self.closing_time is None):
+            raise ValidationError("Opening and closing times are required when open.")
+
+# Per-crew exclusion constraint added on PostgreSQL by migrations 0020/0022
+BOOKING_OVERLAP_CONSTRAINT = 'booking_no_overlap'
+
+class Crew(models.Model):
+    """A detailing crew that can work one job at a time"""
+    name = models.CharField(max_length=100, unique=True)
+    active = models.BooleanField(default=True)
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+    
+    @classmethod
+    def available(cls, booking_date, start_time, end_time, exclude_booking=None, exclude_crews=()):
+        """
+        Return active crews with no job overlapping [start_time, end_time) on the date,
+        skipping exclude_crews (e.g. crews held for another checkout)
+        """
+        overlapping = Booking.objects.filter(
+            crew=OuterRef('pk'),
+            date=booking_date,
+            time__lt=end_time,
+            end_time__gt=start_time
+        )
+        if exclude_booking is not None:
+            overlapping = overlapping.exclude(pk=exclude_booking)
+        crews = cls.objects.filter(active=True)
+        if exclude_crews:
+            crews = crews.exclude(pk__in=exclude_crews)
+        return crews.filter(~Exists(overlapping))
+    
+    @classmethod
+    def find_available(cls, booking_date, start_time, end_time, exclude_booking=None, exclude_crews=()):
+        """
+        Pick a free crew using best fit: the crew whose previous job that day ends
+        closest to the new start, leaving longer gaps open for longer jobs
+        """
+        previous_end = Booking.objects.filter(
+            crew=OuterRef('pk'),
+            date=booking_date,
+            end_time__lte=start_time
+        ).order_by('-end_time').values('end_time')[:1]
+        
+        return (
+            cls.available(booking_date, start_time, end_time, exclude_booking, exclude_crews)
+            .annotate(previous_end=Subquery(previous_end))
+            .order_by(F('previous_end').desc(nulls_last=True), 'pk')
+            .first()
+        )
+
+class BookingDateLock(models.Model):
+    """One row per booked date, locked while a booking on that date is written"""
+    date = models.DateField(unique=True)
+    locked_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"Lock for {self.date}"
+
+class BookingQuerySet(models.QuerySet):
+    def with_details(self):
+        """Load everything BookingSerializer renders, in a fixed number of queries"""
+        return self.select_related('package', 'address').prefetch_related(
+            'package__vehicle_prices',
+            'addons__addon'
+        )
+    
+    @staticmethod
+    def upcoming_filter(now=None):
+        """Q for bookings that have not started yet, in local time"""
+        now = timezone.localtime(now)
+        return Q(date__gt=now.date()) | Q(date=now.date(), time__gte=now.time())
+    
+    def upcoming(self, now=None):
+        return self.filter(self.upcoming_filter(now))
+    
+    @staticmethod
+    def started_filter(now=None):
+        """Q for bookings that have already started, in local time"""
+        now = timezone.localtime(now)
+        return Q(date__lt=now.date()) | Q(date=now.date(), time__lt=now.time())
+    
+    def past(self, now=None):
+        return self.filter(self.started_filter(now))
+    
+    def starting_between(self, start, end):
+        """Bookings starting at or after start and before end"""
+        return self.filter(self.upcoming_filter(start) & self.started_filter(end))
+    
+    def counts(self, now=None):
+        """Return {'total', 'upcoming', 'past'} in one aggregate query"""
+        counts = self.order_by().aggregate(
+            total=Count('id'),
+            upcoming=Count('id', filter=self.upcoming_filter(now))
+        )
+        counts['past'] = counts['total'] - counts['upcoming']
+        return counts
+
 class Booking(models.Model):
     first_name = models.CharField(max_length=50)
     last_name = models.CharField(max_length=50)
     email = models.EmailField(max_length=250)
+    # Case-folded copy of email, set on every save, for indexed guest lookups
+    email_normalized = models.CharField(max_length=250, editable=False)
     phone_number = models.CharField(max_length=25)
     date = models.DateField()
     time = models.TimeField()
     package = models.ForeignKey(Package, on_delete=models.PROTECT)
     address = models.ForeignKey(Address, on_delete=models.CASCADE, null=True, blank=True)
+    crew = models.ForeignKey(Crew, on_delete=models.PROTECT, null=True, blank=True, related_name='bookings')
 
 
     user = models.ForeignKey(
@@ -144,15 +296,29 @@ class Booking(models.Model):
         related_name = 'bookings'
     )
 
+    # Derived from time + the package duration on every save, used for overlap checks
+    end_time = models.TimeField(editable=False)
+
+    # Prices when the booking was made, so later price changes leave it alone
+    package_price_at_booking = models.DecimalField(max_digits=8, decimal_places=2, editable=False)
+    total_price_at_booking = models.DecimalField(max_digits=8, decimal_places=2, editable=False)
+
     confirmed = models.BooleanField(default=False)
     confirmation_token = models.CharField(max_length=100, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Set once the appointment reminder has gone out, so reminder runs never send twice
+    reminder_sent_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     def total_price(self):
-        """Calculate the total price including package and add-ons"""
-        base_price = self.package.price
-        addon_price = sum(ba.get_total() for ba in self.addons.all())
-        return base_price + addon_price
+        """Return the total price including package and add-ons, as stored at booking time"""
+        return self.total_price_at_booking
+
+    def snapshot_prices(self, addons=None):
+        """Store the vehicle-specific package price and the grand total as they are now"""
+        if addons is None:
+            addons = self.addons.all() if self.pk else []
+        self.package_price_at_booking = self.package.get_vehicle_price(self.vehicle)
+        self.total_price_at_booking = self.package_price_at_booking + sum(ba.get_total() for ba in addons)
 
     VEHICLE_TYPE = [
         ('car', 'Car'),
@@ -161,12 +327,136 @@ class Booking(models.Model):
     ]
     vehicle = models.CharField(max_length=20, choices=VEHICLE_TYPE)
 
+    objects = BookingQuerySet.as_manager()
+
     def __str__(self):
         full_time = f"{self.date.strftime('%Y/%m/%d')} at {self.time.strftime('%I:%M %p')}"
         return f"Booking by {self.last_name} on {full_time}"
     
     class Meta:
-        ordering = ['-date', '-time']
+        ordering = ['-date', '-time', 'id']
+        indexes = [
+            # Matches the ordering so keyset pages are index range scans
+            models.Index(fields=['-date', '-time', 'id'], name='booking_listing_idx'),
+            # Serves a guest's lookup page straight from the index, already in list order
+            models.Index(fields=['email_normalized', '-date', '-time', 'id'], name='booking_email_idx'),
+            # A user's history in either direction, and their next appointment, as one index seek.
+            # Guest bookings have no user, so they are left out of the index.
+            models.Index(
+                fields=['user', '-date', '-time', 'id'],
+                name='booking_user_idx',
+                condition=Q(user__isnull=False)
+            ),
+            # Confirmed bookings still owed a reminder, in the order reminder runs walk them
+            models.Index(
+                fields=['confirmed', 'date', 'time', 'id'],
+                name='booking_reminder_idx',
+                condition=Q(reminder_sent_at__isnull=True)
+            ),
+            models.Index(fields=['date', 'time', 'end_time'], name='booking_date_slot_idx'),
+            models.Index(fields=['crew', 'date', 'time', 'end_time'], name='booking_crew_slot_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'email' in update_fields:
+            self.email_normalized = self.normalize_email(self.email)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'email_normalized'}
+        
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'date', 'time', 'package', 'vehicle'} & set(update_fields):
+            duration = self.package.get_duration(self.vehicle)
+            self.end_time = self.calculate_end_time(self.date, self.time, duration)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'end_time'}
+        
+        if self._state.adding and self.total_price_at_booking is None:
+            self.snapshot_prices(addons=[])
+        
+        # Bookings created or moved outside the API still need a crew that is free for the slot
+        update_fields = kwargs.get('update_fields')
+        if (update_fields is None or {'date', 'time', 'end_time'} & set(update_fields)) and self.needs_crew_check():
+            self.assign_crew()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'crew'}
+        super().save(*args, **kwargs)
+        self._loaded_slot = (self.date, self.time, self.end_time)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored slot so save() can tell when a booking moves
+        instance._loaded_slot = tuple(instance.__dict__.get(name) for name in ('date', 'time', 'end_time'))
+        return instance
+
+    def clean(self):
+        """Check crew capacity here too, so the admin shows a form error instead of save() failing"""
+        if self.package_id is None or self.date is None or self.time is None:
+            return
+        self.end_time = self.calculate_end_time(self.date, self.time, self.package.get_duration(self.vehicle))
+        if self.needs_crew_check():
+            self.assign_crew()
+
+    def needs_crew_check(self):
+        """New bookings without a crew, and bookings moved to another slot, need a free crew"""
+        if self._state.adding:
+            return self.crew_id is None
+        return getattr(self, '_loaded_slot', None) != (self.date, self.time, self.end_time)
+
+    def assign_crew(self):
+        """
+        Keep the current crew if it is free for the slot, else pick another. Raises
+        ValidationError when every crew is busy, since a booking without a crew would
+        never count against capacity.
+        """
+        exclude = None if self._state.adding else self.pk
+        if self.crew_id is not None and Crew.available(
+            self.date, self.time, self.end_time, exclude_booking=exclude
+        ).filter(pk=self.crew_id).exists():
+            return
+        crew = Crew.find_available(self.date, self.time, self.end_time, exclude_booking=exclude)
+        if crew is None:
+            raise ValidationError("No crew is available for this time.")
+        self.crew = crew
+
+    @staticmethod
+    def normalize_email(email):
+        """Return the form of an address used to match a guest to their bookings"""
+        return (email or '').strip().casefold()
+
+    @staticmethod
+    def calculate_end_time(booking_date, start_time, duration_minutes):
+        """Return the end time of a job, capped at midnight since bookings never span two dates"""
+        start = datetime.combine(booking_date, start_time)
+        end = start + timedelta(minutes=duration_minutes)
+        if end.date() > booking_date:
+            return time.max
+        return end.time()
+
+    @staticmethod
+    def lock_date(booking_date):
+        """
+        Serialize booking writes for a date until the surrounding transaction ends.
+        PostgreSQL relies on the exclusion constraint instead, so this is a no-op there.
+        """
+        if connection.vendor == 'postgresql':
+            return
+        
+        # Start with a write so SQLite takes its write lock before any reads
+        if not BookingDateLock.objects.filter(date=booking_date).update(locked_at=timezone.now()):
+            BookingDateLock.objects.get_or_create(date=booking_date)
+            BookingDateLock.objects.filter(date=booking_date).update(locked_at=timezone.now())
+
+    @staticmethod
+    def is_overlap_violation(error):
+        """Check whether an IntegrityError came from the overlap exclusion constraint"""
+        return BOOKING_OVERLAP_CONSTRAINT in str(error)
+
+    @classmethod
+    def has_conflict(cls, booking_date, start_time, end_time, exclude_pk=None):
+        """Check whether every crew is busy at some point during [start_time, end_time)"""
+        return not Crew.available(booking_date, start_time, end_time, exclude_pk).exists()
 
 class VehiclePackagePrice(models.Model):
     """Model to store vehicle-specific package pricing"""
@@ -179,6 +469,11 @@ class VehiclePackagePrice(models.Model):
     package = models.ForeignKey(Package, on_delete=models.CASCADE, related_name='vehicle_prices')
     vehicle_type = models.CharField(max_length=20, choices=VEHICLE_CHOICES)
     price = models.DecimalField(max_digits=6, decimal_places=2)
+    duration_minutes = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Overrides the package duration for this vehicle type"
+    )
     
     class Meta:
         unique_together = ('package', 'vehicle_type')
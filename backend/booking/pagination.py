@@ -0,0 +1,125 @@
+import base64
+import json
+from datetime import date, time
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+class BookingCursorPagination(BasePagination):
+    """
+    Keyset pagination over the booking ordering (-date, -time, id).
+    Each page filters past the last row seen instead of using OFFSET, so deep pages
+    cost the same as the first one.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 200
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position, self.reverse = self.decode_cursor(request)
+        # Views may list soonest first, which walks the same keyset the other way
+        ascending = getattr(view, 'ascending', False)
+        backwards = self.reverse != ascending
+
+        if backwards:
+            queryset = queryset.order_by('date', 'time', '-id')
+        else:
+            queryset = queryset.order_by('-date', '-time', 'id')
+        if position is not None:
+            queryset = queryset.filter(self.after(position, backwards))
+
+        # One extra row tells us whether there is another page
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if self.reverse:
+            self.page.reverse()
+
+        if self.reverse:
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+        return self.page
+
+    def after(self, position, backwards=False):
+        """Filter for rows strictly past position, walking (-date, -time, id) forwards or backwards"""
+        booking_date, booking_time, pk = position
+        if backwards:
+            return (
+                Q(date__gt=booking_date)
+                | Q(date=booking_date, time__gt=booking_time)
+                | Q(date=booking_date, time=booking_time, id__lt=pk)
+            )
+        return (
+            Q(date__lt=booking_date)
+            | Q(date=booking_date, time__lt=booking_time)
+            | Q(date=booking_date, time=booking_time, id__gt=pk)
+        )
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            position = (date.fromisoformat(data['d']), time.fromisoformat(data['t']), int(data['i']))
+            return position, bool(data.get('r'))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, booking, reverse):
+        # Pages hold model instances, or values() rows on the fast read path
+        if isinstance(booking, dict):
+            booking_date, booking_time, pk = booking['date'], booking['time'], booking['id']
+        else:
+            booking_date, booking_time, pk = booking.date, booking.time, booking.pk
+        data = {'d': booking_date.isoformat(), 't': booking_time.isoformat(), 'i': pk}
+        if reverse:
+            data['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('ascii')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -1,4 +1,5 @@
 from rest_framework import permissions
+from .models import Booking
 
 class IsAdminUser(permissions.BasePermission):
     """
@@ -24,7 +25,7 @@ class IsOwnerOrAdmin(permissions.BasePermission):
         if obj.user is None and hasattr(request, 'session'):
             # Check if the booking's email is stored in the session
             booking_email = request.session.get('booking_email')
-            if booking_email and booking_email == obj.email:
+            if booking_email and Booking.normalize_email(booking_email) == obj.email_normalized:
                 return True
         
         return False
\ No newline at end of file
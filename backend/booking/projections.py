@@ -0,0 +1,122 @@
+from .catalog import CatalogService
+from .models import Addon, BookingAddon, Package
+from .serializers import AddonSerializer, BookingAddonSerializer, BookingSerializer, PackageSerializer
+
+ADDRESS_FIELDS = ('id', 'street_address', 'city', 'state', 'zip_code')
+
+class BookingProjection:
+    """
+    Read-only fast path producing exactly what BookingSerializer(many=True).data would.
+    Bookings are read as values() rows with the address joined in; packages come from the
+    catalog cache and add-ons from one query each, instead of per-field, per-row
+    serializer work.
+    """
+
+    # Booking columns each output field is built from, where they differ from its name
+    COLUMNS = {
+        'package': ('package_id',),
+        'package_details': ('package_id',),
+        'crew': ('crew_id',),
+        'address': ('address_id', *(f'address__{name}' for name in ADDRESS_FIELDS[1:])),
+        'addons': (),
+        'vehicle_price': ('package_price_at_booking',),
+        'total_price': ('total_price_at_booking',),
+    }
+
+    def __init__(self, fields=None):
+        # Reuse the declared fields so every value is formatted exactly as the serializer does
+        self.fields = {field.field_name: field for field in BookingSerializer(fields=fields)._readable_fields}
+        self.addon_fields = BookingAddonSerializer().fields
+
+    @classmethod
+    def values(cls, queryset, fields=None):
+        """Project a booking queryset onto the columns the fast path reads for the given output fields"""
+        if fields is None:
+            fields = [name for name, field in BookingSerializer().fields.items() if not field.write_only]
+        # id, date and time are always read, for add-on lookups and pagination cursors
+        columns = {'id': None, 'date': None, 'time': None}
+        for name in fields:
+            columns.update(dict.fromkeys(cls.COLUMNS.get(name, (name,))))
+        return queryset.prefetch_related(None).values(*columns)
+
+    def serialize(self, rows):
+        """Turn rows from values() into the BookingSerializer output shape"""
+        rows = list(rows)
+        packages = addons = {}
+        if 'package_details' in self.fields:
+            packages = self.package_details({row['package_id'] for row in rows})
+        if 'addons' in self.fields:
+            addons = self.addons([row['id'] for row in rows])
+        return [self.serialize_row(row, packages, addons) for row in rows]
+
+    def serialize_row(self, row, packages, addons):
+        data = {}
+        for name, field in self.fields.items():
+            if name in ('package', 'crew'):
+                # Primary key fields render the bare id
+                data[name] = row[f'{name}_id']
+                continue
+            elif name == 'package_details':
+                data[name] = packages.get(row['package_id'])
+                continue
+            elif name == 'address':
+                data[name] = self.address(row)
+                continue
+            elif name == 'addons':
+                data[name] = addons.get(row['id'], [])
+                continue
+            elif name == 'vehicle_price':
+                data[name] = float(row['package_price_at_booking'])
+                continue
+            elif name == 'total_price':
+                data[name] = float(row['total_price_at_booking'])
+                continue
+            else:
+                value = row[name]
+            data[name] = None if value is None else field.to_representation(value)
+        return data
+
+    def address(self, row):
+        if row['address_id'] is None:
+            return None
+        address = {'id': row['address_id']}
+        for name in ADDRESS_FIELDS[1:]:
+            address[name] = row[f'address__{name}']
+        return address
+
+    def package_details(self, package_ids):
+        """Return {package id: PackageSerializer data}, from the catalog cache when it has them"""
+        details = {package['id']: package for package in CatalogService.get_entry('packages')['data']}
+        missing = package_ids - details.keys()
+        if missing:
+            queryset = Package.objects.filter(pk__in=missing).prefetch_related('vehicle_prices')
+            details.update((package['id'], package) for package in PackageSerializer(queryset, many=True).data)
+        return details
+
+    def addons(self, booking_ids):
+        """Return {booking id: [BookingAddonSerializer data]} with each add-on serialized once"""
+        if not booking_ids:
+            return {}
+        rows = list(
+            BookingAddon.objects.filter(booking_id__in=booking_ids)
+            .order_by('pk')
+            .values('id', 'booking_id', 'addon_id', 'quantity', 'price_at_booking')
+        )
+        if not rows:
+            return {}
+
+        details = {
+            addon['id']: addon
+            for addon in AddonSerializer(Addon.objects.filter(pk__in={row['addon_id'] for row in rows}), many=True).data
+        }
+        price = self.addon_fields['price_at_booking']
+        result = {}
+        for row in rows:
+            result.setdefault(row['booking_id'], []).append({
+                'id': row['id'],
+                'addon': row['addon_id'],
+                'addon_details': details[row['addon_id']],
+                'quantity': row['quantity'],
+                'price_at_booking': price.to_representation(row['price_at_booking']),
+            })
+        return result
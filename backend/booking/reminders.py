@@ -0,0 +1,70 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from notifications.breaker import CircuitBreaker
+from notifications.services import EmailDeliveryService
+from .models import Booking
+
+class ReminderService:
+    @staticmethod
+    def due(now=None, hours=None):
+        """Confirmed bookings starting within the next `hours` that have not been reminded yet"""
+        now = now or timezone.now()
+        hours = settings.REMINDER_WINDOW_HOURS if hours is None else hours
+        return Booking.objects.filter(confirmed=True, reminder_sent_at__isnull=True).starting_between(
+            now, now + timedelta(hours=hours)
+        )
+    
+    @staticmethod
+    def build_message(booking):
+        return EmailDeliveryService.build(
+            subject='Reminder: Your Detailing Appointment',
+            to=booking.email,
+            template='booking/email/booking_reminder',
+            context={'booking': booking, 'is_user': booking.user_id is not None}
+        )
+    
+    @staticmethod
+    def send_due(now=None, hours=None, chunk_size=None):
+        """
+        Send reminders for every due booking, a chunk at a time, and return {'sent', 'failed'}.
+        Each chunk is claimed with SELECT ... FOR UPDATE SKIP LOCKED, sent over one
+        connection and marked in the same transaction, so concurrent runs split the work
+        and no booking is reminded twice. Failed sends stay unmarked for the next run.
+        """
+        chunk_size = chunk_size or settings.REMINDER_CHUNK_SIZE
+        queryset = (
+            ReminderService.due(now, hours)
+            .select_related('package', 'address')
+            .select_for_update(skip_locked=True, of=('self',))
+            .order_by('date', 'time', 'id')
+        )
+        report = {'sent': 0, 'failed': 0}
+        position = None
+        while True:
+            if EmailDeliveryService.breaker.state() == CircuitBreaker.OPEN:
+                # The mail server is down; leave the rest for a later run instead of failing each one
+                return report
+            with transaction.atomic():
+                chunk = queryset
+                if position is not None:
+                    # Keyset past the previous chunk, so failures are not picked up again this run
+                    booking_date, booking_time, pk = position
+                    chunk = chunk.filter(
+                        Q(date__gt=booking_date)
+                        | Q(date=booking_date, time__gt=booking_time)
+                        | Q(date=booking_date, time=booking_time, id__gt=pk)
+                    )
+                bookings = list(chunk[:chunk_size])
+                if not bookings:
+                    return report
+                
+                results = EmailDeliveryService.deliver([ReminderService.build_message(b) for b in bookings])
+                sent = [booking.pk for booking, (message, error) in zip(bookings, results) if error is None]
+                # update() rather than save(): the marker changes nothing availability depends on
+                Booking.objects.filter(pk__in=sent).update(reminder_sent_at=timezone.now())
+                report['sent'] += len(sent)
+                report['failed'] += len(bookings) - len(sent)
+                position = (bookings[-1].date, bookings[-1].time, bookings[-1].pk)
@@ -0,0 +1,95 @@
+from collections import namedtuple
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from .cache import cache_lock, get_cached, set_cached, OPERATING_CALENDAR_VERSION
+from .models import BusinessHours, SpecialHours
+
+DayHours = namedtuple('DayHours', ['is_open', 'opening_time', 'closing_time', 'special'])
+
+# Compiled calendars are rebuilt at least this often even without changes
+CALENDAR_TIMEOUT = 24 * 3600
+
+class OperatingCalendar:
+    """
+    The weekly schedule merged with SpecialHours exceptions, compiled into one
+    date -> DayHours map for the next OPERATING_CALENDAR_MONTHS months
+    """
+    
+    @staticmethod
+    def horizon():
+        start = timezone.localdate()
+        return start, start + timedelta(days=31 * settings.OPERATING_CALENDAR_MONTHS)
+    
+    @staticmethod
+    def day_hours(day, weekly, special):
+        """Resolve one date from its exception, if any, else its weekday row"""
+        if special is not None:
+            return DayHours(special.is_open, special.opening_time, special.closing_time, True)
+        
+        hours = weekly.get(day.weekday())
+        if hours is None:
+            return None
+        return DayHours(hours.is_open, hours.opening_time, hours.closing_time, False)
+    
+    @classmethod
+    def resolve(cls, dates):
+        """Resolve dates directly from the weekly schedule and one exceptions query"""
+        weekly = {h.day: h for h in BusinessHours.get_weekly_hours()}
+        specials = {s.date: s for s in SpecialHours.objects.filter(date__in=dates)}
+        return {day: cls.day_hours(day, weekly, specials.get(day)) for day in dates}
+    
+    @classmethod
+    def build(cls):
+        start, end = cls.horizon()
+        weekly = {h.day: h for h in BusinessHours.get_weekly_hours()}
+        specials = {s.date: s for s in SpecialHours.objects.filter(date__range=(start, end))}
+        
+        days = {}
+        for offset in range((end - start).days + 1):
+            day = start + timedelta(days=offset)
+            days[day] = cls.day_hours(day, weekly, specials.get(day))
+        return {'start': start, 'end': end, 'days': days}
+    
+    @classmethod
+    def get(cls):
+        """Return the compiled calendar, rebuilding it when the day rolls over"""
+        calendar = get_cached(OPERATING_CALENDAR_VERSION, cls.build, CALENDAR_TIMEOUT)
+        if calendar['start'] != timezone.localdate():
+            calendar = cls.build()
+            set_cached(OPERATING_CALENDAR_VERSION, calendar, CALENDAR_TIMEOUT)
+        return calendar
+    
+    @classmethod
+    def get_day(cls, day):
+        """Return the DayHours for a date, or None if no hours are defined"""
+        return cls.get_days([day])[day]
+    
+    @classmethod
+    def get_days(cls, dates):
+        """Look dates up in the compiled calendar, resolving any outside it with one query"""
+        compiled = cls.get()['days']
+        result = {day: compiled[day] for day in dates if day in compiled}
+        outside = [day for day in dates if day not in compiled]
+        if outside:
+            result.update(cls.resolve(outside))
+        return result
+    
+    @classmethod
+    def refresh_dates(cls, dates):
+        """Recompile only the given dates, leaving the rest of the calendar untouched"""
+        with cache_lock(OPERATING_CALENDAR_VERSION):
+            calendar = cls.get()
+            dates = [day for day in dates if day in calendar['days']]
+            if not dates:
+                return
+            
+            days = dict(calendar['days'])
+            days.update(cls.resolve(dates))
+            set_cached(OPERATING_CALENDAR_VERSION, {**calendar, 'days': days}, CALENDAR_TIMEOUT)
+    
+    @classmethod
+    def refresh_weekdays(cls, weekdays):
+        """Recompile every date falling on the given weekdays after their weekly rows change"""
+        calendar = cls.get()
+        cls.refresh_dates([day for day in calendar['days'] if day.weekday() in weekdays])
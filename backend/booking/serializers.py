@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from django.conf import settings
 from .models import Booking, Package, BusinessHours, Address, Addon, BookingAddon, VehiclePackagePrice
 import uuid
 
@@ -20,19 +21,24 @@ class BookingAddonSerializer(serializers.ModelSerializer):
         fields = ('id', 'addon', 'addon_details', 'quantity', 'price_at_booking')
         read_only_fields = ('id', 'price_at_booking')
 
+class BookingAddonItemSerializer(serializers.Serializer):
+    """One {'id', 'quantity'} entry of a booking's addon_ids"""
+    id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
 class VehiclePackagePriceSerializer(serializers.ModelSerializer):
     vehicle_type_display = serializers.CharField(source='get_vehicle_type_display', read_only=True)
     
     class Meta:
         model = VehiclePackagePrice
-        fields = ('id', 'vehicle_type', 'vehicle_type_display', 'price')
+        fields = ('id', 'vehicle_type', 'vehicle_type_display', 'price', 'duration_minutes')
 
 class PackageSerializer(serializers.ModelSerializer):
     vehicle_prices = VehiclePackagePriceSerializer(many=True, read_only=True)
     
     class Meta:
         model = Package
-        fields = ('id', 'name', 'display_name', 'price', 'description', 'vehicle_prices')
+        fields = ('id', 'name', 'display_name', 'price', 'description', 'duration_minutes', 'vehicle_prices')
 
 class BusinessHoursSerializer(serializers.ModelSerializer):
     day_name = serializers.SerializerMethodField()
@@ -49,47 +55,72 @@ class BookingSerializer(serializers.ModelSerializer):
     addons = BookingAddonSerializer(many=True, read_only=True)
     address = AddressSerializer(required=False)
     addon_ids = serializers.ListField(
-        child=serializers.DictField(),
+        child=BookingAddonItemSerializer(),
         write_only=True,
         required=False
     )
+    hold_token = serializers.CharField(write_only=True, required=False)
     total_price = serializers.SerializerMethodField()
     vehicle_price = serializers.SerializerMethodField()
     
     class Meta:
         model = Booking
         fields = ('id', 'first_name', 'last_name', 'email', 'phone_number', 
-                  'date', 'time', 'package', 'package_details', 'vehicle',
-                  'confirmed', 'created_at', 'address', 'addons', 'addon_ids', 
+                  'date', 'time', 'end_time', 'package', 'package_details', 'vehicle', 'crew',
+                  'confirmed', 'created_at', 'address', 'addons', 'addon_ids', 'hold_token',
                   'total_price', 'vehicle_price')
-        read_only_fields = ('confirmed', 'created_at', 'total_price', 'vehicle_price')
+        read_only_fields = ('end_time', 'crew', 'confirmed', 'created_at', 'total_price', 'vehicle_price')
+
+    # Nested representations that cost extra joins or queries, chosen with ?expand=
+    EXPANDABLE_FIELDS = ('package_details', 'addons', 'address')
+
+    def __init__(self, *args, fields=None, **kwargs):
+        """fields limits the output to a set of readable field names, as from get_fieldset()"""
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in [name for name, field in self.fields.items() if not field.write_only and name not in fields]:
+                self.fields.pop(name)
+
+    @classmethod
+    def get_fieldset(cls, query_params):
+        """
+        Return the readable fields picked by ?fields= and ?expand=, or None for all of them.
+        ?fields= lists the fields to keep; nested representations are then left out unless
+        listed there or in ?expand=. ?expand= alone keeps every flat field plus the listed ones.
+        """
+        if 'fields' not in query_params and 'expand' not in query_params:
+            return None
+        
+        def parse(param):
+            return {name.strip() for name in query_params.get(param, '').split(',') if name.strip()}
+        
+        readable = {name for name, field in cls().fields.items() if not field.write_only}
+        requested, expand = parse('fields'), parse('expand')
+        errors = {}
+        if requested - readable:
+            errors['fields'] = [f"Unknown field '{name}'." for name in sorted(requested - readable)]
+        if expand - set(cls.EXPANDABLE_FIELDS):
+            errors['expand'] = [f"Cannot expand '{name}'." for name in sorted(expand - set(cls.EXPANDABLE_FIELDS))]
+        if errors:
+            raise serializers.ValidationError(errors)
+        
+        if 'fields' in query_params:
+            return requested | expand
+        return {name for name in readable if name not in cls.EXPANDABLE_FIELDS} | expand
 
     def get_vehicle_price(self, obj):
-        """Get the vehicle-specific price for this package"""
-        try:
-            price = VehiclePackagePrice.objects.get(
-                package=obj.package,
-                vehicle_type=obj.vehicle
-            ).price
-            return float(price)
-        except VehiclePackagePrice.DoesNotExist:
-            # If no vehicle-specific price exists, fall back to the default package price
-            return float(obj.package.price) if obj.package else 0
+        """Get the vehicle-specific package price stored when the booking was made"""
+        return float(obj.package_price_at_booking)
     
     def get_total_price(self, obj):
-        """Calculate total price including add-ons, using vehicle-specific package price"""
-        # Get vehicle-specific package price
-        package_price = self.get_vehicle_price(obj)
-        
-        # Add add-on prices
-        addon_price = sum(float(ba.get_total()) for ba in obj.addons.all())
-        
-        return package_price + addon_price
+        """Get the total price including add-ons stored when the booking was made"""
+        return float(obj.total_price_at_booking)
     
     def create(self, validated_data):
         # Extract nested fields
         address_data = validated_data.pop('address', None)
         addon_data = validated_data.pop('addon_ids', [])
+        validated_data.pop('hold_token', None)
         
         # Add confirmation token
         validated_data['confirmation_token'] = str(uuid.uuid4())
@@ -109,26 +140,29 @@ class BookingSerializer(serializers.ModelSerializer):
         booking = Booking.objects.create(**validated_data)
         
         # Process addons
+        booking_addons = []
         for item in addon_data:
-            addon_id = item.get('id')
-            quantity = item.get('quantity', 1)
-            
             try:
-                addon = Addon.objects.get(id=addon_id, active=True)
-                BookingAddon.objects.create(
+                addon = Addon.objects.get(id=item['id'], active=True)
+                booking_addons.append(BookingAddon.objects.create(
                     booking=booking,
                     addon=addon,
-                    quantity=quantity
-                )
+                    quantity=item['quantity']
+                ))
             except Addon.DoesNotExist:
                 pass
         
+        if booking_addons:
+            booking.snapshot_prices(addons=booking_addons)
+            booking.save(update_fields=['package_price_at_booking', 'total_price_at_booking'])
+        
         return booking
     
     def update(self, instance, validated_data):
         # Extract nested fields
         address_data = validated_data.pop('address', None)
         addon_data = validated_data.pop('addon_ids', None)
+        validated_data.pop('hold_token', None)
         
         # Update address if provided
         if address_data:
@@ -150,25 +184,28 @@ class BookingSerializer(serializers.ModelSerializer):
         instance.save()
         
         # Process addons if provided
+        booking_addons = None
         if addon_data is not None:
             # Clear existing addons
             instance.addons.all().delete()
             
             # Add new ones
+            booking_addons = []
             for item in addon_data:
-                addon_id = item.get('id')
-                quantity = item.get('quantity', 1)
-                
                 try:
-                    addon = Addon.objects.get(id=addon_id, active=True)
-                    BookingAddon.objects.create(
+                    addon = Addon.objects.get(id=item['id'], active=True)
+                    booking_addons.append(BookingAddon.objects.create(
                         booking=instance,
                         addon=addon,
-                        quantity=quantity
-                    )
+                        quantity=item['quantity']
+                    ))
                 except Addon.DoesNotExist:
                     pass
         
+        # Re-price the booking as it stands after the update
+        instance.snapshot_prices(addons=booking_addons)
+        instance.save(update_fields=['package_price_at_booking', 'total_price_at_booking'])
+        
         return instance
     
     def validate(self, data):
@@ -178,11 +215,92 @@ class BookingSerializer(serializers.ModelSerializer):
         
         return data
     
+class BookingBatchSerializer(serializers.Serializer):
+    bookings = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=settings.BOOKING_BATCH_MAX_ITEMS
+    )
+
+class BookingListQuerySerializer(serializers.Serializer):
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    confirmed = serializers.BooleanField(required=False)
+    
+    def validate(self, data):
+        if 'date_from' in data and 'date_to' in data and data['date_to'] < data['date_from']:
+            raise serializers.ValidationError("'date_to' must not be before 'date_from'.")
+        return data
+    
+    def filter_queryset(self, queryset):
+        """Apply the validated filters to a booking queryset"""
+        if 'date_from' in self.validated_data:
+            queryset = queryset.filter(date__gte=self.validated_data['date_from'])
+        if 'date_to' in self.validated_data:
+            queryset = queryset.filter(date__lte=self.validated_data['date_to'])
+        if 'confirmed' in self.validated_data:
+            queryset = queryset.filter(confirmed=self.validated_data['confirmed'])
+        return queryset
+
+class BookingExportQuerySerializer(BookingListQuerySerializer):
+    # Not 'format', which DRF reserves for choosing a renderer
+    output = serializers.ChoiceField(choices=['csv', 'ndjson'], default='csv')
+
+class UserBookingsQuerySerializer(serializers.Serializer):
+    when = serializers.ChoiceField(choices=['upcoming', 'past'], required=False)
+    ordering = serializers.ChoiceField(choices=['date', '-date'], required=False)
+    
+    def filter_queryset(self, queryset):
+        when = self.validated_data.get('when')
+        if when == 'upcoming':
+            return queryset.upcoming()
+        if when == 'past':
+            return queryset.past()
+        return queryset
+    
+    @property
+    def ascending(self):
+        """Upcoming bookings list soonest first unless asked otherwise, everything else latest first"""
+        default = 'date' if self.validated_data.get('when') == 'upcoming' else '-date'
+        return self.validated_data.get('ordering', default) == 'date'
+
 class GuestBookingLookupSerializer(serializers.Serializer):
     email = serializers.EmailField(required=True)
     
     def validate_email(self, value):
-        # Check if bookings exist for this email
-        if not Booking.objects.filter(email=value).exists():
-            raise serializers.ValidationError("No bookings found for this email address")
-        return value
\ No newline at end of file
+        # Whether any bookings exist is settled by the lookup query itself
+        return Booking.normalize_email(value)
+
+class AvailabilityQuerySerializer(serializers.Serializer):
+    package = serializers.PrimaryKeyRelatedField(queryset=Package.objects.all())
+    vehicle = serializers.ChoiceField(choices=Booking.VEHICLE_TYPE)
+    
+    def get_fields(self):
+        # 'from' is a Python keyword, so the date fields cannot be declared as attributes
+        fields = super().get_fields()
+        fields['from'] = serializers.DateField()
+        fields['to'] = serializers.DateField()
+        return fields
+    
+    def validate(self, data):
+        if data['to'] < data['from']:
+            raise serializers.ValidationError("'to' must not be before 'from'.")
+        
+        span = (data['to'] - data['from']).days + 1
+        if span > settings.AVAILABILITY_MAX_DAYS:
+            raise serializers.ValidationError(f"Availability can be requested for at most {settings.AVAILABILITY_MAX_DAYS} days.")
+        
+        return data
+
+class SlotHoldSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    time = serializers.TimeField()
+    package = serializers.PrimaryKeyRelatedField(queryset=Package.objects.all())
+    vehicle = serializers.ChoiceField(choices=Booking.VEHICLE_TYPE)
+    
+    def validate(self, data):
+        is_valid, message = BusinessHours.is_valid_booking_time(data['date'], data['time'])
+        if not is_valid:
+            raise serializers.ValidationError(message)
+        
+        return data
@@ -1,13 +1,13 @@
-from django.core.mail import send_mail
 from django.conf import settings
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+from notifications.services import OutboxService
 
 class EmailService:
+    """Booking emails, written to the outbox so callers never wait on SMTP"""
+
     @staticmethod
     def send_booking_confirmation(booking):
         """
-        Send a booking confirmation email to the customer
+        Queue a booking confirmation email to the customer
         """
         confirmation_url = f"{settings.FRONTEND_URL}/confirm-booking/{booking.confirmation_token}"
         
@@ -18,24 +18,46 @@ class EmailService:
             'is_user': booking.user is not None
         }
         
-        # Render email content from templates
-        html_message = render_to_string('booking/email/booking_confirmation.html', context)
-        plain_message = strip_tags(html_message)
-        
-        # Send email
-        send_mail(
+        OutboxService.enqueue_template(
             subject='Confirm Your Booking',
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[booking.email],
-            html_message=html_message,
-            fail_silently=False,
+            to=booking.email,
+            template='booking/email/booking_confirmation',
+            context=context
         )
     
+    @staticmethod
+    def send_batch_confirmation(bookings):
+        """
+        Queue one confirmation email per recipient covering all of their bookings
+        """
+        by_email = {}
+        for booking in bookings:
+            by_email.setdefault(booking.email, []).append(booking)
+        
+        for email, recipient_bookings in by_email.items():
+            context = {
+                'first_name': recipient_bookings[0].first_name,
+                'bookings': [
+                    {
+                        'booking': booking,
+                        'confirmation_url': f"{settings.FRONTEND_URL}/confirm-booking/{booking.confirmation_token}"
+                    }
+                    for booking in recipient_bookings
+                ],
+                'is_user': recipient_bookings[0].user is not None
+            }
+            
+            OutboxService.enqueue_template(
+                subject='Confirm Your Bookings',
+                to=email,
+                template='booking/email/batch_confirmation',
+                context=context
+            )
+    
     @staticmethod
     def send_booking_confirmed(booking):
         """
-        Send a notification that the booking has been confirmed
+        Queue a notification that the booking has been confirmed
         """
         # Prepare email context
         context = {
@@ -43,16 +65,9 @@ class EmailService:
             'is_user': booking.user is not None
         }
         
-        # Render email content from templates
-        html_message = render_to_string('booking/email/booking_confirmed.html', context)
-        plain_message = strip_tags(html_message)
-        
-        # Send email
-        send_mail(
+        OutboxService.enqueue_template(
             subject='Your Booking is Confirmed',
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[booking.email],
-            html_message=html_message,
-            fail_silently=False,
+            to=booking.email,
+            template='booking/email/booking_confirmed',
+            context=context
         )
\ No newline at end of file
@@ -0,0 +1,63 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .cache import bump_version_on_commit, invalidate_availability, BUSINESS_HOURS_VERSION, CREWS_VERSION
+from .catalog import invalidate_catalog
+from .models import Addon, Booking, BusinessHours, Crew, Package, SpecialHours, VehiclePackagePrice
+from .schedule import OperatingCalendar
+
+@receiver(pre_save, sender=Booking)
+def remember_previous_date(sender, instance, update_fields=None, **kwargs):
+    """Keep the stored date so moving a booking also frees the old day"""
+    instance._previous_date = None
+    if instance.pk and (update_fields is None or 'date' in update_fields):
+        instance._previous_date = sender.objects.filter(pk=instance.pk).values_list('date', flat=True).first()
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def invalidate_booking_availability(sender, instance, **kwargs):
+    invalidate_availability([instance.date, getattr(instance, '_previous_date', None)])
+
+@receiver(post_save, sender=Crew)
+@receiver(post_delete, sender=Crew)
+def invalidate_crew_availability(sender, instance, **kwargs):
+    bump_version_on_commit(CREWS_VERSION)
+
+@receiver(pre_save, sender=BusinessHours)
+def remember_previous_day(sender, instance, **kwargs):
+    """Keep the stored weekday so moving a row also recompiles the old one"""
+    instance._previous_day = None
+    if instance.pk:
+        instance._previous_day = sender.objects.filter(pk=instance.pk).values_list('day', flat=True).first()
+
+@receiver(post_save, sender=BusinessHours)
+@receiver(post_delete, sender=BusinessHours)
+def invalidate_business_hours(sender, instance, **kwargs):
+    """Drop the cached weekly schedule, including after admin list_editable saves"""
+    bump_version_on_commit(BUSINESS_HOURS_VERSION)
+    invalidate_catalog()
+    weekdays = {instance.day, getattr(instance, '_previous_day', None)} - {None}
+    transaction.on_commit(lambda: OperatingCalendar.refresh_weekdays(weekdays))
+
+@receiver(post_save, sender=Package)
+@receiver(post_delete, sender=Package)
+@receiver(post_save, sender=VehiclePackagePrice)
+@receiver(post_delete, sender=VehiclePackagePrice)
+@receiver(post_save, sender=Addon)
+@receiver(post_delete, sender=Addon)
+def invalidate_catalog_responses(sender, instance, **kwargs):
+    """Drop the cached package, add-on and hours responses"""
+    invalidate_catalog()
+
+@receiver(pre_save, sender=SpecialHours)
+def remember_previous_special_date(sender, instance, **kwargs):
+    instance._previous_date = None
+    if instance.pk:
+        instance._previous_date = sender.objects.filter(pk=instance.pk).values_list('date', flat=True).first()
+
+@receiver(post_save, sender=SpecialHours)
+@receiver(post_delete, sender=SpecialHours)
+def refresh_special_hours(sender, instance, **kwargs):
+    """Recompile just the affected dates in the operating calendar"""
+    dates = [d for d in (instance.date, getattr(instance, '_previous_date', None)) if d]
+    transaction.on_commit(lambda: OperatingCalendar.refresh_dates(dates))
@@ -1,16 +1,52 @@
 from django.urls import reverse
 from django.utils import timezone
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
-from rest_framework.test import APITestCase
-from .models import Booking, Package, BusinessHours
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock, skipUnless
+from .models import Booking, Package, BusinessHours, VehiclePackagePrice, Crew, SpecialHours, Addon, Address, BookingAddon
+from .schedule import OperatingCalendar
+from .holds import SlotHoldService
+from .serializers import BookingSerializer
+from .export import BookingExportService
+from .projections import BookingProjection
+from .reminders import ReminderService
+from api.renderers import FastJSONRenderer
 from users.models import CustomUser
+from notifications.models import OutboxMessage
+from notifications.services import EmailDeliveryService
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
 import uuid
-from datetime import time, timedelta, datetime
+import timeit
+import tracemalloc
+from datetime import time, timedelta, datetime, timezone as dt_timezone
+from decimal import Decimal
 
+RUN_BENCHMARKS = bool(os.environ.get('RUN_BENCHMARKS'))
+
+@override_settings(SLOT_HOLDS_ENABLED=True)
 class BookingAPITest(APITestCase):
     
     def create_test_data(self):
         """Helper method to create test data instead of using setUp"""
+        cache.clear()
+        caches[settings.SLOT_HOLD_CACHE].clear()
+        
         # Create test user
         self.user = CustomUser.objects.create_user(
             email='user@example.com',
@@ -102,6 +138,43 @@ class BookingAPITest(APITestCase):
         self.assertFalse(booking.confirmed)
         self.assertIsNotNone(booking.confirmation_token)
     
+    @override_settings(
+        EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+        EMAIL_HOST='127.0.0.1',
+        EMAIL_PORT=1,
+        EMAIL_TIMEOUT=1
+    )
+    def test_booking_does_not_wait_on_smtp(self):
+        """Test a booking succeeds with the mail server down, leaving its email queued for retry"""
+        self.create_test_data()
+        
+        response = self.client.post('/api/bookings/booking-list/', self.valid_booking_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.to, self.valid_booking_data['email'])
+        self.assertIn(Booking.objects.get().confirmation_token, message.html_body)
+        
+        call_command('send_outbox', '--once', stdout=io.StringIO())
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), (OutboxMessage.PENDING, 1))
+        self.assertTrue(message.last_error)
+        self.assertGreater(message.available_at, timezone.now())
+    
+    def test_confirmation_email_text_part(self):
+        """Test the plain text part comes from its own template, unescaped and free of markup"""
+        self.create_test_data()
+        
+        data = dict(self.valid_booking_data, last_name="O'Brien & Sons")
+        response = self.client.post('/api/bookings/booking-list/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+        message = OutboxMessage.objects.get()
+        booking = Booking.objects.get()
+        self.assertIn("Name: John O'Brien & Sons", message.body)
+        self.assertIn(f"{settings.FRONTEND_URL}/confirm-booking/{booking.confirmation_token}", message.body)
+        self.assertNotIn('<', message.body)
+        self.assertIn('O&#x27;Brien &amp; Sons', message.html_body)
+    
     def test_authenticated_user_booking(self):
         """Test booking creation for authenticated user"""
         self.create_test_data()
@@ -272,6 +345,7 @@ class BookingAPITest(APITestCase):
         # Check booking was confirmed
         booking.refresh_from_db()
         self.assertTrue(booking.confirmed)
+        self.assertTrue(OutboxMessage.objects.filter(to='john.doe@example.com', subject='Your Booking is Confirmed').exists())
     
     def test_confirm_booking_invalid_token(self):
         """Test confirming a booking with invalid token"""
@@ -283,6 +357,8 @@ class BookingAPITest(APITestCase):
     def test_user_bookings_list(self):
         """Test retrieving a user's bookings"""
         self.create_test_data()
+        # Two users book the same slot, so each needs a crew
+        Crew.objects.create(name='Crew 2')
         
         # Create bookings for the user
         Booking.objects.create(
@@ -331,7 +407,7 @@ class BookingAPITest(APITestCase):
         # Get user's bookings
         response = self.client.get('/api/bookings/user-bookings/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)  # Only user's bookings
+        self.assertEqual(len(response.data['results']), 2)  # Only user's bookings
     
     def test_guest_bookings_lookup(self):
         """Test looking up bookings as a guest"""
@@ -356,7 +432,7 @@ class BookingAPITest(APITestCase):
         response = self.client.post('/api/bookings/guest-bookings/', lookup_data, format='json')
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 3)
+        self.assertEqual(len(response.data['results']), 3)
     
     def test_guest_bookings_invalid_email(self):
         """Test guest lookup with invalid email"""
@@ -394,7 +470,7 @@ class BookingAPITest(APITestCase):
         self.client.force_authenticate(user=self.admin)
         response = self.client.get('/api/bookings/booking-list/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertGreaterEqual(len(response.data), 5)  # At least our 5 bookings
+        self.assertGreaterEqual(len(response.data['results']), 5)  # At least our 5 bookings
     
     def test_delete_booking_as_owner(self):
         """Test deleting a booking as the owner"""
@@ -552,4 +628,1685 @@ class BookingAPITest(APITestCase):
             self.assertIn('day_name', day_data)
             self.assertIn('opening_time', day_data)
             self.assertIn('closing_time', day_data)
-            self.assertIn('is_open', day_data)
\ No newline at end of file
+            self.assertIn('is_open', day_data)
+    
+    def test_booking_end_time_from_package_duration(self):
+        """Test the end time is derived from the package duration"""
+        self.create_test_data()
+        
+        response = self.client.post('/api/bookings/booking-list/', self.valid_booking_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['end_time'], '13:00:00')  # 3 hour interior package
+    
+    def test_vehicle_duration_override(self):
+        """Test a vehicle-specific duration replaces the package duration"""
+        self.create_test_data()
+        
+        VehiclePackagePrice.objects.filter(
+            package=self.interior_package, vehicle_type='suv'
+        ).update(duration_minutes=60)
+        
+        booking = Booking.objects.create(
+            first_name='Jane',
+            last_name='Smith',
+            email='jane.smith@example.com',
+            phone_number='0987654321',
+            date=self.test_date,
+            time=self.test_time,  # 10 AM
+            package=self.interior_package,
+            vehicle='suv',
+            confirmation_token=str(uuid.uuid4())
+        )
+        self.assertEqual(booking.end_time, time(11, 0))
+        
+        # 11 AM is free because the SUV interior job only takes an hour
+        later_data = self.valid_booking_data.copy()
+        later_data['time'] = time(11, 0).isoformat()
+        
+        response = self.client.post('/api/bookings/booking-list/', later_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+    
+    def test_end_time_capped_at_midnight(self):
+        """Test jobs running past midnight are capped to the booking date"""
+        self.assertEqual(
+            Booking.calculate_end_time(datetime(2030, 1, 7).date(), time(22, 0), 210),
+            time.max
+        )
+    
+    def test_conflict_check_is_single_query(self):
+        """Test the overlap check runs as one query"""
+        self.create_test_data()
+        
+        with self.assertNumQueries(1):
+            Booking.has_conflict(self.test_date, time(10, 0), time(13, 0))
+    
+    def get_availability(self, date_from, date_to, package, vehicle='car'):
+        return self.client.get('/api/bookings/availability/', {
+            'from': date_from.isoformat(),
+            'to': date_to.isoformat(),
+            'package': package.id,
+            'vehicle': vehicle
+        })
+    
+    def test_availability_excludes_booked_intervals(self):
+        """Test availability only offers starts whose full duration is free"""
+        self.create_test_data()
+        
+        Booking.objects.create(
+            first_name='Jane',
+            last_name='Smith',
+            email='jane.smith@example.com',
+            phone_number='0987654321',
+            date=self.test_date,
+            time=self.test_time,  # 10 AM - 1 PM
+            package=self.interior_package,
+            vehicle='car',
+            confirmation_token=str(uuid.uuid4())
+        )
+        
+        response = self.get_availability(self.test_date, self.test_date, self.exterior_package)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['duration_minutes'], 60)
+        
+        slots = response.data['days'][0]['slots']
+        self.assertIn('09:00', slots)  # Ends exactly when the booking starts
+        self.assertNotIn('09:30', slots)
+        self.assertNotIn('12:30', slots)
+        self.assertIn('13:00', slots)
+        self.assertIn('21:00', slots)
+    
+    def test_availability_closed_day(self):
+        """Test closed days have no slots"""
+        self.create_test_data()
+        
+        BusinessHours.objects.filter(day=6).update(is_open=False)
+        sunday = self.test_date + timedelta(days=6)
+        
+        response = self.get_availability(self.test_date, sunday, self.exterior_package)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['days']), 7)
+        self.assertEqual(response.data['days'][-1]['slots'], [])
+        self.assertTrue(response.data['days'][0]['slots'])
+    
+    def test_availability_invalidated_by_new_booking(self):
+        """Test cached availability is dropped when a booking on that date is written"""
+        self.create_test_data()
+        
+        response = self.get_availability(self.test_date, self.test_date, self.interior_package)
+        self.assertIn('10:00', response.data['days'][0]['slots'])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/bookings/booking-list/', self.valid_booking_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+        response = self.get_availability(self.test_date, self.test_date, self.interior_package)
+        self.assertNotIn('10:00', response.data['days'][0]['slots'])
+    
+    def test_availability_queries_and_cache(self):
+        """Test availability is computed from bulk queries and then served from cache"""
+        self.create_test_data()
+        
+        date_to = self.test_date + timedelta(days=59)
+        # Package and its duration overrides, then the calendar build, crews and bookings
+        with self.assertNumQueries(6):
+            self.get_availability(self.test_date, date_to, self.interior_package)
+        with self.assertNumQueries(2):
+            self.get_availability(self.test_date, date_to, self.interior_package)
+    
+    def test_availability_invalid_range(self):
+        """Test inverted and oversized ranges are rejected"""
+        self.create_test_data()
+        
+        response = self.get_availability(self.test_date, self.test_date - timedelta(days=1), self.interior_package)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        response = self.get_availability(self.test_date, self.test_date + timedelta(days=365), self.interior_package)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_second_crew_takes_overlapping_booking(self):
+        """Test overlapping bookings are accepted while any crew is free"""
+        self.create_test_data()
+        
+        first_crew = Crew.objects.get()
+        second_crew = Crew.objects.create(name='Crew 2')
+        
+        response = self.client.post('/api/bookings/booking-list/', self.valid_booking_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['crew'], first_crew.id)
+        
+        overlapping = self.valid_booking_data.copy()
+        overlapping['time'] = time(11, 0).isoformat()
+        response = self.client.post('/api/bookings/booking-list/', overlapping, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['crew'], second_crew.id)
+        
+        # Both crews are now busy at noon
+        overlapping['time'] = time(12, 0).isoformat()
+        response = self.client.post('/api/bookings/booking-list/', overlapping, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        response = self.get_availability(self.test_date, self.test_date, self.exterior_package)
+        slots = response.data['days'][0]['slots']
+        self.assertNotIn('12:00', slots)
+        self.assertIn('13:00', slots)  # First crew finishes at 1 PM
+    
+    def test_crew_assignment_best_fit(self):
+        """Test a new job goes to the crew whose previous job ends closest to its start"""
+        self.create_test_data()
+        
+        early_crew = Crew.objects.get()
+        late_crew = Crew.objects.create(name='Crew 2')
+        for crew, start in ((early_crew, time(9, 0)), (late_crew, time(11, 0))):
+            Booking.objects.create(
+                first_name='Jane',
+                last_name='Smith',
+                email='jane.smith@example.com',
+                phone_number='0987654321',
+                date=self.test_date,
+                time=start,
+                package=self.exterior_package,
+                vehicle='car',
+                crew=crew,
+                confirmation_token=str(uuid.uuid4())
+            )
+        
+        # Late crew is free from noon, early crew from 10 AM
+        self.assertEqual(Crew.find_available(self.test_date, time(12, 0), time(13, 0)), late_crew)
+        self.assertEqual(Crew.find_available(self.test_date, time(10, 0), time(11, 0)), early_crew)
+    
+    def test_inactive_crew_not_scheduled(self):
+        """Test inactive crews are never assigned"""
+        self.create_test_data()
+        
+        Crew.objects.update(active=False)
+        response = self.client.post('/api/bookings/booking-list/', self.valid_booking_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_business_hours_served_from_cache(self):
+        """Test the hours endpoint and validation do no hours queries once cached"""
+        self.create_test_data()
+        
+        self.client.get('/api/bookings/business-hours/')
+        BusinessHours.is_within_operating_hours(self.test_date, self.test_time)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/bookings/business-hours/')
+            BusinessHours.is_within_operating_hours(self.test_date, self.test_time)
+        self.assertEqual(len(response.data), 7)
+    
+    def test_business_hours_cache_invalidated_on_save(self):
+        """Test editing a row, as the admin list does, refreshes the cached schedule"""
+        self.create_test_data()
+        
+        self.assertTrue(BusinessHours.is_within_operating_hours(self.test_date, self.test_time)[0])
+        
+        monday = BusinessHours.objects.get(day=0)
+        monday.opening_time = time(11, 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            monday.save()
+        
+        is_valid, message = BusinessHours.is_within_operating_hours(self.test_date, self.test_time)
+        self.assertFalse(is_valid)
+        self.assertIn("11:00 AM", message)
+        
+        response = self.client.get('/api/bookings/business-hours/')
+        self.assertEqual(response.data[0]['opening_time'], '11:00:00')
+    
+    @override_settings(CACHE_VERSION_TIMEOUT=60)
+    def test_business_hours_saved_on_another_worker(self):
+        """Test a change invalidated in another worker's local cache shows up once versions expire"""
+        self.create_test_data()
+        self.assertTrue(BusinessHours.is_within_operating_hours(self.test_date, self.test_time)[0])
+        
+        monday = BusinessHours.objects.get(day=0)
+        monday.opening_time = time(11, 0)
+        with mock.patch('booking.cache.cache', LocMemCache('other-worker', {})):
+            with self.captureOnCommitCallbacks(execute=True):
+                monday.save()
+        self.assertTrue(BusinessHours.is_within_operating_hours(self.test_date, self.test_time)[0])
+        
+        later = timezone.now().timestamp() + settings.CACHE_VERSION_TIMEOUT + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            self.assertFalse(BusinessHours.is_within_operating_hours(self.test_date, self.test_time)[0])
+    
+    def test_special_closure_rejects_booking(self):
+        """Test a one-off closure overrides the weekly schedule"""
+        self.create_test_data()
+        OperatingCalendar.get()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            closure = SpecialHours.objects.create(date=self.test_date, is_open=False, reason='Holiday')
+        
+        response = self.client.post('/api/bookings/booking-list/', self.valid_booking_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("closed", str(response.data).lower())
+        
+        response = self.get_availability(self.test_date, self.test_date + timedelta(days=1), self.exterior_package)
+        self.assertEqual(response.data['days'][0]['slots'], [])
+        self.assertTrue(response.data['days'][1]['slots'])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            closure.delete()
+        
+        response = self.client.post('/api/bookings/booking-list/', self.valid_booking_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+    
+    def test_special_custom_hours(self):
+        """Test custom hours for a date replace that weekday's hours"""
+        self.create_test_data()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            SpecialHours.objects.create(
+                date=self.test_date,
+                is_open=True,
+                opening_time=time(12, 0),
+                closing_time=time(16, 0)
+            )
+        
+        self.assertFalse(BusinessHours.is_within_operating_hours(self.test_date, time(10, 0))[0])
+        self.assertTrue(BusinessHours.is_within_operating_hours(self.test_date, time(13, 0))[0])
+        # The following Monday still uses the weekly row
+        self.assertTrue(BusinessHours.is_within_operating_hours(self.test_date + timedelta(days=7), time(10, 0))[0])
+    
+    def test_operating_calendar_lookup_does_no_queries(self):
+        """Test validation reads the compiled calendar without merging rows per request"""
+        self.create_test_data()
+        OperatingCalendar.get()
+        
+        with self.assertNumQueries(0):
+            BusinessHours.is_within_operating_hours(self.test_date, self.test_time)
+            OperatingCalendar.get_days([self.test_date + timedelta(days=n) for n in range(60)])
+    
+    def test_operating_calendar_weekly_change_is_incremental(self):
+        """Test changing a weekly row recompiles only that weekday"""
+        self.create_test_data()
+        before = OperatingCalendar.get()['days']
+        
+        sunday = BusinessHours.objects.get(day=6)
+        sunday.is_open = False
+        with self.captureOnCommitCallbacks(execute=True):
+            sunday.save()
+        
+        after = OperatingCalendar.get()['days']
+        for day, hours in after.items():
+            if day.weekday() == 6:
+                self.assertFalse(hours.is_open)
+            else:
+                self.assertIs(hours, before[day])
+    
+    def test_operating_calendar_weekday_moved(self):
+        """Test moving a weekly row to another day recompiles both weekdays"""
+        self.create_test_data()
+        with self.captureOnCommitCallbacks(execute=True):
+            BusinessHours.objects.filter(day=5).delete()
+        OperatingCalendar.get()
+        
+        row = BusinessHours.objects.get(day=6)
+        row.day = 5
+        row.opening_time = time(10, 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            row.save()
+        
+        for day, hours in OperatingCalendar.get()['days'].items():
+            if day.weekday() == 6:
+                self.assertIsNone(hours)
+            elif day.weekday() == 5:
+                self.assertEqual(hours.opening_time, time(10, 0))
+    
+    def create_hold(self, booking_time=None, package=None):
+        return self.client.post('/api/bookings/slot-holds/', {
+            'date': self.test_date.isoformat(),
+            'time': (booking_time or self.test_time).isoformat(),
+            'package': (package or self.interior_package).id,
+            'vehicle': 'car'
+        }, format='json')
+    
+    def test_slot_hold_blocks_other_bookings(self):
+        """Test a held slot counts as occupied for other customers"""
+        self.create_test_data()
+        
+        response = self.create_hold()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['end_time'], time(13, 0))
+        
+        response = self.client.post('/api/bookings/booking-list/', self.valid_booking_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        response = self.create_hold(time(11, 0))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        
+        response = self.get_availability(self.test_date, self.test_date, self.exterior_package)
+        slots = response.data['days'][0]['slots']
+        self.assertNotIn('10:00', slots)
+        self.assertIn('13:00', slots)
+    
+    def test_booking_with_hold_skips_rescan(self):
+        """Test a booking carrying a valid hold uses the held crew without scanning for another"""
+        self.create_test_data()
+        
+        token = self.create_hold().data['token']
+        booking_data = self.valid_booking_data.copy()
+        booking_data['hold_token'] = token
+        
+        with mock.patch.object(Crew, 'find_available', side_effect=AssertionError("re-scanned")), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/bookings/booking-list/', booking_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['crew'], Crew.objects.get().id)
+        
+        # The hold is released once the booking exists
+        response = self.client.delete(f'/api/bookings/slot-holds/{token}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_hold_survives_failed_booking(self):
+        """Test a booking that fails after claiming its hold hands the hold back"""
+        self.create_test_data()
+        
+        token = self.create_hold().data['token']
+        booking_data = self.valid_booking_data.copy()
+        booking_data['hold_token'] = token
+        
+        with mock.patch.object(Crew, 'available', return_value=Crew.objects.none()), \
+                mock.patch.object(Crew, 'find_available', return_value=None):
+            response = self.client.post('/api/bookings/booking-list/', booking_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Booking.objects.count(), 0)
+        
+        # Still held for everyone else, and still usable by its customer
+        response = self.create_hold()
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        response = self.client.post('/api/bookings/booking-list/', booking_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+    
+    @override_settings(SLOT_HOLDS_ENABLED=False)
+    def test_hold_needs_shared_cache(self):
+        """Test holds are refused while the hold cache is per-process"""
+        self.create_test_data()
+        
+        response = self.create_hold()
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+    
+    def test_hold_is_used_once(self):
+        """Test two submissions that both validated the same hold book it only once"""
+        self.create_test_data()
+        Crew.objects.create(name='Crew 2')
+        
+        hold = self.create_hold().data
+        booking_data = self.valid_booking_data.copy()
+        booking_data['hold_token'] = hold['token']
+        held = SlotHoldService.get_hold(hold['token'])
+        
+        # Both requests read the hold before either claims it
+        with mock.patch('booking.views.BookingListView.get_matching_hold', return_value=held):
+            first = self.client.post('/api/bookings/booking-list/', booking_data, format='json')
+            second = self.client.post('/api/bookings/booking-list/', booking_data, format='json')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Booking.objects.filter(date=self.test_date, time=self.test_time).count(), 1)
+        self.assertIsNone(SlotHoldService.claim_hold(hold['token']))
+    
+    def test_hold_for_other_slot_is_ignored(self):
+        """Test a hold token only applies to the slot it was taken for"""
+        self.create_test_data()
+        
+        token = self.create_hold(time(15, 0)).data['token']
+        booking_data = self.valid_booking_data.copy()
+        booking_data['hold_token'] = token
+        
+        response = self.client.post('/api/bookings/booking-list/', booking_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+        # The 3 PM hold is still in place
+        held_data = self.valid_booking_data.copy()
+        held_data['time'] = time(15, 0).isoformat()
+        response = self.client.post('/api/bookings/booking-list/', held_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_slot_hold_expires(self):
+        """Test expired holds no longer block the slot"""
+        self.create_test_data()
+        
+        self.create_hold()
+        with mock.patch('booking.holds.clock.time', return_value=datetime.now().timestamp() + settings.SLOT_HOLD_SECONDS + 1):
+            response = self.client.post('/api/bookings/booking-list/', self.valid_booking_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+    
+    def test_release_slot_hold(self):
+        """Test releasing a hold frees the slot immediately"""
+        self.create_test_data()
+        
+        token = self.create_hold().data['token']
+        response = self.client.delete(f'/api/bookings/slot-holds/{token}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        
+        response = self.client.post('/api/bookings/booking-list/', self.valid_booking_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+    def batch_item(self, booking_time, package=None, **extra):
+        item = self.valid_booking_data.copy()
+        item['time'] = booking_time.isoformat()
+        item['package'] = (package or self.exterior_package).id
+        item.update(extra)
+        return item
+    
+    def test_batch_booking_creates_all(self):
+        """Test a batch is scheduled, written and confirmed in one go"""
+        self.create_test_data()
+        
+        addon = Addon.objects.create(name='wax', display_name='Wax', price=Decimal('20.00'))
+        items = [
+            self.batch_item(time(9, 0), addon_ids=[{'id': addon.id, 'quantity': 2}]),
+            self.batch_item(time(10, 0), address={
+                'street_address': '1 Market St', 'city': 'San Francisco', 'state': 'CA', 'zip_code': '94105'
+            }),
+            self.batch_item(time(11, 0))
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/bookings/booking-batch/', {'bookings': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual([r['status'] for r in response.data['results']], ['created'] * 3)
+        
+        bookings = Booking.objects.filter(date=self.test_date).order_by('time')
+        self.assertEqual(bookings.count(), 3)
+        self.assertEqual([b.end_time for b in bookings], [time(10, 0), time(11, 0), time(12, 0)])
+        self.assertTrue(all(b.crew_id == Crew.objects.get().id for b in bookings))
+        self.assertEqual(bookings[0].addons.get().price_at_booking, addon.price)
+        self.assertEqual(bookings[1].address.city, 'San Francisco')
+        
+        # One consolidated email with a link per booking, sent by the outbox worker
+        self.assertEqual(len(mail.outbox), 0)
+        call_command('send_outbox', '--once', stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        for booking in bookings:
+            self.assertIn(booking.confirmation_token, mail.outbox[0].alternatives[0][0])
+        
+        # bulk_create skips signals, so the batch invalidates availability itself
+        slots = self.get_availability(self.test_date, self.test_date, self.exterior_package).data['days'][0]['slots']
+        self.assertNotIn('11:00', slots)
+        self.assertIn('12:00', slots)
+    
+    def test_batch_booking_partial_failure(self):
+        """Test each item succeeds or fails on its own"""
+        self.create_test_data()
+        
+        items = [
+            self.batch_item(time(10, 0)),
+            self.batch_item(time(10, 30)),  # Clashes with the first item
+            self.batch_item(time(8, 0)),  # Before opening
+            self.batch_item(time(13, 0))
+        ]
+        response = self.client.post('/api/bookings/booking-batch/', {'bookings': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([r['status'] for r in response.data['results']], ['created', 'error', 'error', 'created'])
+        self.assertIn('restricted time', str(response.data['results'][1]['errors']))
+        self.assertEqual(Booking.objects.count(), 2)
+    
+    def test_batch_booking_respects_existing_bookings_and_holds(self):
+        """Test the in-memory schedule accounts for stored bookings, other holds and the batch's own holds"""
+        self.create_test_data()
+        
+        Crew.objects.create(name='Crew 2')
+        self.client.post('/api/bookings/booking-list/', self.batch_item(time(10, 0)), format='json')
+        self.create_hold(time(10, 0), self.exterior_package)
+        token = self.create_hold(time(12, 0), self.exterior_package).data['token']
+        
+        items = [self.batch_item(time(10, 0)), self.batch_item(time(12, 0), hold_token=token)]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/bookings/booking-batch/', {'bookings': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['results'][0]['status'], 'error')
+        self.assertEqual(response.data['results'][1]['status'], 'created')
+        
+        # The batch's own hold is released once its booking exists
+        self.assertIsNone(SlotHoldService.get_hold(token))
+    
+    def test_batch_booking_all_fail(self):
+        """Test a batch where nothing can be booked is rejected"""
+        self.create_test_data()
+        
+        response = self.client.post('/api/bookings/booking-batch/', {'bookings': [self.batch_item(time(8, 0))]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['failed'], 1)
+        self.assertFalse(OutboxMessage.objects.exists())
+        
+        response = self.client.post('/api/bookings/booking-batch/', {'bookings': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        items = [self.batch_item(time(9, 0))] * (settings.BOOKING_BATCH_MAX_ITEMS + 1)
+        response = self.client.post('/api/bookings/booking-batch/', {'bookings': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Booking.objects.count(), 0)
+
+    def create_bookings(self, count, **extra):
+        """Create bookings on consecutive days, each with a priced vehicle and an add-on"""
+        addon, _ = Addon.objects.get_or_create(name='wax', defaults={'display_name': 'Wax', 'price': Decimal('20.00')})
+        VehiclePackagePrice.objects.update_or_create(package=self.exterior_package, vehicle_type='suv', defaults={'price': Decimal('75.00')})
+        bookings = []
+        for i in range(count):
+            booking = Booking.objects.create(
+                first_name='Jane',
+                last_name='Smith',
+                email='jane.smith@example.com',
+                phone_number='0987654321',
+                date=self.test_date + timedelta(days=i),
+                time=self.test_time,
+                package=self.exterior_package,
+                vehicle='suv' if i % 2 else 'car',
+                confirmation_token=str(uuid.uuid4()),
+                **extra
+            )
+            booking.snapshot_prices(addons=[booking.addons.create(addon=addon, quantity=1)])
+            booking.save(update_fields=['package_price_at_booking', 'total_price_at_booking'])
+            bookings.append(booking)
+        return bookings
+    
+    def test_booking_list_query_count_is_constant(self):
+        """Test list endpoints render any number of bookings in a fixed number of queries"""
+        self.create_test_data()
+        Crew.objects.create(name='Crew 2')
+        
+        self.create_bookings(2, user=self.user)
+        self.client.force_authenticate(user=self.admin)
+        # bookings (with address joined), booking add-ons, add-ons, plus packages and
+        # vehicle prices until the catalog cache is warm
+        with self.assertNumQueries(5):
+            self.client.get('/api/bookings/booking-list/')
+        
+        self.create_bookings(10, user=self.user)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/bookings/booking-list/')
+        self.assertEqual(len(response.data['results']), 12)
+        
+        self.client.force_authenticate(user=self.user)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/bookings/user-bookings/')
+        self.assertEqual(len(response.data['results']), 12)
+    
+    def test_guest_lookup_query_count_is_constant(self):
+        """Test the guest lookup does not query per booking"""
+        self.create_test_data()
+        Crew.objects.create(name='Crew 2')
+        
+        self.create_bookings(2)
+        self.client.get('/api/bookings/packages/')  # Warm the catalog
+        with CaptureQueriesContext(connection) as few:
+            self.client.post('/api/bookings/guest-bookings/', {'email': 'jane.smith@example.com'}, format='json')
+        
+        self.create_bookings(10)
+        with self.assertNumQueries(len(few.captured_queries)):
+            response = self.client.post('/api/bookings/guest-bookings/', {'email': 'jane.smith@example.com'}, format='json')
+        self.assertEqual(len(response.data['results']), 12)
+    
+    def test_prices_snapshotted_at_booking(self):
+        """Test bookings keep the prices they were made at when prices change later"""
+        self.create_test_data()
+        
+        addon = Addon.objects.create(name='wax', display_name='Wax', price=Decimal('20.00'))
+        VehiclePackagePrice.objects.update_or_create(package=self.exterior_package, vehicle_type='suv', defaults={'price': Decimal('75.00')})
+        booking_data = self.valid_booking_data.copy()
+        booking_data.update({'package': self.exterior_package.id, 'vehicle': 'suv', 'addon_ids': [{'id': addon.id, 'quantity': 2}]})
+        
+        response = self.client.post('/api/bookings/booking-list/', booking_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['vehicle_price'], response.data['total_price']), (75.0, 115.0))
+        
+        VehiclePackagePrice.objects.filter(package=self.exterior_package).update(price=99.00)
+        Addon.objects.filter(pk=addon.pk).update(price=50.00)
+        
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get('/api/bookings/booking-list/')
+        booking = response.data['results'][0]
+        self.assertEqual((booking['vehicle_price'], booking['total_price']), (75.0, 115.0))
+    
+    def test_addon_quantities_validated(self):
+        """Test add-on quantities are parsed as integers and must be positive, in both create paths"""
+        self.create_test_data()
+        
+        addon = Addon.objects.create(name='wax', display_name='Wax', price=Decimal('20.00'))
+        booking_data = self.valid_booking_data.copy()
+        booking_data['addon_ids'] = [{'id': str(addon.id), 'quantity': '2'}]
+        response = self.client.post('/api/bookings/booking-list/', booking_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['total_price'], 90.0)
+        
+        for quantity in (0, 'two'):
+            booking_data['addon_ids'] = [{'id': addon.id, 'quantity': quantity}]
+            response = self.client.post('/api/bookings/booking-list/', booking_data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('addon_ids', response.data)
+        
+        items = [self.batch_item(time(15, 0), addon_ids=[{'id': addon.id, 'quantity': '3'}])]
+        response = self.client.post('/api/bookings/booking-batch/', {'bookings': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Booking.objects.get(time=time(15, 0)).total_price_at_booking, Decimal('120.00'))
+    
+    def test_prices_repriced_on_update(self):
+        """Test editing a booking stores the prices that apply to it afterwards"""
+        self.create_test_data()
+        
+        booking = self.create_bookings(1)[0]
+        self.assertEqual((booking.package_price_at_booking, booking.total_price_at_booking), (60, 80))
+        
+        booking_data = self.valid_booking_data.copy()
+        booking_data.update({'package': self.exterior_package.id, 'vehicle': 'suv', 'addon_ids': []})
+        serializer = BookingSerializer(booking, data=booking_data)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        booking.refresh_from_db()
+        self.assertEqual((booking.package_price_at_booking, booking.total_price_at_booking), (75, 75))
+    
+    def test_booking_without_free_crew_is_refused(self):
+        """Test a booking saved outside the API is refused rather than left without a crew"""
+        self.create_test_data()
+        
+        self.create_bookings(1)
+        with self.assertRaises(ValidationError):
+            self.create_bookings(1)
+        self.assertEqual(Booking.objects.filter(crew__isnull=True).count(), 0)
+    
+    def test_full_clean_reports_busy_slot(self):
+        """Test a booking with no free crew fails validation, so the admin shows a form error"""
+        self.create_test_data()
+        
+        taken = self.create_bookings(1)[0]
+        booking = Booking(
+            first_name='John', last_name='Doe', email='john@example.com', phone_number='1234567890',
+            date=taken.date, time=taken.time, package=self.exterior_package, vehicle='car',
+            confirmation_token=str(uuid.uuid4())
+        )
+        with self.assertRaises(ValidationError):
+            booking.full_clean()
+        self.assertIsNone(booking.crew_id)
+    
+    def test_moved_booking_rechecks_crew(self):
+        """Test moving a booking onto a busy crew hands it to a free crew, or refuses when none is free"""
+        self.create_test_data()
+        other_crew = Crew.objects.create(name='Crew 2')
+        
+        first, second, third = self.create_bookings(3)
+        self.assertEqual(first.crew_id, second.crew_id)
+        second.date = first.date
+        second.save()
+        second.refresh_from_db()
+        self.assertEqual(second.crew_id, other_crew.pk)
+        
+        # Both crews are busy on that day now, so a third booking cannot move there
+        third = Booking.objects.get(pk=third.pk)
+        third.date = first.date
+        with self.assertRaises(ValidationError):
+            third.save(update_fields=['date'])
+        third.refresh_from_db()
+        self.assertNotEqual(third.date, first.date)
+    
+    def test_admin_list_keyset_pagination(self):
+        """Test walking the admin list by cursor visits every booking once, in order, without OFFSET"""
+        self.create_test_data()
+        
+        Crew.objects.create(name='Crew 2')
+        bookings = self.create_bookings(3)
+        bookings += self.create_bookings(3)  # Same dates and times, so ties are broken by id
+        expected = list(Booking.objects.values_list('id', flat=True))
+        self.assertEqual(len(expected), 6)
+        
+        self.client.force_authenticate(user=self.admin)
+        seen = []
+        pages = []
+        url = '/api/bookings/booking-list/?page_size=4'
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('OFFSET', queries.captured_queries[0]['sql'].upper())
+            pages.append(response.data)
+            seen += [b['id'] for b in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(pages), 2)
+        self.assertIsNone(pages[0]['previous'])
+        
+        response = self.client.get(pages[1]['previous'])
+        self.assertEqual([b['id'] for b in response.data['results']], expected[:4])
+        self.assertIsNone(response.data['previous'])
+        
+        response = self.client.get('/api/bookings/booking-list/?cursor=garbage')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_admin_list_filters(self):
+        """Test the admin list can be narrowed by date range and confirmation"""
+        self.create_test_data()
+        
+        bookings = self.create_bookings(4)
+        Booking.objects.filter(pk=bookings[1].pk).update(confirmed=True)
+        self.client.force_authenticate(user=self.admin)
+        
+        def ids(query):
+            response = self.client.get(f'/api/bookings/booking-list/?{query}')
+            return {b['id'] for b in response.data['results']}
+        
+        second, third = bookings[1].date.isoformat(), bookings[2].date.isoformat()
+        self.assertEqual(ids(f'date_from={second}&date_to={third}'), {bookings[1].id, bookings[2].id})
+        self.assertEqual(ids('confirmed=true'), {bookings[1].id})
+        self.assertEqual(ids('confirmed=false'), {bookings[0].id, bookings[2].id, bookings[3].id})
+        self.assertEqual(len(ids('')), 4)
+        
+        response = self.client.get(f'/api/bookings/booking-list/?date_from={third}&date_to={second}')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def export(self, query=''):
+        response = self.client.get(f'/api/bookings/booking-export/?{query}')
+        return response, b''.join(response.streaming_content).decode() if response.streaming else None
+    
+    def test_export_csv(self):
+        """Test admins can stream bookings as CSV with the same totals as the API"""
+        self.create_test_data()
+        
+        self.create_bookings(3)
+        self.client.force_authenticate(user=self.admin)
+        response, body = self.export()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('bookings.csv', response['Content-Disposition'])
+        
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([int(row['id']) for row in rows], list(Booking.objects.values_list('id', flat=True)))
+        totals = {b['id']: b['total_price'] for b in self.client.get('/api/bookings/booking-list/').data['results']}
+        for row in rows:
+            self.assertEqual(float(row['total_price']), totals[int(row['id'])])
+        self.assertEqual(rows[0]['package'], 'exterior')
+        self.assertEqual(rows[0]['crew'], 'Crew 1')
+    
+    def test_export_ndjson_with_filters(self):
+        """Test NDJSON export and its date range filter"""
+        self.create_test_data()
+        
+        bookings = self.create_bookings(3)
+        self.client.force_authenticate(user=self.admin)
+        day = bookings[1].date.isoformat()
+        response, body = self.export(f'output=ndjson&date_from={day}&date_to={day}')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['id'], bookings[1].id)
+        self.assertEqual(records[0]['date'], day)
+        self.assertEqual(records[0]['vehicle_price'], 75.0)
+        self.assertEqual(records[0]['total_price'], 95.0)
+    
+    def test_export_admin_only(self):
+        """Test the export is closed to everyone but admins and rejects unknown outputs"""
+        self.create_test_data()
+        
+        response, body = self.export()
+        self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+        
+        self.client.force_authenticate(user=self.user)
+        response, body = self.export()
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        
+        self.client.force_authenticate(user=self.admin)
+        response, body = self.export('output=xml')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_catalog_endpoints_warm_without_queries(self):
+        """Test packages, add-ons and hours are served from cache once warm"""
+        self.create_test_data()
+        
+        urls = ['/api/bookings/packages/', '/api/bookings/addons/', '/api/bookings/business-hours/']
+        for url in urls:
+            self.client.get(url)
+        with self.assertNumQueries(0):
+            for url in urls:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(all('vehicle_prices' in package for package in self.client.get(urls[0]).data))
+    
+    def test_catalog_conditional_get(self):
+        """Test clients holding the current ETag or Last-Modified get 304s"""
+        self.create_test_data()
+        
+        response = self.client.get('/api/bookings/packages/')
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.assertTrue(etag.startswith('"'))
+        
+        response = self.client.get('/api/bookings/packages/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        
+        response = self.client.get('/api/bookings/packages/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+    
+    def test_catalog_invalidated_on_change(self):
+        """Test saving a catalog model changes the served content and its ETag"""
+        self.create_test_data()
+        
+        etags = {}
+        for url in ('/api/bookings/packages/', '/api/bookings/addons/'):
+            etags[url] = self.client.get(url)['ETag']
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            VehiclePackagePrice.objects.update_or_create(
+                package=self.exterior_package, vehicle_type='suv', defaults={'price': Decimal('75.00')}
+            )
+        response = self.client.get('/api/bookings/packages/', HTTP_IF_NONE_MATCH=etags['/api/bookings/packages/'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        exterior = next(p for p in response.data if p['id'] == self.exterior_package.id)
+        self.assertIn('75.00', [v['price'] for v in exterior['vehicle_prices']])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Addon.objects.create(name='wax', display_name='Wax', price=Decimal('20.00'))
+        response = self.client.get('/api/bookings/addons/')
+        self.assertNotEqual(response['ETag'], etags['/api/bookings/addons/'])
+        self.assertIn('wax', [a['name'] for a in response.data])
+    
+    @override_settings(CACHE_VERSION_TIMEOUT=60)
+    def test_catalog_changed_on_another_worker(self):
+        """Test a change invalidated in another worker's local cache is served once versions expire"""
+        self.create_test_data()
+        packages_etag = self.client.get('/api/bookings/packages/')['ETag']
+        addons_etag = self.client.get('/api/bookings/addons/')['ETag']
+        
+        with mock.patch('booking.cache.cache', LocMemCache('other-worker', {})):
+            with self.captureOnCommitCallbacks(execute=True):
+                Addon.objects.create(name='wax', display_name='Wax', price=Decimal('20.00'))
+        self.assertEqual(self.client.get('/api/bookings/addons/')['ETag'], addons_etag)
+        
+        later = timezone.now().timestamp() + settings.CACHE_VERSION_TIMEOUT + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            response = self.client.get('/api/bookings/addons/')
+            self.assertIn('wax', [a['name'] for a in response.data])
+            # Unchanged sections keep their ETag, so clients still get 304s after a rebuild
+            response = self.client.get('/api/bookings/packages/', HTTP_IF_NONE_MATCH=packages_etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+    
+    def test_catalog_document(self):
+        """Test the bootstrap document bundles the three catalog endpoints and is cached"""
+        self.create_test_data()
+        
+        response = self.client.get('/api/bookings/catalog/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        document = response.json()
+        self.assertEqual(document['packages'], self.client.get('/api/bookings/packages/').json())
+        self.assertEqual(document['addons'], self.client.get('/api/bookings/addons/').json())
+        self.assertEqual(document['business_hours'], self.client.get('/api/bookings/business-hours/').json())
+        
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/bookings/catalog/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+    
+    def test_catalog_static_file(self):
+        """Test the static copy is written by the command and rewritten when the catalog changes"""
+        self.create_test_data()
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'catalog.json')
+            with override_settings(CATALOG_STATIC_PATH=path):
+                call_command('build_catalog', stdout=io.StringIO())
+                with open(path, 'rb') as f:
+                    self.assertEqual(f.read(), self.client.get('/api/bookings/catalog/').content)
+                
+                with self.captureOnCommitCallbacks(execute=True):
+                    Addon.objects.create(name='wax', display_name='Wax', price=Decimal('20.00'))
+                with open(path) as f:
+                    self.assertIn('wax', [a['name'] for a in json.load(f)['addons']])
+    
+    def test_fast_read_path_matches_serializer(self):
+        """Test the projection renders byte-for-byte what BookingSerializer does"""
+        self.create_test_data()
+        
+        bookings = self.create_bookings(3, user=self.user)
+        wash = Addon.objects.create(name='wash', display_name='Wash \u2028 \u00e9', price=Decimal('12.50'))
+        bookings[0].addons.create(addon=wash, quantity=3)
+        bookings[1].address = Address.objects.create(street_address='1 Market St', city='San Francisco', state='CA', zip_code='94105')
+        bookings[1].first_name = 'Zo\u00eb \u2029'
+        bookings[1].confirmed = True
+        bookings[1].save()
+        Booking.objects.filter(pk=bookings[2].pk).update(crew=None)
+        
+        expected = JSONRenderer().render(BookingSerializer(Booking.objects.with_details(), many=True).data)
+        fast = FastJSONRenderer().render(BookingProjection().serialize(BookingProjection.values(Booking.objects.all())))
+        self.assertEqual(fast, expected)
+        
+        self.client.force_authenticate(user=self.user)
+        expected = JSONRenderer().render({
+            'next': None,
+            'previous': None,
+            'results': BookingSerializer(Booking.objects.with_details(), many=True).data
+        })
+        self.assertEqual(self.client.get('/api/bookings/user-bookings/').content, expected)
+    
+    def test_fast_json_renderer_matches_drf(self):
+        """Test the orjson renderer gives DRF's bytes, falling back where it cannot"""
+        data = {
+            'text': 'line\u2028break\u2029 caf\u00e9',
+            'when': datetime(2026, 10, 18, 9, 30, 15, 120000, tzinfo=dt_timezone.utc),
+            'day': datetime(2026, 10, 18).date(),
+            'at': time(9, 30),
+            'price': Decimal('12.50'),
+            'total': 115.0,
+            'id': uuid.UUID(int=1),
+            'nested': [{'a': None, 'b': True}, (1, 2)],
+        }
+        for value in (data, {1: 'numeric keys'}, {'big': 2 ** 70}, []):
+            self.assertEqual(FastJSONRenderer().render(value), JSONRenderer().render(value))
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2')
+        )
+    
+    def test_sparse_fieldsets(self):
+        """Test ?fields= and ?expand= trim the output and the queries behind it"""
+        self.create_test_data()
+        
+        self.create_bookings(3, user=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.client.get('/api/bookings/packages/')  # Warm the catalog
+        
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/bookings/user-bookings/?fields=id,date,time,confirmed&expand=package_details')
+        self.assertEqual(list(response.data['results'][0]), ['id', 'date', 'time', 'package_details', 'confirmed'])
+        self.assertEqual(response.data['results'][0]['package_details']['name'], 'exterior')
+        
+        # ?expand= alone keeps the flat fields and only the named nested ones
+        response = self.client.get('/api/bookings/user-bookings/?expand=addons')
+        self.assertIn('total_price', response.data['results'][0])
+        self.assertIn('addons', response.data['results'][0])
+        self.assertNotIn('package_details', response.data['results'][0])
+        self.assertNotIn('address', response.data['results'][0])
+        
+        response = self.client.get('/api/bookings/user-bookings/?fields=id,secret')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/bookings/user-bookings/?expand=crew')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_sparse_fieldsets_match_serializer(self):
+        """Test a fieldset renders the same through the serializer and the fast path"""
+        self.create_test_data()
+        
+        self.create_bookings(2)
+        for query in ({'fields': 'id,email,vehicle_price', 'expand': 'address'}, {'expand': 'addons'}):
+            fields = BookingSerializer.get_fieldset(query)
+            expected = BookingSerializer(Booking.objects.with_details(), many=True, fields=fields).data
+            fast = BookingProjection(fields).serialize(BookingProjection.values(Booking.objects.all(), fields))
+            self.assertEqual(JSONRenderer().render(fast), JSONRenderer().render(expected))
+        
+        response = self.client.post('/api/bookings/guest-bookings/?fields=id,date', {'email': 'jane.smith@example.com'}, format='json')
+        self.assertEqual([list(b) for b in response.data['results']], [['id', 'date']] * 2)
+    
+    def test_user_bookings_upcoming_and_past(self):
+        """Test ?when= splits a user's history around now, each side paged in its natural order"""
+        self.create_test_data()
+        
+        bookings = self.create_bookings(5, user=self.user)
+        today = timezone.localdate()
+        for i, booking in enumerate(bookings[:2]):
+            Booking.objects.filter(pk=booking.pk).update(date=today - timedelta(days=10 - i))
+        self.create_bookings(1, user=self.admin)
+        self.client.force_authenticate(user=self.user)
+        
+        def ids(response):
+            return [b['id'] for b in response.data['results']]
+        
+        response = self.client.get('/api/bookings/user-bookings/?when=upcoming&fields=id')
+        self.assertEqual(ids(response), [b.id for b in bookings[2:]])
+        response = self.client.get('/api/bookings/user-bookings/?when=past&fields=id')
+        self.assertEqual(ids(response), [bookings[1].id, bookings[0].id])
+        response = self.client.get('/api/bookings/user-bookings/?when=upcoming&ordering=-date&fields=id')
+        self.assertEqual(ids(response), [b.id for b in reversed(bookings[2:])])
+        
+        # Cursors walk the soonest-first order both ways
+        response = self.client.get('/api/bookings/user-bookings/?when=upcoming&fields=id&page_size=2')
+        self.assertEqual(ids(response), [bookings[2].id, bookings[3].id])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(ids(response), [bookings[4].id])
+        self.assertIsNone(response.data['next'])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual(ids(response), [bookings[2].id, bookings[3].id])
+        
+        response = self.client.get('/api/bookings/user-bookings/?when=soon')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('when', response.data)
+    
+    def test_user_bookings_summary(self):
+        """Test the summary counts a user's bookings and reads their next appointment"""
+        self.create_test_data()
+        Crew.objects.create(name='Crew 2')
+        
+        bookings = self.create_bookings(4, user=self.user)
+        Booking.objects.filter(pk=bookings[0].pk).update(date=timezone.localdate() - timedelta(days=3))
+        self.create_bookings(2, user=self.admin)
+        self.client.force_authenticate(user=self.user)
+        
+        # One aggregate for the counts, one index read for the next booking
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/bookings/user-bookings/summary/?fields=id,date')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'total': 4,
+            'upcoming': 3,
+            'past': 1,
+            'next': {'id': bookings[1].id, 'date': bookings[1].date.isoformat()}
+        })
+        
+        Booking.objects.filter(user=self.user).update(date=timezone.localdate() - timedelta(days=1))
+        response = self.client.get('/api/bookings/user-bookings/summary/')
+        self.assertEqual((response.data['upcoming'], response.data['past']), (0, 4))
+        self.assertIsNone(response.data['next'])
+        
+        self.client.force_authenticate(user=None)
+        response = self.client.get('/api/bookings/user-bookings/summary/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+    
+    def test_send_reminders(self):
+        """Test due, confirmed bookings are reminded once, a chunk at a time"""
+        self.create_test_data()
+        
+        bookings = self.create_bookings(4)
+        Booking.objects.exclude(pk=bookings[1].pk).update(confirmed=True)
+        now = timezone.make_aware(datetime.combine(self.test_date, time(0, 0)))
+        
+        # Each chunk is one claim query and one marker update, plus the final empty claim
+        with CaptureQueriesContext(connection) as queries:
+            report = ReminderService.send_due(now=now, hours=72, chunk_size=1)
+        statements = [q['sql'].split()[0] for q in queries.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(statements, ['SELECT', 'UPDATE', 'SELECT', 'UPDATE', 'SELECT'])
+        self.assertEqual(report, {'sent': 2, 'failed': 0})
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertIn(bookings[0].date.strftime('%B'), mail.outbox[0].body)
+        self.assertIn('Reminder', mail.outbox[0].subject)
+        self.assertEqual(
+            set(Booking.objects.filter(reminder_sent_at__isnull=False).values_list('pk', flat=True)),
+            {bookings[0].pk, bookings[2].pk}
+        )
+        
+        # Nothing is sent twice
+        self.assertEqual(ReminderService.send_due(now=now, hours=72), {'sent': 0, 'failed': 0})
+        self.assertEqual(len(mail.outbox), 2)
+    
+    def test_send_reminders_retries_failures_next_run(self):
+        """Test a failed reminder stays unmarked and goes out on a later run"""
+        self.create_test_data()
+        
+        bookings = self.create_bookings(2)
+        Booking.objects.update(confirmed=True)
+        now = timezone.make_aware(datetime.combine(self.test_date, time(0, 0)))
+        
+        deliver = EmailDeliveryService.deliver
+        def fail_first(messages):
+            # Chunks run soonest first, so this is bookings[0]
+            results = deliver(messages)
+            results[0] = (results[0][0], OSError('down'))
+            return results
+        
+        with mock.patch.object(EmailDeliveryService, 'deliver', side_effect=fail_first):
+            report = ReminderService.send_due(now=now, hours=48, chunk_size=10)
+        self.assertEqual(report, {'sent': 1, 'failed': 1})
+        self.assertIsNone(Booking.objects.get(pk=bookings[0].pk).reminder_sent_at)
+        
+        out = io.StringIO()
+        with mock.patch('booking.reminders.timezone.now', return_value=now):
+            call_command('send_reminders', '--hours', '48', stdout=out)
+        self.assertIn('Sent 1 reminders', out.getvalue())
+        self.assertFalse(Booking.objects.filter(reminder_sent_at__isnull=True).exists())
+    
+    def test_send_reminders_waits_out_an_open_circuit(self):
+        """Test a reminder run leaves everything for later while the email circuit is open"""
+        self.create_test_data()
+        
+        self.create_bookings(2)
+        Booking.objects.update(confirmed=True)
+        now = timezone.make_aware(datetime.combine(self.test_date, time(0, 0)))
+        EmailDeliveryService.breaker.trip()
+        
+        with self.assertNumQueries(0):
+            self.assertEqual(ReminderService.send_due(now=now, hours=48), {'sent': 0, 'failed': 0})
+        self.assertEqual(Booking.objects.filter(reminder_sent_at__isnull=True).count(), 2)
+    
+    def test_guest_lookup_is_case_insensitive_single_query(self):
+        """Test guests find their bookings whatever the case, with one bookings query"""
+        self.create_test_data()
+        
+        bookings = self.create_bookings(3)
+        Booking.objects.filter(pk=bookings[0].pk).update(email='Jane.Smith@Example.com')
+        bookings[0].refresh_from_db()
+        bookings[0].save()
+        self.assertEqual(bookings[0].email_normalized, 'jane.smith@example.com')
+        
+        self.client.get('/api/bookings/packages/')  # Warm the catalog
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/bookings/guest-bookings/?page_size=2', {'email': ' JANE.smith@example.COM'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        booking_queries = [q['sql'] for q in queries.captured_queries if 'FROM "booking_booking"' in q['sql']]
+        self.assertEqual(len(booking_queries), 1)
+        self.assertIn('email_normalized', booking_queries[0])
+        
+        ids = [b['id'] for b in response.data['results']]
+        response = self.client.post(response.data['next'], {'email': 'jane.smith@example.com'}, format='json')
+        ids += [b['id'] for b in response.data['results']]
+        self.assertEqual(sorted(ids), sorted(b.id for b in bookings))
+        self.assertIsNone(response.data['next'])
+        
+        # The session now lets the guest delete a booking stored with different casing
+        response = self.client.delete(f'/api/bookings/booking-list/{bookings[0].id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+    
+class ConcurrentBookingTestCase(TransactionTestCase):
+    """Base for tests that write bookings from several threads, each on its own connection"""
+    serialized_rollback = True
+    CLIENTS = 8
+    
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("In-memory SQLite cannot be shared between threads")
+        
+        cache.clear()
+        self.package = Package.objects.get(name='interior')
+        today = timezone.now().date()
+        self.test_date = today + timedelta(days=7 - today.weekday())  # Next Monday
+    
+    def post_booking(self, index, barrier, booking_time=time(10, 0)):
+        try:
+            client = APIClient()
+            data = {
+                'first_name': f'Racer{index}',
+                'last_name': 'Doe',
+                'email': f'racer{index}@example.com',
+                'phone_number': '1234567890',
+                'date': self.test_date.isoformat(),
+                'time': booking_time.isoformat(),
+                'package': self.package.id,
+                'vehicle': 'car'
+            }
+            barrier.wait()
+            return client.post('/api/bookings/booking-list/', data, format='json').status_code
+        finally:
+            connection.close()
+
+
+class ConcurrentBookingTest(ConcurrentBookingTestCase):
+    
+    def test_parallel_creates_for_one_slot(self):
+        """Test exactly one of several simultaneous requests for a slot succeeds"""
+        barrier = threading.Barrier(self.CLIENTS)
+        with ThreadPoolExecutor(self.CLIENTS) as pool:
+            codes = list(pool.map(lambda i: self.post_booking(i, barrier), range(self.CLIENTS)))
+        
+        self.assertEqual(codes.count(status.HTTP_201_CREATED), 1)
+        self.assertEqual(codes.count(status.HTTP_400_BAD_REQUEST), self.CLIENTS - 1)
+        self.assertEqual(Booking.objects.filter(date=self.test_date).count(), 1)
+
+@skipUnless(RUN_BENCHMARKS, "Set RUN_BENCHMARKS=1 to run benchmarks")
+class BookingConflictBenchmark(TestCase):
+    """Overlap check latency as the number of bookings per day grows"""
+    
+    DAY_SIZES = (10, 100, 1000, 5000)
+    
+    def test_conflict_check_latency(self):
+        package = Package.objects.get(name='exterior')
+        base_date = timezone.now().date() + timedelta(days=30)
+        
+        # Put each day size on its own date so the queries hit different row counts
+        for offset, size in enumerate(self.DAY_SIZES):
+            booking_date = base_date + timedelta(days=offset)
+            bookings = []
+            for i in range(size):
+                start = time((i // 60) % 24, i % 60)
+                bookings.append(Booking(
+                    first_name='Bench',
+                    last_name='Mark',
+                    email=f'bench{i}@example.com',
+                    phone_number='1234567890',
+                    date=booking_date,
+                    time=start,
+                    end_time=Booking.calculate_end_time(booking_date, start, 1),
+                    package=package,
+                    package_price_at_booking=package.price,
+                    total_price_at_booking=package.price,
+                    vehicle='car'
+                ))
+            Booking.objects.bulk_create(bookings, batch_size=1000)
+        
+        print("\nbookings/day  overlap query (ms)  per-date scan (ms)")
+        for offset, size in enumerate(self.DAY_SIZES):
+            booking_date = base_date + timedelta(days=offset)
+            runs = 50
+            overlap = timeit.timeit(
+                lambda: Booking.has_conflict(booking_date, time(23, 59), time(23, 59, 30)),
+                number=runs
+            )
+            # The previous approach loaded every booking on the date into Python
+            scan = timeit.timeit(
+                lambda: [b.time for b in Booking.objects.filter(date=booking_date)],
+                number=runs
+            )
+            print(f"{size:>12}  {overlap / runs * 1000:>18.3f}  {scan / runs * 1000:>17.3f}")
+
+
+@skipUnless(RUN_BENCHMARKS, "Set RUN_BENCHMARKS=1 to run benchmarks")
+class AvailabilityBenchmark(TestCase):
+    """Latency of a 60-day availability request on a busy calendar"""
+    
+    def test_sixty_day_window(self):
+        cache.clear()
+        package = Package.objects.get(name='exterior')
+        date_from = timezone.now().date() + timedelta(days=1)
+        
+        bookings = []
+        for day in range(60):
+            booking_date = date_from + timedelta(days=day)
+            for hour in range(9, 21, 2):
+                bookings.append(Booking(
+                    first_name='Bench',
+                    last_name='Mark',
+                    email='bench@example.com',
+                    phone_number='1234567890',
+                    date=booking_date,
+                    time=time(hour, 0),
+                    end_time=time(hour + 1, 0),
+                    package=package,
+                    package_price_at_booking=package.price,
+                    total_price_at_booking=package.price,
+                    vehicle='car'
+                ))
+        Booking.objects.bulk_create(bookings)
+        
+        params = {
+            'from': date_from.isoformat(),
+            'to': (date_from + timedelta(days=59)).isoformat(),
+            'package': package.id,
+            'vehicle': 'car'
+        }
+        runs = 20
+        cold = 0
+        for _ in range(runs):
+            cache.clear()
+            cold += timeit.timeit(lambda: self.client.get('/api/bookings/availability/', params), number=1)
+        warm = timeit.timeit(lambda: self.client.get('/api/bookings/availability/', params), number=runs)
+        print(f"\n60-day availability: cold {cold / runs * 1000:.2f} ms, cached {warm / runs * 1000:.2f} ms")
+
+
+@skipUnless(RUN_BENCHMARKS, "Set RUN_BENCHMARKS=1 to run benchmarks")
+class BookingThroughputBenchmark(ConcurrentBookingTestCase):
+    """Parallel create throughput with and without the per-date lock"""
+    
+    BOOKINGS = 200
+    
+    def create_booking(self, index, locked):
+        try:
+            booking_date = self.test_date + timedelta(days=7 * (index // 12))
+            serializer = BookingSerializer(data={
+                'first_name': 'Bench',
+                'last_name': 'Mark',
+                'email': f'bench{index}@example.com',
+                'phone_number': '1234567890',
+                'date': booking_date.isoformat(),
+                'time': time(9 + index % 12, 0).isoformat(),
+                'package': Package.objects.get(name='exterior').id,
+                'vehicle': 'car'
+            })
+            serializer.is_valid(raise_exception=True)
+            data = serializer.validated_data
+            end_time = Booking.calculate_end_time(data['date'], data['time'], 60)
+            if not locked:
+                # The previous path: check, then save with no transaction
+                if not Booking.has_conflict(data['date'], data['time'], end_time):
+                    serializer.save()
+                return
+            with transaction.atomic():
+                Booking.lock_date(data['date'])
+                if not Booking.has_conflict(data['date'], data['time'], end_time):
+                    serializer.save()
+        finally:
+            connection.close()
+    
+    def test_create_throughput(self):
+        print("\npath       creates/s")
+        for label, locked in (('unlocked', False), ('locked', True)):
+            Booking.objects.all().delete()
+            started = timeit.default_timer()
+            with ThreadPoolExecutor(self.CLIENTS) as pool:
+                list(pool.map(lambda i: self.create_booking(i, locked), range(self.BOOKINGS)))
+            elapsed = timeit.default_timer() - started
+            print(f"{label:<9}  {self.BOOKINGS / elapsed:>9.1f}")
+
+
+@skipUnless(RUN_BENCHMARKS, "Set RUN_BENCHMARKS=1 to run benchmarks")
+class CrewSchedulerBenchmark(TestCase):
+    """Crew assignment and availability with many crews and a full month of jobs"""
+    
+    CREWS = 12
+    
+    def test_scheduler_latency(self):
+        cache.clear()
+        package = Package.objects.get(name='exterior')
+        Crew.objects.bulk_create([Crew(name=f'Bench crew {i}') for i in range(self.CREWS)])
+        crews = list(Crew.objects.all())
+        date_from = timezone.now().date() + timedelta(days=1)
+        
+        # Every crew fully booked 9 AM - 9 PM, leaving one hour free in the middle
+        bookings = []
+        for day in range(30):
+            booking_date = date_from + timedelta(days=day)
+            for crew in crews:
+                for hour in range(9, 21):
+                    if hour != 14:
+                        bookings.append(Booking(
+                            first_name='Bench',
+                            last_name='Mark',
+                            email='bench@example.com',
+                            phone_number='1234567890',
+                            date=booking_date,
+                            time=time(hour, 0),
+                            end_time=time(hour + 1, 0),
+                            package=package,
+                            package_price_at_booking=package.price,
+                            total_price_at_booking=package.price,
+                            vehicle='car',
+                            crew=crew
+                        ))
+        Booking.objects.bulk_create(bookings, batch_size=1000)
+        
+        booking_date = date_from + timedelta(days=15)
+        runs = 100
+        assign = timeit.timeit(lambda: Crew.find_available(booking_date, time(14, 0), time(15, 0)), number=runs)
+        conflict = timeit.timeit(lambda: Booking.has_conflict(booking_date, time(10, 0), time(11, 0)), number=runs)
+        params = {
+            'from': date_from.isoformat(),
+            'to': (date_from + timedelta(days=29)).isoformat(),
+            'package': package.id,
+            'vehicle': 'car'
+        }
+        cache.clear()
+        availability = timeit.timeit(lambda: self.client.get('/api/bookings/availability/', params), number=1)
+        
+        print(f"\n{len(crews)} crews, {len(bookings)} bookings/month")
+        print(f"crew assignment: {assign / runs * 1000:.2f} ms")
+        print(f"conflict check:  {conflict / runs * 1000:.2f} ms")
+        print(f"30-day availability (cold): {availability * 1000:.2f} ms")
+
+
+@skipUnless(RUN_BENCHMARKS, "Set RUN_BENCHMARKS=1 to run benchmarks")
+class BookingExportBenchmark(TestCase):
+    """Peak Python memory while streaming the export, against the old all-in-memory list"""
+    
+    SIZES = (1000, 10000, 50000)
+    
+    def test_export_memory(self):
+        package = Package.objects.get(name='exterior')
+        date_from = timezone.now().date() + timedelta(days=1)
+        created = 0
+        
+        print("\n  rows  stream peak (KiB)  serializer peak (KiB)")
+        for size in self.SIZES:
+            Booking.objects.bulk_create([
+                Booking(
+                    first_name='Bench',
+                    last_name='Mark',
+                    email='bench@example.com',
+                    phone_number='1234567890',
+                    date=date_from + timedelta(days=i % 365),
+                    time=time(9, 0),
+                    end_time=time(10, 0),
+                    package=package,
+                    package_price_at_booking=package.price,
+                    total_price_at_booking=package.price,
+                    vehicle='car'
+                )
+                for i in range(created, size)
+            ], batch_size=1000)
+            created = size
+            
+            tracemalloc.start()
+            for chunk in BookingExportService.stream_csv(Booking.objects.all()):
+                pass
+            stream_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            
+            serializer_peak = ''
+            if size <= 10000:
+                tracemalloc.start()
+                BookingSerializer(Booking.objects.with_details(), many=True).data
+                serializer_peak = f"{tracemalloc.get_traced_memory()[1] / 1024:.0f}"
+                tracemalloc.stop()
+            
+            print(f"{size:>6}  {stream_peak / 1024:>17.0f}  {serializer_peak:>21}")
+
+
+@skipUnless(RUN_BENCHMARKS, "Set RUN_BENCHMARKS=1 to run benchmarks")
+class BookingReadPathBenchmark(TestCase):
+    """Serializer + stdlib JSON against the projection + orjson, end to end"""
+    
+    SIZES = (100, 1000, 10000)
+    
+    def test_read_paths(self):
+        package = Package.objects.get(name='exterior')
+        addon = Addon.objects.first()
+        date_from = timezone.now().date() + timedelta(days=1)
+        created = 0
+        
+        print("\n  rows  serializer (ms)  fast path (ms)  speedup")
+        for size in self.SIZES:
+            bookings = Booking.objects.bulk_create([
+                Booking(
+                    first_name='Bench',
+                    last_name='Mark',
+                    email='bench@example.com',
+                    phone_number='1234567890',
+                    date=date_from + timedelta(days=i % 365),
+                    time=time(9, 0),
+                    end_time=time(10, 0),
+                    package=package,
+                    package_price_at_booking=package.price,
+                    total_price_at_booking=package.price + addon.price,
+                    vehicle='car'
+                )
+                for i in range(created, size)
+            ], batch_size=1000)
+            BookingAddon.objects.bulk_create(
+                [BookingAddon(booking=b, addon=addon, quantity=1, price_at_booking=addon.price) for b in bookings],
+                batch_size=1000
+            )
+            created = size
+            
+            slow = timeit.timeit(
+                lambda: JSONRenderer().render(BookingSerializer(Booking.objects.with_details(), many=True).data),
+                number=3
+            ) / 3
+            fast = timeit.timeit(
+                lambda: FastJSONRenderer().render(BookingProjection().serialize(BookingProjection.values(Booking.objects.all()))),
+                number=3
+            ) / 3
+            print(f"{size:>6}  {slow * 1000:>15.1f}  {fast * 1000:>14.1f}  {slow / fast:>6.1f}x")
+
+
+@skipUnless(RUN_BENCHMARKS, "Set RUN_BENCHMARKS=1 to run benchmarks")
+class GuestLookupBenchmark(TestCase):
+    """Guest lookup at 500k bookings: the indexed single query against the old exists() + scan"""
+    
+    BOOKINGS = 500000
+    GUESTS = 50000
+    
+    def test_guest_lookup(self):
+        package = Package.objects.get(name='exterior')
+        date_from = timezone.now().date() + timedelta(days=1)
+        for start in range(0, self.BOOKINGS, 10000):
+            Booking.objects.bulk_create([
+                Booking(
+                    first_name='Bench',
+                    last_name='Mark',
+                    email=f'Guest{i % self.GUESTS}@Example.com',
+                    email_normalized=f'guest{i % self.GUESTS}@example.com',
+                    phone_number='1234567890',
+                    date=date_from + timedelta(days=i % 365),
+                    time=time(9, 0),
+                    end_time=time(10, 0),
+                    package=package,
+                    package_price_at_booking=package.price,
+                    total_price_at_booking=package.price,
+                    vehicle='car'
+                )
+                for i in range(start, start + 10000)
+            ])
+        
+        client = APIClient()
+        client.get('/api/bookings/packages/')
+        runs = 20
+        old = timeit.timeit(
+            lambda: Booking.objects.filter(email='Guest123@Example.com').exists()
+            and list(Booking.objects.filter(email='Guest123@Example.com').values('id', 'date', 'time')),
+            number=runs
+        )
+        new = timeit.timeit(
+            lambda: client.post('/api/bookings/guest-bookings/', {'email': 'guest123@example.com'}, format='json'),
+            number=runs
+        )
+        print(f"\n{self.BOOKINGS} bookings")
+        print(f"old exists() + exact-case scan: {old / runs * 1000:.2f} ms")
+        print(f"indexed lookup, full request:   {new / runs * 1000:.2f} ms")
+
+
+@skipUnless(RUN_BENCHMARKS, "Set RUN_BENCHMARKS=1 to run benchmarks")
+class UserHistoryBenchmark(TestCase):
+    """A user's next appointment and history pages among 200k bookings from 2k users"""
+    
+    BOOKINGS = 200000
+    USERS = 2000
+    
+    def test_user_history(self):
+        package = Package.objects.get(name='exterior')
+        users = CustomUser.objects.bulk_create([
+            CustomUser(username=f'bench{i}', email=f'bench{i}@example.com') for i in range(self.USERS)
+        ])
+        date_from = timezone.localdate() - timedelta(days=180)
+        for start in range(0, self.BOOKINGS, 10000):
+            Booking.objects.bulk_create([
+                Booking(
+                    first_name='Bench',
+                    last_name='Mark',
+                    email='bench@example.com',
+                    email_normalized='bench@example.com',
+                    phone_number='1234567890',
+                    date=date_from + timedelta(days=i % 365),
+                    time=time(9 + i % 8, 0),
+                    end_time=time(10 + i % 8, 0),
+                    package=package,
+                    package_price_at_booking=package.price,
+                    total_price_at_booking=package.price,
+                    vehicle='car',
+                    user=users[i % self.USERS]
+                )
+                for i in range(start, start + 10000)
+            ])
+        
+        user = users[123]
+        client = APIClient()
+        client.force_authenticate(user=user)
+        client.get('/api/bookings/packages/')
+        upcoming = Booking.objects.filter(user=user).upcoming().order_by('date', 'time', '-id')
+        print(f"\n{self.BOOKINGS} bookings, next appointment plan: {upcoming[:1].explain()}")
+        
+        runs = 50
+        for label, url in (
+            ('summary', '/api/bookings/user-bookings/summary/'),
+            ('upcoming page', '/api/bookings/user-bookings/?when=upcoming'),
+            ('past page', '/api/bookings/user-bookings/?when=past'),
+        ):
+            seconds = timeit.timeit(lambda: client.get(url), number=runs)
+            print(f"{label}: {seconds / runs * 1000:.2f} ms")
+
+
+@skipUnless(RUN_BENCHMARKS, "Set RUN_BENCHMARKS=1 to run benchmarks")
+class EmailRenderBenchmark(TestCase):
+    """Render cost of 10k booking confirmations, to size the outbox worker"""
+    
+    RENDERS = 10000
+    
+    def test_render_confirmations(self):
+        from django.template import Engine
+        from django.template.loader import render_to_string
+        from django.utils.html import strip_tags
+        
+        package = Package.objects.get(name='exterior')
+        booking = Booking(
+            first_name='Jane',
+            last_name='Smith',
+            date=timezone.localdate(),
+            time=time(9, 0),
+            package=package,
+            vehicle='car',
+            address=Address(street_address='1 Market St', city='San Francisco', state='CA', zip_code='94105'),
+            total_price_at_booking=package.price,
+            confirmation_token=str(uuid.uuid4())
+        )
+        context = {'booking': booking, 'confirmation_url': 'http://localhost:3000/confirm-booking/token', 'is_user': False}
+        template = 'booking/email/booking_confirmation'
+        uncached = Engine(dirs=[settings.BASE_DIR / 'templates'], loaders=['django.template.loaders.filesystem.Loader'])
+        
+        def uncached_strip_tags():
+            strip_tags(uncached.render_to_string(f'{template}.html', context))
+        
+        def cached_strip_tags():
+            strip_tags(render_to_string(f'{template}.html', context))
+        
+        def cached_text_template():
+            render_to_string(f'{template}.txt', context)
+            render_to_string(f'{template}.html', context)
+        
+        print(f"\n{self.RENDERS} confirmations (HTML + text parts)")
+        for label, render in (
+            ('uncached loader + strip_tags', uncached_strip_tags),
+            ('cached loader + strip_tags', cached_strip_tags),
+            ('cached loader + text template', cached_text_template),
+        ):
+            render()
+            seconds = timeit.timeit(render, number=self.RENDERS)
+            print(f"{label}: {seconds:.2f} s, {self.RENDERS / seconds:.0f}/s")
+
+
+@skipUnless(RUN_BENCHMARKS, "Set RUN_BENCHMARKS=1 to run benchmarks")
+class ReminderBenchmark(TestCase):
+    """A reminder run over 10k due bookings against a local SMTP stub"""
+    
+    BOOKINGS = 10000
+    
+    def test_send_reminders(self):
+        from notifications.tests import StubSMTPServer
+        
+        package = Package.objects.get(name='exterior')
+        now = timezone.now()
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        Booking.objects.bulk_create([
+            Booking(
+                first_name='Bench',
+                last_name='Mark',
+                email=f'bench{i}@example.com',
+                email_normalized=f'bench{i}@example.com',
+                phone_number='1234567890',
+                date=tomorrow,
+                time=time(i % 24, i // 24 % 60),
+                end_time=time(i % 24, i // 24 % 60),
+                package=package,
+                package_price_at_booking=package.price,
+                total_price_at_booking=package.price,
+                vehicle='car',
+                confirmed=True
+            )
+            for i in range(self.BOOKINGS)
+        ], batch_size=2000)
+        
+        with StubSMTPServer(connect_delay=0.02) as server:
+            start = timeit.default_timer()
+            report = ReminderService.send_due(now=now, hours=48)
+            seconds = timeit.default_timer() - start
+            connections = server.connections
+            
+            Booking.objects.update(reminder_sent_at=None)
+            tracemalloc.start()
+            ReminderService.send_due(now=now, hours=48)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        
+        self.assertEqual(report['sent'], self.BOOKINGS)
+        print(f"\n{self.BOOKINGS} reminders: {seconds:.1f} s ({self.BOOKINGS / seconds:.0f}/s) "
+              f"over {connections} connections, peak {peak / 1024 / 1024:.1f} MiB")
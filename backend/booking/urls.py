@@ -5,11 +5,18 @@ from rest_framework.urlpatterns import format_suffix_patterns
 urlpatterns = [
     path('', views.api_root, name = 'api-root'),
     path('booking-list/', views.BookingListView.as_view(), name ='booking-list'),
+    path('booking-batch/', views.BookingBatchView.as_view(), name='booking-batch'),
+    path('booking-export/', views.BookingExportView.as_view(), name='booking-export'),
     path('booking-list/<int:id>/', views.BookingDeleteView.as_view(), name='booking-delete'),
     path('user-bookings/', views.UserBookingsView.as_view(), name='user-bookings'),
+    path('user-bookings/summary/', views.UserBookingsSummaryView.as_view(), name='user-bookings-summary'),
     path('guest-bookings/', views.GuestBookingsView.as_view(), name='guest-bookings'),
     path('confirm/', views.confirm_booking, name='booking-confirm'),
     path('business-hours/', views.BusinessHoursView.as_view(), name='business-hours'),
+    path('availability/', views.AvailabilityView.as_view(), name='availability'),
+    path('slot-holds/', views.SlotHoldView.as_view(), name='slot-holds'),
+    path('slot-holds/<str:token>/', views.SlotHoldReleaseView.as_view(), name='slot-hold-release'),
+    path('catalog/', views.CatalogView.as_view(), name='catalog'),
     path('packages/', views.PackageListView.as_view(), name='packages'),
     path('addons/', views.AddonListView.as_view(), name='addon-list'),
 ]
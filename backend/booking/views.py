@@ -4,32 +4,139 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
 from rest_framework.views import APIView
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
 from django.utils import timezone
-from datetime import timedelta
-from .models import Booking, Package, BusinessHours, Addon
-from .serializers import BookingSerializer, BusinessHoursSerializer, GuestBookingLookupSerializer, AddonSerializer, PackageSerializer
+from .models import Booking, Package, BusinessHours, Addon, Crew
+from .serializers import BookingSerializer, BusinessHoursSerializer, GuestBookingLookupSerializer, AddonSerializer, PackageSerializer, AvailabilityQuerySerializer, SlotHoldSerializer, BookingBatchSerializer, BookingListQuerySerializer, BookingExportQuerySerializer, UserBookingsQuerySerializer
 from .services import EmailService
+from .availability import AvailabilityService
+from .catalog import CatalogService
+from .holds import SlotHoldService
+from .batch import BookingBatchService
+from .pagination import BookingCursorPagination
+from .export import BookingExportService
+from .projections import BookingProjection
 from .permissions import IsAdminUser, IsOwnerOrAdmin
 
 @api_view(['GET'])
 def api_root(request, format=None):
     return Response({
         'bookings': reverse('booking-list', request=request, format=format),
-        'user-bookings': reverse('user-bookings', request=request, format=format),
+        'user-bookings': reverse('user-bookings', request=request, format=format) + '?when={upcoming|past}',
+        'user-bookings-summary': reverse('user-bookings-summary', request=request, format=format),
         'guest-bookings': reverse('guest-bookings', request=request, format=format),
         'booking-confirm': reverse('booking-confirm', request=request, format=format) + '?token={token}',
-        'business-hours': reverse('business-hours', request=request, format=format)
+        'business-hours': reverse('business-hours', request=request, format=format),
+        'catalog': reverse('catalog', request=request, format=format),
+        'availability': reverse('availability', request=request, format=format) + '?from={date}&to={date}&package={id}&vehicle={vehicle}',
+        'slot-holds': reverse('slot-holds', request=request, format=format),
+        'booking-batch': reverse('booking-batch', request=request, format=format),
+        'booking-export': reverse('booking-export', request=request, format=format) + '?output={csv|ndjson}'
     })
 
-class BusinessHoursView(generics.ListAPIView):
+class CachedCatalogMixin:
+    """Serve a list from the rendered catalog cache, with ETag/Last-Modified revalidation"""
+    catalog_name = None
+    
+    def list(self, request, *args, **kwargs):
+        return CatalogService.respond(request, CatalogService.get_entry(self.catalog_name))
+
+class CatalogView(APIView):
+    """View for the packages, add-ons and hours the site needs on first load, in one document"""
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    
+    def get(self, request):
+        return CatalogService.respond(request, CatalogService.get_document())
+
+class BusinessHoursView(CachedCatalogMixin, generics.ListAPIView):
     """View for retrieving business hours"""
-    queryset = BusinessHours.objects.all()
     serializer_class = BusinessHoursSerializer
     permission_classes = [AllowAny]
     authentication_classes = []
+    catalog_name = 'business-hours'
+    
+    def get_queryset(self):
+        """Serve the cached weekly schedule instead of querying"""
+        return BusinessHours.get_weekly_hours()
+
+class AvailabilityView(APIView):
+    """View for listing every bookable start time in a date range"""
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    
+    def get(self, request):
+        serializer = AvailabilityQuerySerializer(data=request.query_params)
+        if serializer.is_valid():
+            availability = AvailabilityService.get_availability(
+                serializer.validated_data['from'],
+                serializer.validated_data['to'],
+                serializer.validated_data['package'],
+                serializer.validated_data['vehicle']
+            )
+            return Response(availability)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class BookingListView(generics.ListCreateAPIView):
+class SlotHoldView(APIView):
+    """View for holding a slot for a few minutes while the customer checks out"""
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    
+    def post(self, request):
+        if not settings.SLOT_HOLDS_ENABLED:
+            # A per-process hold would not block the slot for requests served by other workers
+            return Response({"error": "Slot holds need a shared SLOT_HOLD_CACHE_BACKEND."},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        serializer = SlotHoldSerializer(data=request.data)
+        if serializer.is_valid():
+            hold = SlotHoldService.create_hold(
+                serializer.validated_data['date'],
+                serializer.validated_data['time'],
+                serializer.validated_data['package'],
+                serializer.validated_data['vehicle']
+            )
+            if hold is None:
+                return Response({"error": "A booking already exists within the restricted time."},
+                                status=status.HTTP_409_CONFLICT)
+            
+            return Response({
+                'token': hold['token'],
+                'date': hold['date'],
+                'time': hold['time'],
+                'end_time': hold['end_time'],
+                'duration_minutes': hold['duration_minutes'],
+                'expires_at': SlotHoldService.expires_at(hold)
+            }, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class SlotHoldReleaseView(APIView):
+    """View for giving up a hold before it expires"""
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    
+    def delete(self, request, token):
+        if SlotHoldService.release_hold(token):
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response({"error": "Hold not found or already expired"},
+                        status=status.HTTP_404_NOT_FOUND)
+
+class FastBookingListMixin:
+    """Render booking lists through BookingProjection instead of field-by-field serialization"""
+    
+    def list(self, request, *args, **kwargs):
+        fields = BookingSerializer.get_fieldset(request.query_params)
+        queryset = BookingProjection.values(self.filter_queryset(self.get_queryset()), fields)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(BookingProjection(fields).serialize(page))
+        return Response(BookingProjection(fields).serialize(queryset))
+
+class BookingListView(FastBookingListMixin, generics.ListCreateAPIView):
     serializer_class = BookingSerializer
+    pagination_class = BookingCursorPagination
+    CREW_ASSIGNMENT_ATTEMPTS = 3
     
     def get_permissions(self):
         """
@@ -42,8 +149,15 @@ class BookingListView(generics.ListCreateAPIView):
         return [AllowAny()]
     
     def get_queryset(self):
-        """Return all bookings, but only for admin users"""
-        return Booking.objects.all()
+        """Return all bookings, but only for admin users, optionally filtered by date range and confirmation"""
+        queryset = Booking.objects.with_details()
+        if self.request.method != 'GET':
+            return queryset
+        
+        # A plain dict so an absent 'confirmed' is not read as an unticked checkbox
+        filters = BookingListQuerySerializer(data=self.request.query_params.dict())
+        filters.is_valid(raise_exception=True)
+        return filters.filter_queryset(queryset)
 
     def get_serializer_context(self):
         """Add request to serializer context"""
@@ -52,80 +166,220 @@ class BookingListView(generics.ListCreateAPIView):
         return context
 
     def perform_create(self, serializer):
-        package = serializer.validated_data.get('package')
-        time_restriction = self.get_time_restriction(package)
-
-        if self.check_time_conflict(serializer.validated_data['date'], serializer.validated_data['time'], time_restriction):
-            raise serializers.ValidationError("A booking already exists within the restricted time.")
+        booking_date = serializer.validated_data['date']
+        booking_time = serializer.validated_data['time']
+        duration = self.get_duration(serializer.validated_data.get('package'), serializer.validated_data.get('vehicle'))
+        end_time = Booking.calculate_end_time(booking_date, booking_time, duration)
+        hold = self.get_matching_hold(serializer.validated_data.pop('hold_token', None), serializer.validated_data, end_time)
+        token = hold['token'] if hold is not None else None
         
-        booking = serializer.save()
+        # Claim the hold first, so a double-submitted form cannot book it twice
+        if token is not None and SlotHoldService.claim_hold(token) is None:
+            raise serializers.ValidationError("This slot hold has already been used or has expired.")
+        
+        try:
+            for attempt in range(self.CREW_ASSIGNMENT_ATTEMPTS):
+                try:
+                    with transaction.atomic():
+                        Booking.lock_date(booking_date)
+                        
+                        crew = None
+                        if hold is not None:
+                            # The hold already reserved a crew for this slot, so only that crew is re-checked
+                            crew = Crew.available(booking_date, booking_time, end_time).filter(pk=hold['crew']).first()
+                        if crew is None:
+                            crew = self.find_free_crew(booking_date, booking_time, end_time)
+                        if crew is None:
+                            raise serializers.ValidationError("A booking already exists within the restricted time.")
+                        
+                        booking = serializer.save(crew=crew)
+                        
+                        # Queued in the same transaction, so the email exists exactly when the booking does
+                        EmailService.send_booking_confirmation(booking)
+                        if token is not None:
+                            transaction.on_commit(lambda: SlotHoldService.release_hold(token))
+                    break
+                except IntegrityError as e:
+                    # A concurrent booking took the same crew first, so pick again
+                    if not Booking.is_overlap_violation(e):
+                        raise
+                    hold = None
+            else:
+                raise serializers.ValidationError("A booking already exists within the restricted time.")
+        except Exception:
+            # Nothing was booked, so the customer keeps their hold
+            if token is not None:
+                SlotHoldService.unclaim_hold(token)
+            raise
         
         # Store the email in session for guest users to manage their bookings
         if not self.request.user.is_authenticated:
             email = serializer.validated_data.get('email')
             self.request.session['booking_email'] = email
-        
-        try:
-            EmailService.send_booking_confirmation(booking)
-        except Exception as e:
-            print(f"Error sending confirmation email: {e}")
 
-    def get_time_restriction(self, package):
-        """Get time restriction in hours based on package"""
+    def get_duration(self, package, vehicle):
+        """Get the service duration in minutes for the package and vehicle"""
         try:
-            package_name = package.name
-            if package_name == 'interior':
-                return 3
-            elif package_name == 'exterior':
-                return 1
-            elif package_name == 'interior_exterior':
-                return 3.5
-            return 0
+            return package.get_duration(vehicle)
         except AttributeError:
             return 0
     
-    def check_time_conflict(self, booking_date, booking_time, restriction_hours):
-        booking_datetime = timezone.datetime.combine(booking_date, booking_time)
-        start_time = booking_datetime - timedelta(hours=restriction_hours)
-        end_time = booking_datetime + timedelta(hours=restriction_hours)
+    def find_free_crew(self, booking_date, start_time, end_time):
+        """Find a crew that is free for the whole job and not held, or None if every crew is busy"""
+        held = SlotHoldService.held_crews(booking_date, start_time, end_time)
+        return Crew.find_available(booking_date, start_time, end_time, exclude_crews=held)
+    
+    def get_matching_hold(self, token, data, end_time):
+        """Return the live hold for exactly this slot, or None to fall back to a full check"""
+        if not token:
+            return None
+        hold = SlotHoldService.get_hold(token)
+        if hold is None or hold['end_time'] != end_time:
+            return None
+        if not SlotHoldService.matches(hold, data['date'], data['time'], data['package'], data.get('vehicle')):
+            return None
+        return hold
+
+class BookingBatchView(APIView):
+    """View for creating many bookings at once, e.g. for a fleet"""
+    permission_classes = [AllowAny]
+    
+    def post(self, request):
+        batch = BookingBatchSerializer(data=request.data)
+        if not batch.is_valid():
+            return Response(batch.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        items = []
+        errors = {}
+        for index, item in enumerate(batch.validated_data['bookings']):
+            serializer = BookingSerializer(data=item, context={'request': request})
+            if serializer.is_valid():
+                items.append((index, serializer.validated_data))
+            else:
+                errors[index] = serializer.errors
+        
+        created = []
+        if items:
+            user = request.user if request.user.is_authenticated else None
+            with transaction.atomic():
+                created, conflicts = BookingBatchService.create_bookings(items, user=user)
+                if created:
+                    EmailService.send_batch_confirmation([booking for index, booking in created])
+            errors.update({index: {"non_field_errors": [message]} for index, message in conflicts.items()})
         
-        start_time_only = start_time.time()
-        end_time_only = end_time.time()
+        results = [None] * len(batch.validated_data['bookings'])
+        for index, booking in created:
+            results[index] = {
+                'index': index,
+                'status': 'created',
+                'booking': {
+                    'id': booking.id,
+                    'date': booking.date,
+                    'time': booking.time,
+                    'end_time': booking.end_time,
+                    'crew': booking.crew_id
+                }
+            }
+        for index, item_errors in errors.items():
+            results[index] = {'index': index, 'status': 'error', 'errors': item_errors}
         
-        conflicting_bookings = Booking.objects.filter(date=booking_date)
+        bookings = [booking for index, booking in created]
+        if bookings:
+            # Store the email in session for guest users to manage their bookings
+            if not request.user.is_authenticated:
+                request.session['booking_email'] = bookings[0].email
+        
+        if not errors:
+            response_status = status.HTTP_201_CREATED
+        elif bookings:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        
+        return Response({
+            'created': len(bookings),
+            'failed': len(errors),
+            'results': results
+        }, status=response_status)
+
+class BookingExportView(APIView):
+    """View for admins to download bookings as CSV or NDJSON"""
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        serializer = BookingExportQuerySerializer(data=request.query_params.dict())
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        for booking in conflicting_bookings:
-            booking_time = booking.time
-            if start_time_only <= booking_time <= end_time_only:
-                return True
-                
-        return False
-
-class UserBookingsView(generics.ListAPIView):
-    """View for retrieving a user's booking history"""
+        output = serializer.validated_data['output']
+        queryset = serializer.filter_queryset(Booking.objects.all())
+        response = StreamingHttpResponse(
+            BookingExportService.stream(queryset, output),
+            content_type=BookingExportService.CONTENT_TYPES[output]
+        )
+        response['Content-Disposition'] = f'attachment; filename="bookings.{output}"'
+        return response
+
+class UserBookingsView(FastBookingListMixin, generics.ListAPIView):
+    """
+    View for retrieving a user's booking history, a page at a time, optionally only
+    ?when=upcoming or ?when=past and in ?ordering=date or -date
+    """
     serializer_class = BookingSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = BookingCursorPagination
+    # Read by the paginator; set per request from ?ordering
+    ascending = False
     
     def get_queryset(self):
         """Return only bookings for the authenticated user"""
-        return Booking.objects.filter(user=self.request.user)
+        queryset = Booking.objects.filter(user=self.request.user).with_details()
+        query = UserBookingsQuerySerializer(data=self.request.query_params.dict())
+        query.is_valid(raise_exception=True)
+        self.ascending = query.ascending
+        return query.filter_queryset(queryset)
+
+class UserBookingsSummaryView(APIView):
+    """Booking counts for the authenticated user, and their next appointment"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        bookings = Booking.objects.filter(user=request.user)
+        fields = BookingSerializer.get_fieldset(request.query_params)
+        # Soonest first, the reverse of the listing order, so this reads one entry off the index
+        upcoming = bookings.upcoming().order_by('date', 'time', '-id')
+        next_booking = BookingProjection(fields).serialize(BookingProjection.values(upcoming, fields)[:1])
+        return Response({
+            **bookings.counts(),
+            'next': next_booking[0] if next_booking else None
+        })
 
 class GuestBookingsView(APIView):
-    """View for guests to retrieve their bookings by email"""
+    """
+    View for guests to retrieve their bookings by email, a page at a time.
+    Later pages are fetched by posting the same email to the 'next' link.
+    """
     permission_classes = [AllowAny]
+    pagination_class = BookingCursorPagination
     
     def post(self, request):
         serializer = GuestBookingLookupSerializer(data=request.data)
         if serializer.is_valid():
             email = serializer.validated_data['email']
+            fields = BookingSerializer.get_fieldset(request.query_params)
+            
+            # One index range scan both fetches the page and tells us whether any bookings exist
+            paginator = self.pagination_class()
+            bookings = BookingProjection.values(Booking.objects.filter(email_normalized=email), fields)
+            page = paginator.paginate_queryset(bookings, request, view=self)
+            if not page and not request.query_params.get(paginator.cursor_query_param):
+                return Response({"email": ["No bookings found for this email address"]},
+                                status=status.HTTP_400_BAD_REQUEST)
             
             # Store email in session for later use in deletion
             request.session['booking_email'] = email
             
-            bookings = Booking.objects.filter(email=email)
-            booking_serializer = BookingSerializer(bookings, many=True)
-            
-            return Response(booking_serializer.data)
+            return paginator.get_paginated_response(BookingProjection(fields).serialize(page))
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['GET'])
@@ -138,15 +392,12 @@ def confirm_booking(request):
                         status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        booking = Booking.objects.get(confirmation_token=token, confirmed=False)
-        booking.confirmed = True
-        booking.save()
-        
-        try:
+        with transaction.atomic():
+            booking = Booking.objects.get(confirmation_token=token, confirmed=False)
+            booking.confirmed = True
+            booking.save(update_fields=['confirmed'])
             EmailService.send_booking_confirmed(booking)
-        except Exception as e:
-            print(f"Error sending confirmation notification: {e}")
-            
+        
         return Response({"message": "Booking confirmed successfully"}, 
                         status=status.HTTP_200_OK)
     except Booking.DoesNotExist:
@@ -177,14 +428,18 @@ class BookingDeleteView(generics.DestroyAPIView):
         super().perform_destroy(instance)
 
 
-class PackageListView(generics.ListAPIView):
+class PackageListView(CachedCatalogMixin, generics.ListAPIView):
     """View for retrieving available service packages"""
-    queryset = Package.objects.all()
+    queryset = Package.objects.prefetch_related('vehicle_prices')
     serializer_class = PackageSerializer
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    catalog_name = 'packages'
 
-class AddonListView(generics.ListAPIView):
+class AddonListView(CachedCatalogMixin, generics.ListAPIView):
     """View for retrieving available add-ons"""
     queryset = Addon.objects.filter(active=True)
     serializer_class = AddonSerializer
     permission_classes = [AllowAny]
-    authentication_classes = []
\ No newline at end of file
+    authentication_classes = []
+    catalog_name = 'addons'
\ No newline at end of file
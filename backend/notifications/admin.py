@@ -0,0 +1,18 @@
+from django.contrib import admin
+from django.utils import timezone
+from .models import OutboxMessage
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to', 'status', 'attempts', 'available_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('to', 'subject')
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+    actions = ['retry_now']
+    
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status=OutboxMessage.SENT).update(
+            status=OutboxMessage.PENDING, available_at=timezone.now()
+        )
+        self.message_user(request, f'Queued {updated} messages to send again.')
+    retry_now.short_description = "Send selected messages again"
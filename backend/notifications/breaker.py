@@ -0,0 +1,101 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending while the circuit is open"""
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker with its state in the default cache. With
+    SHARED_CACHE every worker feeds and reads the same circuit; with the per-process
+    default each process trips on its own, and metrics() reports the scope as 'process'.
+    Closed: calls go through and failures are counted. After failure_threshold in a row
+    it opens and callers fail fast for reset_seconds. Then it is half-open: one caller
+    probes, and its success closes the circuit while a failure opens it again.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+    
+    def __init__(self, name, threshold_setting, reset_setting):
+        self.name = name
+        # Setting names, read on use so overrides apply
+        self.threshold_setting = threshold_setting
+        self.reset_setting = reset_setting
+    
+    @property
+    def failure_threshold(self):
+        return getattr(settings, self.threshold_setting)
+    
+    @property
+    def reset_seconds(self):
+        return getattr(settings, self.reset_setting)
+    
+    def key(self, part):
+        return f"breaker:{self.name}:{part}"
+    
+    def incr(self, part):
+        key = self.key(part)
+        cache.add(key, 0, None)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # Evicted between add() and incr()
+            cache.set(key, 1, None)
+            return 1
+    
+    def opened_at(self):
+        return cache.get(self.key('opened_at'))
+    
+    def state(self):
+        opened_at = self.opened_at()
+        if opened_at is None:
+            return self.CLOSED
+        if time.time() - opened_at < self.reset_seconds:
+            return self.OPEN
+        return self.HALF_OPEN
+    
+    def retry_at(self):
+        """When an open circuit lets the next probe through, as a timestamp, or None when closed"""
+        opened_at = self.opened_at()
+        return None if opened_at is None else opened_at + self.reset_seconds
+    
+    def allow(self):
+        """Whether a call may go ahead now; in half-open state only the first caller may"""
+        state = self.state()
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and cache.add(self.key('probe'), True, self.reset_seconds):
+            return True
+        self.incr('rejected')
+        return False
+    
+    def record_success(self):
+        if self.opened_at() is not None or cache.get(self.key('failures')):
+            cache.delete_many([self.key('opened_at'), self.key('failures'), self.key('probe')])
+    
+    def record_failure(self):
+        state = self.state()
+        if state == self.HALF_OPEN:
+            # The probe failed, so stay open for another cool-down
+            self.trip()
+        elif state == self.CLOSED and self.incr('failures') >= self.failure_threshold:
+            self.trip()
+    
+    def trip(self):
+        cache.set(self.key('opened_at'), time.time(), None)
+        cache.delete_many([self.key('failures'), self.key('probe')])
+        self.incr('trips')
+    
+    def metrics(self):
+        values = cache.get_many([self.key(part) for part in ('failures', 'trips', 'rejected')])
+        return {
+            'state': self.state(),
+            'consecutive_failures': values.get(self.key('failures'), 0),
+            'trips': values.get(self.key('trips'), 0),
+            'rejected': values.get(self.key('rejected'), 0),
+            'retry_at': self.retry_at(),
+            # A per-process circuit only reflects the sends made by the process reading it
+            'scope': 'shared' if settings.SHARED_CACHE else 'process',
+        }
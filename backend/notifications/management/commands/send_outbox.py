@@ -0,0 +1,32 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from notifications.services import OutboxService
+
+class Command(BaseCommand):
+    help = "Send queued emails from the outbox. Several workers can run at once."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help="Messages claimed per transaction")
+        parser.add_argument('--interval', type=float, default=5, help="Seconds to sleep when nothing is due")
+        parser.add_argument('--once', action='store_true', help="Send everything due, then exit")
+
+    def handle(self, *args, **options):
+        if not settings.SHARED_CACHE:
+            self.stderr.write(self.style.WARNING(
+                "CACHE_BACKEND is per-process, so this worker's email circuit is not shared with other workers"
+            ))
+        totals = {'sent': 0, 'retried': 0, 'failed': 0, 'deferred': 0}
+        while True:
+            report = OutboxService.send_pending(options['batch_size'])
+            for key, count in report.items():
+                totals[key] += count
+            if any(report.values()):
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {totals['sent']}, retrying {totals['retried']}, gave up on {totals['failed']}, "
+            f"deferred {totals['deferred']} while the email circuit was open"
+        ))
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+class OutboxMessage(models.Model):
+    """
+    An email waiting to be sent. Rows are written in the same transaction as whatever
+    the email is about, and delivered later by the send_outbox worker.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    to = models.EmailField(max_length=250)
+    from_email = models.CharField(max_length=250, blank=True)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # Not sent before this time; pushed back after each failed attempt
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} to {self.to} ({self.status})"
+
+    class Meta:
+        ordering = ['available_at', 'id']
+        indexes = [
+            # Workers only ever scan what is due, so sent and failed rows stay out of the index
+            models.Index(fields=['available_at', 'id'], name='outbox_pending_idx', condition=Q(status='pending')),
+        ]
+
+    def to_email_message(self, connection=None):
+        message = EmailMultiAlternatives(
+            subject=self.subject,
+            body=self.body,
+            from_email=self.from_email or settings.DEFAULT_FROM_EMAIL,
+            to=[self.to],
+            connection=connection
+        )
+        if self.html_body:
+            message.attach_alternative(self.html_body, 'text/html')
+        return message
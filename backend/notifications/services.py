@@ -0,0 +1,166 @@
+import smtplib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+from .breaker import CircuitBreaker, CircuitOpenError
+from .models import OutboxMessage
+
+def render_email(template, context):
+    """Render template + '.txt' and template + '.html' into the (text, html) parts of an email"""
+    return render_to_string(f'{template}.txt', context), render_to_string(f'{template}.html', context)
+
+# Replies to one message's MAIL, RCPT or DATA that leave the SMTP session usable and say
+# nothing about the server's health. Greeting, HELO and login errors are response exceptions
+# too, but they mean no message can go out, so they count as connection failures.
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+class EmailDeliveryService:
+    breaker = CircuitBreaker('email', 'EMAIL_BREAKER_FAILURE_THRESHOLD', 'EMAIL_BREAKER_RESET_SECONDS')
+    
+    @staticmethod
+    def build(subject, to, template, context):
+        """Build a message with text and HTML parts from a template pair"""
+        body, html_body = render_email(template, context)
+        message = EmailMultiAlternatives(subject=subject, body=body, from_email=settings.DEFAULT_FROM_EMAIL, to=[to])
+        message.attach_alternative(html_body, 'text/html')
+        return message
+    
+    @staticmethod
+    def deliver(messages, batch_size=None):
+        """
+        Send EmailMessages over reused connections, one connection (and one TLS handshake)
+        per batch_size messages, and return [(message, error)] with error None for each
+        message that went out. A failed message does not stop the rest; if the failure
+        took the connection down, the next message reconnects.
+        Connection-level failures feed the circuit breaker, and while it is open messages
+        fail fast with CircuitOpenError instead of each waiting out EMAIL_TIMEOUT.
+        """
+        batch_size = batch_size or settings.EMAIL_BATCH_SIZE
+        breaker = EmailDeliveryService.breaker
+        results = []
+        for start in range(0, len(messages), batch_size):
+            connection = get_connection()
+            try:
+                for message in messages[start:start + batch_size]:
+                    if not breaker.allow():
+                        results.append((message, CircuitOpenError("Email circuit is open")))
+                        continue
+                    try:
+                        # A no-op while the connection is up, so send_messages() leaves it open
+                        connection.open()
+                    except Exception as error:
+                        # Drop a half-open session, e.g. connected but not logged in, so the
+                        # next message starts over instead of failing on it
+                        results.append((message, error))
+                        connection.close()
+                        breaker.record_failure()
+                        continue
+                    try:
+                        connection.send_messages([message])
+                    except MESSAGE_ERRORS as error:
+                        results.append((message, error))
+                        breaker.record_success()
+                    except Exception as error:
+                        results.append((message, error))
+                        connection.close()
+                        breaker.record_failure()
+                    else:
+                        results.append((message, None))
+                        breaker.record_success()
+            finally:
+                connection.close()
+        return results
+
+class OutboxService:
+    @staticmethod
+    def enqueue(subject, to, body, html_body=''):
+        """
+        Queue an email for the send_outbox worker. Call it inside the transaction that
+        creates what the email is about, so both commit or neither does.
+        """
+        return OutboxMessage.objects.create(subject=subject, to=to, body=body, html_body=html_body)
+    
+    @staticmethod
+    def enqueue_template(subject, to, template, context):
+        """
+        Queue an email rendered from template + '.txt' for the plain text part and
+        template + '.html' for the HTML part
+        """
+        body, html_body = render_email(template, context)
+        return OutboxService.enqueue(subject=subject, to=to, body=body, html_body=html_body)
+    
+    @staticmethod
+    def retry_delay(attempts):
+        """Exponential backoff after the given number of failed attempts, capped"""
+        delay = settings.OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+        return timedelta(seconds=min(delay, settings.OUTBOX_RETRY_MAX_SECONDS))
+    
+    @staticmethod
+    def send_pending(batch_size=None):
+        """
+        Claim up to batch_size due messages and send them, returning counts of messages
+        'sent', 'retried', 'failed' (out of attempts) and 'deferred' by an open circuit.
+        Rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so parallel workers take
+        disjoint batches. The locks are held until the results are written; if a worker
+        dies mid-batch its rows unlock and go out again, so delivery is at least once.
+        """
+        batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+        report = {'sent': 0, 'retried': 0, 'failed': 0, 'deferred': 0}
+        with transaction.atomic():
+            messages = list(
+                OutboxMessage.objects.select_for_update(skip_locked=True)
+                .filter(status=OutboxMessage.PENDING, available_at__lte=timezone.now())
+                .order_by('available_at', 'id')[:batch_size]
+            )
+            results = EmailDeliveryService.deliver([message.to_email_message() for message in messages])
+            for message, (email, error) in zip(messages, results):
+                if isinstance(error, CircuitOpenError):
+                    # Never attempted, so wait out the cool-down without using up an attempt
+                    OutboxService.defer(message)
+                    report['deferred'] += 1
+                elif error is not None:
+                    OutboxService.record_failure(message, error)
+                    report['failed' if message.status == OutboxMessage.FAILED else 'retried'] += 1
+                else:
+                    message.status = OutboxMessage.SENT
+                    message.sent_at = timezone.now()
+                    message.attempts += 1
+                    report['sent'] += 1
+            OutboxMessage.objects.bulk_update(
+                messages, ['status', 'attempts', 'available_at', 'last_error', 'sent_at']
+            )
+        return report
+    
+    @staticmethod
+    def record_failure(message, error):
+        """Schedule the next attempt with backoff, or give up after OUTBOX_MAX_ATTEMPTS"""
+        message.attempts += 1
+        message.last_error = f"{type(error).__name__}: {error}"
+        if message.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            message.status = OutboxMessage.FAILED
+        else:
+            message.available_at = timezone.now() + OutboxService.retry_delay(message.attempts)
+    
+    @staticmethod
+    def defer(message):
+        """Hold a message back until the email circuit lets a probe through"""
+        retry_at = EmailDeliveryService.breaker.retry_at()
+        message.available_at = datetime.fromtimestamp(retry_at, dt_timezone.utc) if retry_at else timezone.now()
+    
+    @staticmethod
+    def metrics():
+        """Outbox backlog: pending and failed counts and the age of the oldest due message"""
+        now = timezone.now()
+        pending = Q(status=OutboxMessage.PENDING)
+        metrics = OutboxMessage.objects.order_by().aggregate(
+            pending=Count('id', filter=pending),
+            failed=Count('id', filter=Q(status=OutboxMessage.FAILED)),
+            oldest_due=Min('available_at', filter=pending & Q(available_at__lte=now))
+        )
+        oldest_due = metrics.pop('oldest_due')
+        metrics['oldest_due_seconds'] = (now - oldest_due).total_seconds() if oldest_due else 0
+        return metrics
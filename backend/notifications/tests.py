@@ -0,0 +1,423 @@
+import os
+import smtplib
+import socketserver
+import threading
+import time
+from datetime import timedelta
+from unittest import skipUnless
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives, send_mail
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from unittest import mock
+from rest_framework import status
+from rest_framework.test import APITestCase
+from users.models import CustomUser
+from .breaker import CircuitBreaker, CircuitOpenError
+from .models import OutboxMessage
+from .services import EmailDeliveryService, OutboxService
+
+RUN_BENCHMARKS = os.environ.get('RUN_BENCHMARKS')
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Just enough SMTP for smtplib: accepts everything except recipients on the refuse list.
+    Servers can also greet with an error, or reject every login and require one to send.
+    """
+    
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+    
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        # Stands in for the TCP + TLS setup a real provider costs per connection
+        time.sleep(server.connect_delay)
+        self.reply(server.greeting)
+        if not server.greeting.startswith('220'):
+            return
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            verb = line[:4].decode().upper()
+            if verb in ('EHLO', 'HELO'):
+                if server.reject_auth:
+                    self.reply('250-stub')
+                    self.reply('250 AUTH PLAIN')
+                else:
+                    self.reply('250 stub')
+            elif verb == 'AUTH':
+                self.reply('535 Authentication failed')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('530 Authentication required' if server.reject_auth else '250 OK')
+            elif verb == 'RCPT':
+                address = line.decode().split(':', 1)[1].strip().strip('<>')
+                if address in server.refuse:
+                    self.reply('550 No such user')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                with server.lock:
+                    server.received.extend(recipients)
+                self.reply('250 OK')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                break
+            else:
+                self.reply('502 Command not implemented')
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    
+    def __init__(self, connect_delay=0, refuse=(), greeting='220 stub ESMTP', reject_auth=False):
+        super().__init__(('127.0.0.1', 0), StubSMTPHandler)
+        self.connect_delay = connect_delay
+        self.refuse = set(refuse)
+        self.greeting = greeting
+        self.reject_auth = reject_auth
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.received = []
+    
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        self.settings = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=self.server_address[1],
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='',
+            EMAIL_USE_TLS=False,
+            EMAIL_TIMEOUT=5
+        )
+        self.settings.enable()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.settings.disable()
+        self.shutdown()
+        self.server_close()
+
+def build_messages(count, refuse=()):
+    messages = []
+    for i in range(count):
+        to = refuse[i] if i < len(refuse) else f'user{i}@example.com'
+        message = EmailMultiAlternatives(f'Message {i}', 'Plain', 'noreply@example.com', [to])
+        message.attach_alternative('<p>Html</p>', 'text/html')
+        messages.append(message)
+    return messages
+
+def unreachable_smtp(**extra):
+    """Settings pointing at a port nothing listens on"""
+    with StubSMTPServer() as server:
+        port = server.server_address[1]
+    return override_settings(
+        EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+        EMAIL_HOST='127.0.0.1',
+        EMAIL_PORT=port,
+        EMAIL_USE_TLS=False,
+        EMAIL_TIMEOUT=1,
+        **extra
+    )
+
+class OutboxTest(TestCase):
+    
+    def setUp(self):
+        cache.clear()
+    
+    def queue(self, count=1, **extra):
+        return [
+            OutboxService.enqueue(
+                subject=f'Message {i}',
+                to=f'user{i}@example.com',
+                body='Plain',
+                html_body='<p>Html</p>',
+                **extra
+            )
+            for i in range(count)
+        ]
+    
+    def test_send_pending(self):
+        """Test due messages are sent with their HTML part and marked sent"""
+        self.queue(3)
+        
+        report = OutboxService.send_pending()
+        self.assertEqual(report, {'sent': 3, 'retried': 0, 'failed': 0, 'deferred': 0})
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].to, ['user0@example.com'])
+        self.assertEqual(mail.outbox[0].alternatives[0][0], '<p>Html</p>')
+        self.assertFalse(OutboxMessage.objects.filter(status=OutboxMessage.PENDING).exists())
+        self.assertTrue(all(m.sent_at for m in OutboxMessage.objects.all()))
+        
+        # Nothing is sent twice
+        self.assertEqual(OutboxService.send_pending(), {'sent': 0, 'retried': 0, 'failed': 0, 'deferred': 0})
+        self.assertEqual(len(mail.outbox), 3)
+    
+    def test_batch_size_and_due_time(self):
+        """Test a run takes at most one batch, oldest first, and skips messages not yet due"""
+        first, second, later = self.queue(3)
+        OutboxMessage.objects.filter(pk=later.pk).update(available_at=timezone.now() + timedelta(minutes=5))
+        
+        self.assertEqual(OutboxService.send_pending(batch_size=1)['sent'], 1)
+        self.assertEqual(mail.outbox[0].to, [first.to])
+        self.assertEqual(OutboxService.send_pending()['sent'], 1)
+        self.assertEqual(OutboxService.send_pending()['sent'], 0)
+        self.assertEqual(OutboxMessage.objects.get(status=OutboxMessage.PENDING), later)
+    
+    @override_settings(OUTBOX_RETRY_BASE_SECONDS=30, OUTBOX_RETRY_MAX_SECONDS=100, OUTBOX_MAX_ATTEMPTS=3)
+    def test_failed_sends_back_off_then_give_up(self):
+        """Test failures are retried with growing delays until the attempt limit"""
+        message, = self.queue()
+        self.assertEqual(
+            [OutboxService.retry_delay(attempts).total_seconds() for attempts in (1, 2, 3, 4)],
+            [30, 60, 100, 100]
+        )
+        
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=ConnectionRefusedError('down')):
+            for attempt in range(1, 4):
+                report = OutboxService.send_pending()
+                message.refresh_from_db()
+                self.assertEqual(message.attempts, attempt)
+                self.assertIn('ConnectionRefusedError: down', message.last_error)
+                if attempt < 3:
+                    self.assertEqual(report['retried'], 1)
+                    self.assertGreater(message.available_at, timezone.now())
+                    # Make it due again for the next attempt
+                    OutboxMessage.objects.filter(pk=message.pk).update(available_at=timezone.now())
+        
+        self.assertEqual(report['failed'], 1)
+        self.assertEqual(message.status, OutboxMessage.FAILED)
+        self.assertEqual(OutboxService.send_pending(), {'sent': 0, 'retried': 0, 'failed': 0, 'deferred': 0})
+    
+    def test_enqueue_rolls_back_with_its_transaction(self):
+        """Test a message written in a failed transaction is never sent"""
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.queue()
+                raise RuntimeError
+        self.assertFalse(OutboxMessage.objects.exists())
+
+class EmailDeliveryTest(TestCase):
+    
+    def setUp(self):
+        cache.clear()
+    
+    def test_connections_are_reused_per_batch(self):
+        """Test messages share one SMTP connection per batch instead of one each"""
+        with StubSMTPServer() as server:
+            results = EmailDeliveryService.deliver(build_messages(25), batch_size=10)
+        self.assertTrue(all(error is None for message, error in results))
+        self.assertEqual(len(server.received), 25)
+        self.assertEqual(server.connections, 3)
+    
+    def test_per_message_report(self):
+        """Test a refused recipient is reported on its own and the rest go out on the same connection"""
+        messages = build_messages(5)
+        messages[2].to = ['bounce@example.com']
+        with StubSMTPServer(refuse=['bounce@example.com']) as server:
+            results = EmailDeliveryService.deliver(messages)
+        
+        self.assertEqual([message for message, error in results], messages)
+        errors = [error for message, error in results]
+        self.assertIsInstance(errors[2], smtplib.SMTPRecipientsRefused)
+        self.assertEqual([e for i, e in enumerate(errors) if i != 2], [None] * 4)
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(len(server.received), 4)
+    
+    def test_unreachable_server_fails_each_message(self):
+        """Test every message is reported failed when the server cannot be reached"""
+        with unreachable_smtp():
+            results = EmailDeliveryService.deliver(build_messages(3))
+        self.assertTrue(all(isinstance(error, OSError) for message, error in results))
+    
+    def test_outbox_reports_refused_recipients(self):
+        """Test the outbox worker marks each row by its own delivery result"""
+        good = OutboxService.enqueue(subject='Hi', to='user@example.com', body='Plain')
+        bad = OutboxService.enqueue(subject='Hi', to='bounce@example.com', body='Plain')
+        with StubSMTPServer(refuse=['bounce@example.com']) as server:
+            report = OutboxService.send_pending()
+        self.assertEqual(report, {'sent': 1, 'retried': 1, 'failed': 0, 'deferred': 0})
+        good.refresh_from_db()
+        bad.refresh_from_db()
+        self.assertEqual(good.status, OutboxMessage.SENT)
+        self.assertIn('SMTPRecipientsRefused', bad.last_error)
+        self.assertEqual(server.received, ['user@example.com'])
+
+@override_settings(EMAIL_BREAKER_FAILURE_THRESHOLD=2, EMAIL_BREAKER_RESET_SECONDS=60)
+class CircuitBreakerTest(APITestCase):
+    
+    def setUp(self):
+        cache.clear()
+        self.breaker = EmailDeliveryService.breaker
+    
+    def test_opens_probes_and_closes(self):
+        """Test the breaker opens after repeated failures, lets one probe through after the cool-down, and closes on success"""
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state(), CircuitBreaker.CLOSED)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state(), CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+        
+        later = time.time() + 61
+        with mock.patch('notifications.breaker.time.time', return_value=later):
+            self.assertEqual(self.breaker.state(), CircuitBreaker.HALF_OPEN)
+            self.assertTrue(self.breaker.allow())
+            self.assertFalse(self.breaker.allow())  # Only one probe at a time
+            
+            # A failed probe opens the circuit for another cool-down
+            self.breaker.record_failure()
+            self.assertEqual(self.breaker.state(), CircuitBreaker.OPEN)
+        
+        with mock.patch('notifications.breaker.time.time', return_value=later + 61):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record_success()
+        self.assertEqual(self.breaker.state(), CircuitBreaker.CLOSED)
+        
+        metrics = self.breaker.metrics()
+        self.assertEqual((metrics['trips'], metrics['rejected'], metrics['consecutive_failures']), (2, 2, 0))
+        self.assertIsNone(metrics['retry_at'])
+    
+    def test_success_resets_the_failure_count(self):
+        """Test only consecutive failures count towards opening"""
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state(), CircuitBreaker.CLOSED)
+    
+    def test_deliver_fails_fast_once_open(self):
+        """Test messages stop waiting on a dead server once the circuit opens"""
+        with unreachable_smtp():
+            results = EmailDeliveryService.deliver(build_messages(5))
+        errors = [error for message, error in results]
+        self.assertTrue(all(isinstance(error, OSError) for error in errors[:2]))
+        self.assertTrue(all(isinstance(error, CircuitOpenError) for error in errors[2:]))
+        self.assertEqual(self.breaker.metrics()['rejected'], 3)
+    
+    def test_refused_recipients_do_not_open_the_circuit(self):
+        """Test per-message rejections are not counted as the server failing"""
+        messages = build_messages(4)
+        for message in messages:
+            message.to = ['bounce@example.com']
+        with StubSMTPServer(refuse=['bounce@example.com']):
+            EmailDeliveryService.deliver(messages)
+        self.assertEqual(self.breaker.state(), CircuitBreaker.CLOSED)
+    
+    def test_rejected_greeting_opens_the_circuit(self):
+        """Test a server turning connections away counts as failing, though it answers in SMTP"""
+        with StubSMTPServer(greeting='421 Too busy'):
+            results = EmailDeliveryService.deliver(build_messages(4))
+        errors = [error for message, error in results]
+        self.assertTrue(all(isinstance(error, smtplib.SMTPConnectError) for error in errors[:2]))
+        self.assertTrue(all(isinstance(error, CircuitOpenError) for error in errors[2:]))
+        self.assertEqual(self.breaker.state(), CircuitBreaker.OPEN)
+    
+    def test_failed_login_opens_the_circuit(self):
+        """Test bad credentials open the circuit, and each attempt logs in again on a new connection"""
+        with StubSMTPServer(reject_auth=True) as server:
+            with override_settings(EMAIL_HOST_USER='mailer', EMAIL_HOST_PASSWORD='wrong'):
+                results = EmailDeliveryService.deliver(build_messages(4))
+        errors = [error for message, error in results]
+        self.assertTrue(all(isinstance(error, smtplib.SMTPAuthenticationError) for error in errors[:2]))
+        self.assertTrue(all(isinstance(error, CircuitOpenError) for error in errors[2:]))
+        self.assertEqual(server.connections, 2)
+    
+    def test_outbox_defers_while_open(self):
+        """Test the outbox holds messages back without spending attempts while the circuit is open"""
+        message = OutboxService.enqueue(subject='Hi', to='user@example.com', body='Plain')
+        self.breaker.trip()
+        
+        self.assertEqual(OutboxService.send_pending(), {'sent': 0, 'retried': 0, 'failed': 0, 'deferred': 1})
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), (OutboxMessage.PENDING, 0))
+        self.assertAlmostEqual(message.available_at.timestamp(), self.breaker.retry_at(), places=3)
+        self.assertEqual(len(mail.outbox), 0)
+    
+    def test_metrics_endpoint(self):
+        """Test admins can read breaker and outbox metrics"""
+        OutboxService.enqueue(subject='Hi', to='user@example.com', body='Plain')
+        self.breaker.trip()
+        admin = CustomUser.objects.create_user(email='admin@example.com', username='admin', password='password123', is_staff=True)
+        user = CustomUser.objects.create_user(email='user@example.com', username='user', password='password123')
+        
+        self.client.force_authenticate(user=user)
+        self.assertEqual(self.client.get('/api/notifications/metrics/').status_code, status.HTTP_403_FORBIDDEN)
+        
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/api/notifications/metrics/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['breaker']['state'], CircuitBreaker.OPEN)
+        self.assertEqual(response.data['breaker']['trips'], 1)
+        self.assertEqual((response.data['outbox']['pending'], response.data['outbox']['failed']), (1, 0))
+    
+    def test_metrics_report_scope(self):
+        """Test the metrics say when the circuit is only this process's own"""
+        with override_settings(SHARED_CACHE=False):
+            self.assertEqual(self.breaker.metrics()['scope'], 'process')
+        with override_settings(SHARED_CACHE=True):
+            self.assertEqual(self.breaker.metrics()['scope'], 'shared')
+
+@skipUnless(RUN_BENCHMARKS, "Set RUN_BENCHMARKS=1 to run benchmarks")
+class EmailDeliveryBenchmark(TestCase):
+    """Throughput against a local SMTP stub that charges 20 ms per connection, like a TLS handshake"""
+    
+    MESSAGES = 500
+    
+    def test_throughput(self):
+        with StubSMTPServer(connect_delay=0.02) as server:
+            start = time.perf_counter()
+            for message in build_messages(self.MESSAGES):
+                send_mail(message.subject, message.body, message.from_email, message.to)
+            per_message = time.perf_counter() - start
+            per_message_connections = server.connections
+            
+            server.connections = 0
+            start = time.perf_counter()
+            EmailDeliveryService.deliver(build_messages(self.MESSAGES))
+            reused = time.perf_counter() - start
+        
+        print(f"\n{self.MESSAGES} messages")
+        print(f"send_mail per message: {self.MESSAGES / per_message:.0f} msg/s over {per_message_connections} connections")
+        print(f"reused connections:    {self.MESSAGES / reused:.0f} msg/s over {server.connections} connections")
+
+@skipUnless(connection.features.has_select_for_update_skip_locked, "Needs SELECT ... FOR UPDATE SKIP LOCKED")
+class OutboxConcurrencyTest(TransactionTestCase):
+    
+    def test_workers_claim_disjoint_batches(self):
+        """Test a second worker skips the rows the first one holds instead of waiting or resending them"""
+        for i in range(4):
+            OutboxService.enqueue(subject=f'Message {i}', to=f'user{i}@example.com', body='Plain')
+        
+        claimed = threading.Event()
+        release = threading.Event()
+        
+        def hold_two():
+            with transaction.atomic():
+                list(OutboxMessage.objects.select_for_update(skip_locked=True).order_by('id')[:2])
+                claimed.set()
+                release.wait(10)
+            connection.close()
+        
+        worker = threading.Thread(target=hold_two)
+        worker.start()
+        claimed.wait(10)
+        try:
+            report = OutboxService.send_pending()
+        finally:
+            release.set()
+            worker.join()
+        
+        self.assertEqual(report['sent'], 2)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['user2@example.com', 'user3@example.com'])
@@ -0,0 +1,6 @@
+from django.urls import path
+from notifications import views
+
+urlpatterns = [
+    path('metrics/', views.EmailMetricsView.as_view(), name='email-metrics'),
+]
@@ -0,0 +1,18 @@
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .services import EmailDeliveryService, OutboxService
+
+class EmailMetricsView(APIView):
+    """
+    Email circuit breaker state and trip counts, and the outbox backlog, for monitoring.
+    The web process never sends mail, so breaker figures are only meaningful when their
+    scope is 'shared'.
+    """
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        return Response({
+            'breaker': EmailDeliveryService.breaker.metrics(),
+            'outbox': OutboxService.metrics(),
+        })
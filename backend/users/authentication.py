@@ -1,5 +1,9 @@
+from django.conf import settings
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from .cache import cache_user, get_cached_user
 
 class CookieJWTAuthentication(JWTAuthentication):
     def authenticate(self, request):
@@ -16,4 +20,25 @@ class CookieJWTAuthentication(JWTAuthentication):
             user=self.get_user(validated_token)
             return user, validated_token
         except AuthenticationFailed as e:
-            raise AuthenticationFailed(f'Error retrieving user: {str(e)}')
\ No newline at end of file
+            raise AuthenticationFailed(f'Error retrieving user: {str(e)}')
+
+    def get_user(self, validated_token):
+        """
+        Return the token's user from a short-lived cache, loading it at most once per
+        AUTH_USER_CACHE_SECONDS. Saving or deleting the user, or logging out, bumps a
+        version stamp that makes the cached copy unreachable. That only reaches other
+        workers through a shared cache, so the cache is off (0 seconds) without one.
+        """
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None or not settings.AUTH_USER_CACHE_SECONDS:
+            return super().get_user(validated_token)
+        
+        version, user = get_cached_user(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            cache_user(user_id, version, user)
+        elif api_settings.CHECK_REVOKE_TOKEN and \
+                validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+            # Tokens differ per login, so this check cannot be cached with the user
+            raise AuthenticationFailed("The user's password has been changed.", code='password_changed')
+        return user
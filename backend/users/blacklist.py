@@ -0,0 +1,219 @@
+import hashlib
+import math
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from booking.cache import bump_version_on_commit, get_versions
+
+BLACKLIST_VERSION = 'token-blacklist'
+# Count of blacklistings published so far; entry n holds the jti of the nth
+PENDING_COUNT = 'token-blacklist:pending'
+
+# This process's filter, as {'version', 'bloom', 'merged'} under BLACKLIST_VERSION
+_local_filter = {}
+
+def pending_key(index):
+    return f"{PENDING_COUNT}:{index}"
+
+def filter_key(version, part):
+    return f"{BLACKLIST_VERSION}:filter:{version}:{part}"
+
+class BloomFilter:
+    """
+    Set membership in a fixed bit array. Lookups can return false positives at about
+    error_rate, but never false negatives.
+    """
+
+    def __init__(self, capacity, error_rate):
+        capacity = max(capacity, 1)
+        self.size = max(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    @classmethod
+    def from_bits(cls, size, hashes, bits):
+        bloom = cls.__new__(cls)
+        bloom.size, bloom.hashes, bloom.bits = size, hashes, bytearray(bits)
+        return bloom
+
+    def positions(self, item):
+        # Double hashing derives every position from one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+class TokenBlacklistService:
+    @staticmethod
+    def build_filter():
+        """
+        Bloom filter of the jti of every blacklisted token that could still pass verification,
+        with room for the blacklistings merged into it before the next rebuild
+        """
+        # Read first: every blacklisting counted so far committed before the query below
+        pending_from = cache.get(PENDING_COUNT, 0)
+        leeway = api_settings.LEEWAY
+        if not isinstance(leeway, timedelta):
+            leeway = timedelta(seconds=leeway)
+        jtis = list(
+            BlacklistedToken.objects
+            .filter(token__expires_at__gt=timezone.now() - leeway)
+            .values_list('token__jti', flat=True)
+        )
+        capacity = max(2 * len(jtis), settings.TOKEN_BLACKLIST_FILTER_MIN_CAPACITY)
+        bloom = BloomFilter(capacity, settings.TOKEN_BLACKLIST_FILTER_ERROR_RATE)
+        for jti in jtis:
+            bloom.add(jti)
+        bloom.built_at = time.time()
+        bloom.pending_from = pending_from
+        return bloom
+
+    @staticmethod
+    def store_filter(version, bloom):
+        """Share a filter in chunks of TOKEN_BLACKLIST_FILTER_CHUNK_BYTES, below memcached's item size limit"""
+        size = settings.TOKEN_BLACKLIST_FILTER_CHUNK_BYTES
+        bits = bytes(bloom.bits)
+        chunks = {filter_key(version, i): bits[start:start + size] for i, start in enumerate(range(0, len(bits), size))}
+        timeout = settings.TOKEN_BLACKLIST_FILTER_TIMEOUT
+        cache.set_many(chunks, timeout)
+        # Written last, so whoever finds the header finds every chunk too
+        cache.set(filter_key(version, 'header'), {
+            'size': bloom.size,
+            'hashes': bloom.hashes,
+            'chunks': len(chunks),
+            'built_at': bloom.built_at,
+            'pending_from': bloom.pending_from,
+        }, timeout)
+
+    @staticmethod
+    def load_filter(version):
+        """The shared filter for a version, or None if it was never stored or is partly evicted"""
+        header = cache.get(filter_key(version, 'header'))
+        if header is None:
+            return None
+        keys = [filter_key(version, i) for i in range(header['chunks'])]
+        chunks = cache.get_many(keys)
+        if len(chunks) < len(keys):
+            return None
+        bloom = BloomFilter.from_bits(header['size'], header['hashes'], b''.join(chunks[key] for key in keys))
+        bloom.built_at = header['built_at']
+        bloom.pending_from = header['pending_from']
+        return bloom
+
+    @staticmethod
+    def rebuild():
+        """Build and share a filter under a new version"""
+        version = time.time_ns()
+        bloom = TokenBlacklistService.build_filter()
+        TokenBlacklistService.store_filter(version, bloom)
+        cache.set(BLACKLIST_VERSION, version, settings.CACHE_VERSION_TIMEOUT)
+        return {'version': version, 'bloom': bloom, 'merged': bloom.pending_from}
+
+    @staticmethod
+    def get_filter():
+        """
+        This process's filter with every published blacklisting merged in, or None when one
+        cannot be read yet and the database has to answer. Only the version and pending count
+        are read while nothing changed. The filter is rebuilt from the database after prune()
+        and once per access token lifetime, so a lost blacklisting is exposed no longer than
+        an access token issued just before it.
+        """
+        values = cache.get_many([BLACKLIST_VERSION, PENDING_COUNT])
+        version = values.get(BLACKLIST_VERSION) or get_versions([BLACKLIST_VERSION])[0]
+        count = values.get(PENDING_COUNT, 0)
+
+        local = _local_filter.get(BLACKLIST_VERSION)
+        if local is None or local['version'] != version:
+            bloom = TokenBlacklistService.load_filter(version)
+            if bloom is None:
+                bloom = TokenBlacklistService.build_filter()
+                TokenBlacklistService.store_filter(version, bloom)
+            local = {'version': version, 'bloom': bloom, 'merged': bloom.pending_from}
+        # A count below what was merged means the counter was evicted and started over
+        if count < local['merged'] or \
+                time.time() - local['bloom'].built_at > api_settings.ACCESS_TOKEN_LIFETIME.total_seconds():
+            local = TokenBlacklistService.rebuild()
+        _local_filter[BLACKLIST_VERSION] = local
+
+        if count > local['merged']:
+            keys = [pending_key(index) for index in range(local['merged'] + 1, count + 1)]
+            jtis = cache.get_many(keys)
+            for key in keys:
+                if key not in jtis:
+                    # Counted but not written yet, or evicted
+                    return None
+                local['bloom'].add(jtis[key])
+                local['merged'] += 1
+        return local['bloom']
+
+    @staticmethod
+    def add(jti):
+        """Publish a committed blacklisting for every process to merge into its filter"""
+        cache.add(PENDING_COUNT, 0, None)
+        try:
+            index = cache.incr(PENDING_COUNT)
+        except ValueError:
+            # Evicted between add() and incr(); readers rebuild when the count goes backwards
+            cache.set(PENDING_COUNT, 1, None)
+            index = 1
+        cache.set(pending_key(index), jti, settings.TOKEN_BLACKLIST_FILTER_TIMEOUT)
+
+    @staticmethod
+    def invalidate():
+        """Rebuild every filter from the database, e.g. to drop entries that were deleted"""
+        bump_version_on_commit(BLACKLIST_VERSION)
+
+    @staticmethod
+    def prune(batch_size=None, now=None):
+        """
+        Delete expired outstanding tokens, and the blacklist entries cascading from them,
+        one batch per transaction. Returns {'outstanding', 'blacklisted'} deleted counts.
+        """
+        batch_size = batch_size or settings.TOKEN_PRUNE_BATCH_SIZE
+        now = now or timezone.now()
+        expired = OutstandingToken.objects.filter(expires_at__lte=now).order_by('pk')
+        report = {'outstanding': 0, 'blacklisted': 0}
+
+        last_pk = 0
+        while True:
+            # Walk forward by primary key so each batch starts where the last one ended
+            ids = list(expired.filter(pk__gt=last_pk).values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            last_pk = ids[-1]
+            with transaction.atomic():
+                _, deleted = OutstandingToken.objects.filter(pk__in=ids).delete()
+            report['outstanding'] += deleted.get(OutstandingToken._meta.label, 0)
+            report['blacklisted'] += deleted.get(BlacklistedToken._meta.label, 0)
+
+        if report['blacklisted']:
+            # Rebuild without the pruned entries, keeping the false positive rate down
+            TokenBlacklistService.invalidate()
+        return report
+
+class PrefilteredRefreshToken(RefreshToken):
+    """
+    RefreshToken that only queries the blacklist when the Bloom filter might hold its jti.
+    Without TOKEN_BLACKLIST_FILTER, i.e. without a shared cache to carry blacklistings
+    between workers, every check goes to the database.
+    """
+
+    def check_blacklist(self):
+        if settings.TOKEN_BLACKLIST_FILTER:
+            bloom = TokenBlacklistService.get_filter()
+            if bloom is not None and self.payload[api_settings.JTI_CLAIM] not in bloom:
+                return
+        super().check_blacklist()
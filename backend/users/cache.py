@@ -0,0 +1,30 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+def user_keys(user_id):
+    return f"auth-user:{user_id}:version", f"auth-user:{user_id}:user"
+
+def get_cached_user(user_id):
+    """
+    Return (version, user) for an authenticated user id in one cache round trip, with
+    user None when there is no copy cached under the current version
+    """
+    version_key, user_key = user_keys(user_id)
+    values = cache.get_many([version_key, user_key])
+    version = values.get(version_key)
+    if version is None:
+        # add() never overwrites, so a concurrent bump is not lost
+        cache.add(version_key, time.time_ns(), None)
+        return cache.get(version_key), None
+    entry = values.get(user_key)
+    if entry is not None and entry[0] == version:
+        return version, entry[1]
+    return version, None
+
+def cache_user(user_id, version, user):
+    """Cache a user loaded while version was current; a bump since then makes it unreachable"""
+    cache.set(user_keys(user_id)[1], (version, user), settings.AUTH_USER_CACHE_SECONDS)
+
+def invalidate_cached_user(user_id):
+    cache.set(user_keys(user_id)[0], time.time_ns(), None)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from users.blacklist import TokenBlacklistService
+
+class Command(BaseCommand):
+    help = "Delete expired outstanding and blacklisted refresh tokens in bounded batches. Safe to run often."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help="Expired tokens deleted per transaction")
+
+    def handle(self, *args, **options):
+        report = TokenBlacklistService.prune(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {report['outstanding']} outstanding tokens, {report['blacklisted']} blacklisted"
+        ))
@@ -1,11 +1,10 @@
 import random
 import string
-from django.core.mail import send_mail
 from django.conf import settings
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
 from django.utils import timezone
+from django.db import transaction
 from datetime import timedelta
+from notifications.services import OutboxService
 from .models import TwoFactorCode, PasswordResetToken
 
 class UserEmailService:
@@ -20,8 +19,9 @@ class UserEmailService:
         return ''.join(random.choices(string.ascii_letters + string.digits, k=64))
     
     @staticmethod
+    @transaction.atomic
     def send_2fa_code(user):
-        """Send a 2FA code to the user's email"""
+        """Create a 2FA code and queue it for the user's email in the same transaction"""
         code = UserEmailService.generate_2fa_code()
         
         TwoFactorCode.objects.filter(user=user).delete()
@@ -39,21 +39,17 @@ class UserEmailService:
             'expiry_minutes': 10
         }
         
-        html_message = render_to_string('users/email/two_factor_code.html', context)
-        plain_message = strip_tags(html_message)
-        
-        send_mail(
+        OutboxService.enqueue_template(
             subject='Your Authentication Code',
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            html_message=html_message,
-            fail_silently=False,
+            to=user.email,
+            template='users/email/two_factor_code',
+            context=context
         )
     
     @staticmethod
+    @transaction.atomic
     def send_password_reset(user):
-        """Send a password reset link to the user's email"""
+        """Create a password reset token and queue the link for the user's email in the same transaction"""
         token = UserEmailService.generate_reset_token()
         
         PasswordResetToken.objects.filter(user=user).delete()
@@ -73,14 +69,9 @@ class UserEmailService:
             'expiry_hours': 1
         }
         
-        html_message = render_to_string('users/email/password_reset.html', context)
-        plain_message = strip_tags(html_message)
-        
-        send_mail(
+        OutboxService.enqueue_template(
             subject='Password Reset Request',
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            html_message=html_message,
-            fail_silently=False,
+            to=user.email,
+            template='users/email/password_reset',
+            context=context
         )
\ No newline at end of file
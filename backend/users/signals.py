@@ -0,0 +1,25 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from .blacklist import TokenBlacklistService
+from .cache import invalidate_cached_user
+from .models import CustomUser
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_authenticated_user(sender, instance, **kwargs):
+    """
+    Drop the cached copy on any change, including password changes and deactivation.
+    Bump now so this process stops using it, and again on commit so a request that read
+    the old row meanwhile cannot cache it again.
+    """
+    invalidate_cached_user(instance.pk)
+    transaction.on_commit(lambda: invalidate_cached_user(instance.pk))
+
+@receiver(post_save, sender=BlacklistedToken)
+def add_to_blacklist_filter(sender, instance, created, **kwargs):
+    """Add a newly blacklisted token to the refresh prefilter once it is committed"""
+    if created:
+        jti = instance.token.jti
+        transaction.on_commit(lambda: TokenBlacklistService.add(jti))
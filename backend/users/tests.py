@@ -1,9 +1,25 @@
+import os
+import time
+from unittest import skipUnless
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework import status
 from rest_framework.test import APITestCase
+from notifications.models import OutboxMessage
+from .blacklist import BLACKLIST_VERSION, PENDING_COUNT, BloomFilter, TokenBlacklistService, filter_key, _local_filter
 from .models import CustomUser, TwoFactorCode, PasswordResetToken
 from datetime import timedelta
+from unittest import mock
+
+RUN_BENCHMARKS = bool(os.environ.get('RUN_BENCHMARKS'))
 
 class UserAPITest(APITestCase):
     
@@ -53,6 +69,10 @@ class UserAPITest(APITestCase):
         # Step 2: Verify 2FA code
         code_obj = TwoFactorCode.objects.get(user=self.test_user)
         
+        # The code goes out through the outbox rather than during the request
+        message = OutboxMessage.objects.get(to='testuser@example.com')
+        self.assertIn(code_obj.code, message.body)
+        
         verify_data = {
             'email': 'testuser@example.com',
             'code': code_obj.code
@@ -241,4 +261,259 @@ class UserAPITest(APITestCase):
         }
         
         response = self.client.post('/api/users/password-reset/confirm/', reset_data, format='json')
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+@override_settings(AUTH_USER_CACHE_SECONDS=60)
+class CookieJWTAuthenticationCacheTest(APITestCase):
+    
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email='cached@example.com',
+            username='cached',
+            password='password123'
+        )
+        self.refresh = RefreshToken.for_user(self.user)
+        self.client.cookies['access_token'] = str(self.refresh.access_token)
+    
+    def user_queries(self, path='/api/users/user-info/'):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        return response, [q for q in queries.captured_queries if 'users_customuser' in q['sql']]
+    
+    def test_user_is_loaded_once(self):
+        """Test repeat requests authenticate without querying for the user"""
+        response, queries = self.user_queries()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+        
+        for i in range(3):
+            response, queries = self.user_queries()
+            self.assertEqual(response.data['email'], 'cached@example.com')
+            self.assertEqual(queries, [])
+    
+    def test_changes_drop_the_cached_user(self):
+        """Test profile changes show up and deactivation locks the user out straight away"""
+        self.user_queries()
+        
+        self.client.patch('/api/users/user-info/', {'username': 'renamed'}, format='json')
+        response, queries = self.user_queries()
+        self.assertEqual(response.data['username'], 'renamed')
+        self.assertEqual(len(queries), 1)
+        
+        self.user.is_active = False
+        self.user.save()
+        response, queries = self.user_queries()
+        self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+    
+    def test_password_change_drops_the_cached_user(self):
+        """Test a password reset makes the next request load the user again"""
+        self.user_queries()
+        PasswordResetToken.objects.create(user=self.user, token='reset-token', expires_at=timezone.now() + timedelta(hours=1))
+        self.client.post('/api/users/password-reset/confirm/', {'token': 'reset-token', 'password': 'NewPassword123!'}, format='json')
+        
+        response, queries = self.user_queries()
+        self.assertEqual(len(queries), 1)
+    
+    @override_settings(AUTH_USER_CACHE_SECONDS=0)
+    def test_per_process_cache_loads_every_time(self):
+        """Test users are not cached where other workers could not see invalidations"""
+        for i in range(2):
+            response, queries = self.user_queries()
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(queries), 1)
+    
+    def test_logout_drops_the_cached_user(self):
+        """Test logging out invalidates the cached user"""
+        self.user_queries()
+        self.client.cookies['refresh_token'] = str(self.refresh)
+        response = self.client.post('/api/users/logout/', {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        self.client.cookies['access_token'] = str(self.refresh.access_token)
+        response, queries = self.user_queries()
+        self.assertEqual(len(queries), 1)
+
+@override_settings(TOKEN_BLACKLIST_FILTER=True, CACHE_VERSION_TIMEOUT=None)
+class TokenBlacklistTest(APITestCase):
+    
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email='tokens@example.com',
+            username='tokens',
+            password='password123'
+        )
+        self.refresh = RefreshToken.for_user(self.user)
+    
+    def refresh_queries(self):
+        self.client.cookies['refresh_token'] = str(self.refresh)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/users/refresh/')
+        return response, [q for q in queries.captured_queries if 'token_blacklist' in q['sql']]
+    
+    def test_bloom_filter_has_no_false_negatives(self):
+        """Test every added item is found and few others are"""
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(f'added-{i}')
+        self.assertTrue(all(f'added-{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+    
+    def test_refresh_skips_the_blacklist_query(self):
+        """Test the filter is built once and then answers for tokens that are not blacklisted"""
+        response, queries = self.refresh_queries()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+        
+        for i in range(3):
+            response, queries = self.refresh_queries()
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(queries, [])
+    
+    def test_blacklisted_token_is_refused(self):
+        """Test a token blacklisted after the filter was built can no longer refresh"""
+        self.refresh_queries()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/users/logout/', {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        response, queries = self.refresh_queries()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertNotIn('access_token', response.cookies)
+        
+        # Other tokens still refresh
+        self.refresh = RefreshToken.for_user(self.user)
+        response, queries = self.refresh_queries()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_logout_does_not_rebuild_the_filter(self):
+        """Test a blacklisting is merged into the filter without reloading the whole blacklist"""
+        self.refresh_queries()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/users/logout/', {}, format='json')
+        
+        with mock.patch.object(TokenBlacklistService, 'build_filter', side_effect=AssertionError("rebuilt")):
+            response, queries = self.refresh_queries()
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+            # Only the lookup of this one token
+            self.assertEqual(len(queries), 1)
+            
+            self.refresh = RefreshToken.for_user(self.user)
+            response, queries = self.refresh_queries()
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(queries, [])
+    
+    @override_settings(TOKEN_BLACKLIST_FILTER_CHUNK_BYTES=64)
+    def test_filter_is_shared_in_chunks(self):
+        """Test another process loads a filter split over several cache items without rebuilding it"""
+        bloom = TokenBlacklistService.get_filter()
+        version = _local_filter[BLACKLIST_VERSION]['version']
+        self.assertGreater(cache.get(filter_key(version, 'header'))['chunks'], 1)
+        
+        _local_filter.clear()
+        with mock.patch.object(TokenBlacklistService, 'build_filter', side_effect=AssertionError("rebuilt")):
+            self.assertEqual(TokenBlacklistService.get_filter().bits, bloom.bits)
+    
+    def test_unreadable_blacklisting_checks_the_database(self):
+        """Test a counted blacklisting whose jti is missing sends refreshes to the database"""
+        self.refresh_queries()
+        cache.set(PENDING_COUNT, 1, None)
+        
+        response, queries = self.refresh_queries()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+    
+    def logout_on_another_worker(self):
+        """Blacklist the token while the blacklisting lands in another worker's local cache"""
+        self.client.cookies['refresh_token'] = str(self.refresh)
+        other_worker = LocMemCache('other-worker', {})
+        with mock.patch('booking.cache.cache', other_worker), mock.patch('users.blacklist.cache', other_worker):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/users/logout/', {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    @override_settings(TOKEN_BLACKLIST_FILTER=False)
+    def test_per_process_cache_checks_the_database(self):
+        """Test a token blacklisted on another worker is refused when the cache is not shared"""
+        self.refresh_queries()
+        self.logout_on_another_worker()
+        
+        response, queries = self.refresh_queries()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(len(queries), 1)
+    
+    def test_filter_rebuilt_after_access_token_lifetime(self):
+        """Test a lost blacklisting leaves the token usable for one access token lifetime at most"""
+        self.refresh_queries()
+        self.logout_on_another_worker()
+        
+        later = time.time() + api_settings.ACCESS_TOKEN_LIFETIME.total_seconds() + 1
+        with mock.patch('users.blacklist.time.time', return_value=later):
+            response, queries = self.refresh_queries()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def test_prune_deletes_expired_tokens_in_batches(self):
+        """Test only expired tokens and their blacklist entries are deleted"""
+        now = timezone.now()
+        for i in range(5):
+            token = OutstandingToken.objects.create(
+                user=self.user, jti=f'expired-{i}', token='expired', expires_at=now - timedelta(minutes=1)
+            )
+            if i % 2 == 0:
+                BlacklistedToken.objects.create(token=token)
+        live = OutstandingToken.objects.create(user=self.user, jti='live', token='live', expires_at=now + timedelta(days=1))
+        BlacklistedToken.objects.create(token=live)
+        
+        with CaptureQueriesContext(connection) as queries:
+            report = TokenBlacklistService.prune(batch_size=2, now=now)
+        self.assertEqual(report, {'outstanding': 5, 'blacklisted': 3})
+        # Three batches of at most two, and one empty read to finish
+        selects = [q for q in queries.captured_queries if q['sql'].startswith('SELECT') and 'LIMIT 2' in q['sql']]
+        self.assertEqual(len(selects), 4)
+        
+        self.assertEqual(
+            set(OutstandingToken.objects.values_list('jti', flat=True)),
+            {'live', self.refresh['jti']}
+        )
+        self.assertEqual(list(BlacklistedToken.objects.values_list('token__jti', flat=True)), ['live'])
+
+@skipUnless(RUN_BENCHMARKS, "Set RUN_BENCHMARKS=1 to run benchmarks")
+class TokenBlacklistBenchmark(TestCase):
+    """Refresh-time blacklist checks against a large blacklist"""
+    
+    TOKENS = 200000
+    BLACKLISTED = 50000
+    CHECKS = 2000
+    
+    def test_blacklist_check_latency(self):
+        cache.clear()
+        expires_at = timezone.now() + timedelta(days=1)
+        OutstandingToken.objects.bulk_create(
+            [OutstandingToken(jti=f'bench-{i}', token='bench', expires_at=expires_at) for i in range(self.TOKENS)],
+            batch_size=5000
+        )
+        BlacklistedToken.objects.bulk_create(
+            [BlacklistedToken(token_id=pk) for pk in OutstandingToken.objects.values_list('pk', flat=True)[:self.BLACKLISTED]],
+            batch_size=5000
+        )
+        user = CustomUser.objects.create_user(email='bench@example.com', username='bench', password='password123')
+        tokens = [RefreshToken.for_user(user) for i in range(self.CHECKS)]
+        
+        started = time.perf_counter()
+        for token in tokens:
+            RefreshToken.check_blacklist(token)
+        direct = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        bloom = TokenBlacklistService.get_filter()
+        build = time.perf_counter() - started
+        started = time.perf_counter()
+        for token in tokens:
+            token.payload['jti'] in TokenBlacklistService.get_filter()
+        filtered = time.perf_counter() - started
+        
+        print(f"\n{self.BLACKLISTED} blacklisted: query {direct / self.CHECKS * 1e6:.0f} us/check, "
+              f"filter {filtered / self.CHECKS * 1e6:.0f} us/check, build {build * 1000:.0f} ms, "
+              f"{len(bloom.bits) // 1024} KiB")
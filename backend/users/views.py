@@ -10,10 +10,13 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenRefreshView
-from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
 from django.shortcuts import get_object_or_404
 from .models import CustomUser, PasswordResetToken
 from .services import UserEmailService
+from .blacklist import PrefilteredRefreshToken
+from .cache import invalidate_cached_user
 
 # Create your views here.
 class UserInfoView(RetrieveUpdateAPIView):
@@ -83,6 +86,7 @@ class LogoutView(APIView):
             try:
                 refresh = RefreshToken(refresh_token)
                 refresh.blacklist()
+                invalidate_cached_user(refresh[api_settings.USER_ID_CLAIM])
             except Exception as e:
                 return Response({'error':'Error invalidating the token.' + str(e)}, status=status.HTTP_400_BAD_REQUEST)
         response = Response({'message': 'successfully logged out'})
@@ -98,7 +102,8 @@ class CookieTokenRefreshView(TokenRefreshView):
         if not refresh_token:
             return Response({'error':'Refresh token not provided'}, status=status.HTTP_401_UNAUTHORIZED)
         try:
-            refresh = RefreshToken(refresh_token)
+            # Most tokens are not blacklisted, and the filter answers for those without a query
+            refresh = PrefilteredRefreshToken(refresh_token)
             access_token = str(refresh.access_token)
 
             response = Response({'message':'Access token refresh successfully'}, status=status.HTTP_200_OK)
@@ -108,7 +113,7 @@ class CookieTokenRefreshView(TokenRefreshView):
                                 secure=True,
                                 samesite='None')
             return response
-        except InvalidToken:
+        except (InvalidToken, TokenError):
             return Response({'error':'Invalid token'}, status=status.HTTP_401_UNAUTHORIZED)
 
 class PasswordResetRequestView(APIView):
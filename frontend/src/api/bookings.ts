@@ -5,8 +5,13 @@ export const createBooking = async (bookingData: unknown) => {
   return response.data;
 };
 
-export const getUserBookings = async () => {
-  const response = await apiClient.get('/api/bookings/user-bookings/');
+export const getUserBookings = async (params?: { when?: 'upcoming' | 'past'; ordering?: 'date' | '-date'; cursor?: string }) => {
+  const response = await apiClient.get('/api/bookings/user-bookings/', { params });
+  return response.data;
+};
+
+export const getUserBookingSummary = async () => {
+  const response = await apiClient.get('/api/bookings/user-bookings/summary/');
   return response.data;
 };
 
@@ -29,3 +34,30 @@ export const getPackages = async () => {
   const response = await apiClient.get('/api/bookings/packages/');
   return response.data;
 };
+
+export const getAvailability = async (from: string, to: string, packageId: number, vehicle: string) => {
+  const response = await apiClient.get('/api/bookings/availability/', {
+    params: { from, to, package: packageId, vehicle },
+  });
+  return response.data;
+};
+
+export const createSlotHold = async (holdData: { date: string; time: string; package: number; vehicle: string }) => {
+  const response = await apiClient.post('/api/bookings/slot-holds/', holdData);
+  return response.data;
+};
+
+export const releaseSlotHold = async (token: string) => {
+  const response = await apiClient.delete(`/api/bookings/slot-holds/${token}/`);
+  return response.data;
+};
+
+export const createBookingBatch = async (bookings: unknown[]) => {
+  const response = await apiClient.post('/api/bookings/booking-batch/', { bookings });
+  return response.data;
+};
+
+export const getCatalog = async () => {
+  const response = await apiClient.get('/api/bookings/catalog/');
+  return response.data;
+};